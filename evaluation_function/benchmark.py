@@ -0,0 +1,198 @@
+"""
+Offline performance benchmarks, written as a JSON report that can be diffed between versions.
+
+- micro-benchmarks of preprocess_tokens, sentence_similarity, sentence_similarity_mean_w2v and the keystring window
+  matching, over responses of varying length and questions with varying numbers of keystrings
+- end-to-end runs of evaluation.evaluation_function over a set of cases: by default the evaluations of
+  nlp_evaluation_tests.py, otherwise a JSONL file of {"response": ..., "answer": ..., "params": {...}} objects
+
+The end-to-end runs load the LLMs of the SLM layer: set SLM_BACKEND=stub to use the deterministic StubModel
+(see stub_llm.py, with SLM_STUB_LATENCY and SLM_STUB_TOKEN_LATENCY) instead of the model file.
+Every end-to-end repetition starts with empty evaluation, question, generation and rephrasing caches.
+
+Usage: python -m evaluation_function.benchmark [--skip-micro] [--skip-end-to-end] [--cases cases.jsonl]
+       [--repeat N] [--end-to-end-repeat N] [--label LABEL] [--output report.json]
+"""
+import argparse
+import copy
+import json
+import platform
+import random
+import statistics
+import time
+from collections import Counter
+
+import numpy as np
+
+try:
+    from . import nlp_evaluation
+    from .cascade_report import load_cases
+    from .nlp_compression_report import run_test_cases
+    from .nlp_evaluation import (BagOfWords, CompiledKeystring, bow_words, keystring_window_scores, lookup_word_vectors,
+                                 preprocess_tokens, sentence_similarity, sentence_similarity_mean_w2v)
+    from .nlp_word2vec import WORD2VEC_COMPRESSION
+except ImportError:
+    import nlp_evaluation
+    from cascade_report import load_cases
+    from nlp_compression_report import run_test_cases
+    from nlp_evaluation import (BagOfWords, CompiledKeystring, bow_words, keystring_window_scores, lookup_word_vectors,
+                                preprocess_tokens, sentence_similarity, sentence_similarity_mean_w2v)
+    from nlp_word2vec import WORD2VEC_COMPRESSION
+
+RESPONSE_LENGTHS = [5, 20, 80, 320]
+KEYSTRING_COUNTS = [1, 4, 16]
+
+
+def time_call(function, repeat: int) -> float:
+    """
+    Median wall-clock seconds of `repeat` calls of the function.
+    """
+    seconds = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start_time)
+    return statistics.median(seconds)
+
+
+def random_text(rng: random.Random, words: int) -> str:
+    vocabulary = nlp_evaluation.w2v.index_to_key[:5000]
+    return " ".join(rng.choice(vocabulary) for _ in range(words))
+
+
+def keystring_windows(response_tokens, compiled_keystrings):
+    """
+    The keystring window matching of nlp_evaluation.evaluation_function over all keystrings, without early exit.
+    """
+    response_vectors, response_indices = lookup_word_vectors(response_tokens, normalise=False)
+    response_token_words = [bow_words(token) for token in response_tokens]
+    response_bow = BagOfWords(word for words in response_token_words for word in words)
+    return [keystring_window_scores(compiled_keystring, response_vectors, response_indices >= 0, response_token_words, response_bow)
+            for compiled_keystring in compiled_keystrings]
+
+
+def micro_benchmarks(repeat: int = 5, seed: int = 0):
+    """
+    Median seconds per call of the NLP building blocks, for each response length (and keystring count).
+    """
+    rng = random.Random(seed)
+    answer = random_text(rng, 20)
+    results = []
+    for length in RESPONSE_LENGTHS:
+        response = random_text(rng, length)
+        response_tokens = preprocess_tokens(response)
+        for name, function in [("preprocess_tokens", lambda: preprocess_tokens(response)),
+                               ("sentence_similarity", lambda: sentence_similarity(response, answer)),
+                               ("sentence_similarity_mean_w2v", lambda: sentence_similarity_mean_w2v(response, answer))]:
+            results.append({"name": name, "response_words": length, "seconds": time_call(function, repeat)})
+        for count in KEYSTRING_COUNTS:
+            compiled_keystrings = [CompiledKeystring({"string": random_text(rng, rng.randint(1, 3))}) for _ in range(count)]
+            results.append({"name": "keystring_windows", "response_words": length, "keystrings": count,
+                            "seconds": time_call(lambda: keystring_windows(response_tokens, compiled_keystrings), repeat)})
+    return results
+
+
+def reset_caches():
+    try:
+        from . import llm_cache
+        from .compiled_question import clear_compiled_questions
+        from .evaluation_cache import evaluation_cache
+        from .prefix_cache import prefix_cache
+        from .slm_rephraser import rephrase_pool
+    except ImportError:
+        import llm_cache
+        from compiled_question import clear_compiled_questions
+        from evaluation_cache import evaluation_cache
+        from prefix_cache import prefix_cache
+        from slm_rephraser import rephrase_pool
+
+    evaluation_cache.clear()
+    clear_compiled_questions()
+    rephrase_pool.clear()
+    prefix_cache.clear()
+    # NOTE: replaced rather than cleared, so that a persistent SQLite tier is left untouched
+    llm_cache.generation_cache = llm_cache.GenerationCache(capacity=llm_cache.LLM_CACHE_SIZE, max_age=0, path="")
+
+
+def end_to_end_benchmark(cases, repeat: int = 1):
+    """
+    Wall-clock and CPU seconds of evaluation.evaluation_function over the cases, with the wall-clock layer times
+    (their span in the 'timings' metadata), the verdict tags and the outcome of every case (of the last repetition).
+    """
+    try:
+        from .evaluation import evaluation_function
+        from .llm_backend import CALL_SITES, backend_for
+    except ImportError:
+        from evaluation import evaluation_function
+        from llm_backend import CALL_SITES, backend_for
+
+    latencies, layer_times, outcomes = [], {"nlp": [], "slm": []}, []
+    start_time, start_cpu_time = time.perf_counter(), time.process_time()
+    for _ in range(repeat):
+        reset_caches()
+        outcomes = []
+        for response, answer, params in cases:
+            case_start_time = time.perf_counter()
+            result = evaluation_function(response, answer, dict(copy.deepcopy(params), include_test_data=True))
+            latencies.append(time.perf_counter() - case_start_time)
+            metadata = result.get("metadata", {})
+            spans = {span["name"]: span["wall_time"] for span in metadata.get("timings", [])}
+            for layer in layer_times:
+                if layer in spans:
+                    layer_times[layer].append(spans[layer])
+            outcomes.append({"is_correct": result["is_correct"], "tag": metadata.get("tag")})
+    seconds, cpu_seconds = time.perf_counter() - start_time, time.process_time() - start_cpu_time
+
+    return {
+        "backends": {call_site: backend_for(call_site).name for call_site in CALL_SITES},
+        "cases": len(cases),
+        "repeat": repeat,
+        "seconds": seconds,
+        "cpu_seconds": cpu_seconds,
+        "evaluations_per_second": len(latencies) / seconds if seconds > 0 else 0,
+        "latency": percentiles(latencies),
+        "layers": {layer: percentiles(times) for layer, times in layer_times.items()},
+        "tags": dict(sorted(Counter(outcome["tag"] for outcome in outcomes).items(), key=lambda item: str(item[0]))),
+        "outcomes": outcomes,
+    }
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"mean": float(np.mean(values)), "p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m evaluation_function.benchmark", description="Offline performance benchmarks.")
+    parser.add_argument("--skip-micro", action="store_true", help="skip the micro-benchmarks")
+    parser.add_argument("--skip-end-to-end", action="store_true", help="skip the end-to-end runs")
+    parser.add_argument("--cases", help="JSONL file of end-to-end cases (default: the cases of nlp_evaluation_tests.py)")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions of every micro-benchmark")
+    parser.add_argument("--end-to-end-repeat", type=int, default=1, help="repetitions of the end-to-end runs")
+    parser.add_argument("--label", default="", help="label of the report, e.g. the version benchmarked")
+    parser.add_argument("--output", help="file to write the JSON report to (default: stdout)")
+    args = parser.parse_args()
+
+    report = {"label": args.label, "python": platform.python_version(), "word2vec_compression": WORD2VEC_COMPRESSION}
+    if not args.skip_micro:
+        report["micro"] = micro_benchmarks(args.repeat)
+    if not args.skip_end_to_end:
+        if args.cases:
+            cases = load_cases(args.cases)
+        else:
+            cases = []
+            run_test_cases(record=cases)
+        report["end_to_end"] = end_to_end_benchmark(cases, args.end_to_end_repeat)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fp:
+            fp.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import json
+import os
+from typing import Any, Dict, Set
+
+from nltk import word_tokenize
+
+try:
+    from .nlp_evaluation import check_custom_feedback
+except ImportError:
+    from nlp_evaluation import check_custom_feedback
+
+# decide without the SLM when the NLP response is outside the cascade bands (can be overridden per request with params['cascade'])
+CASCADE = os.environ.get("EVALUATION_CASCADE", "false").lower() == "true"
+# NLP confidence bands of the cascade, overridden by the EVALUATION_CASCADE_BANDS JSON object and then by params['cascade_bands']
+CASCADE_BANDS = {
+    "w2v_accept": 0.9,              # correct NLP responses at least this similar to the answer are correct
+    "w2v_reject": 0.3,              # BOW-checked NLP responses at most this similar to the answer (w2v) ...
+    "bow_reject": 0.3,              # ... and at most this similar by BOW are incorrect
+    "keystring_reject": 0.3,        # responses scoring at most this for a missing keystring are incorrect
+    "keystring_forbidden": 0.95,    # responses scoring at least this for an unexpected keystring are incorrect
+}
+CASCADE_BANDS.update(json.loads(os.environ.get("EVALUATION_CASCADE_BANDS", "{}")))
+
+# negation and polarity tokens (as split by word_tokenize, e.g. "isn't" -> "is", "n't"), which the NLP layer drops as stopwords
+NEGATIONS = {"not", "n't", "no", "never", "nor", "neither", "none", "nothing", "nobody", "nowhere", "without", "cannot"}
+
+
+def cascade_bands(params: Any) -> Dict[str, float]:
+    """
+    CASCADE_BANDS with the overrides of params['cascade_bands'].
+    """
+    return dict(CASCADE_BANDS, **(params.get("cascade_bands") or {})) if params is not None else dict(CASCADE_BANDS)
+
+
+def negations(text: Any) -> Set[str]:
+    return NEGATIONS.intersection(word_tokenize(str(text).lower()))
+
+
+def cascade_decision(eval_response_nlp, question, bands, response) -> Any:
+    """
+    (band, is_correct, feedback) of the NLP response to `response` outside the confidence bands, None if the SLM is needed:
+    - w2v_accept: the NLP layer found the response correct, with a w2v similarity of at least bands['w2v_accept'],
+        and the response has no negation the answer lacks (the NLP layer cannot handle negations, e.g. 'not light blue'
+        is as similar to 'light blue' as 'light blue' itself)
+    - keystring_reject: a missing keystring scored at most bands['keystring_reject']
+    - keystring_forbidden: an unexpected keystring scored at least bands['keystring_forbidden']
+    - bow_reject: the w2v and BOW similarities are at most bands['w2v_reject'] and bands['bow_reject']
+    """
+    metadata = eval_response_nlp.metadata
+    method = metadata.get("method")
+    if eval_response_nlp.is_correct:
+        if metadata["similarity_value"] >= bands["w2v_accept"] and not negations(response) - negations(question.answer):
+            return "w2v_accept", True, "The response is correct (matched key points and is very similar to the answer)."
+    elif method == "keystrings":
+        problematic_keystring = metadata["problematic_keystring"]
+        score = dict(metadata["keystring-scores"])[problematic_keystring]
+        should_contain = next(keystring.should_contain for keystring in question.compiled_keystrings if keystring.string == problematic_keystring)
+        custom_feedback, feedback = check_custom_feedback(eval_response_nlp.feedback)
+        if not custom_feedback:
+            feedback = "The response is incorrect as the student missed some key points. " + feedback
+        if should_contain is True and score <= bands["keystring_reject"]:
+            return "keystring_reject", False, feedback.strip()
+        if should_contain is False and score >= bands["keystring_forbidden"]:
+            return "keystring_forbidden", False, feedback.strip()
+    elif method == "BOW vector similarity":
+        if metadata["similarity_value"] <= bands["w2v_reject"] and metadata["BOW_similarity_value"] <= bands["bow_reject"]:
+            word = metadata["problematic_word"]
+            more_info_msg = f" Please provide more information about {word}." if word is not None else ""
+            return "bow_reject", False, "The response is incorrect as it does not describe the answer." + more_info_msg
+    return None
@@ -0,0 +1,62 @@
+"""
+Report of how often each path of the confidence cascade (see cascade.py) fires.
+
+Runs the NLP layer on a set of cases and counts the responses the cascade decides without the SLM, per band,
+and the ambiguous ones that still need the SLM evaluation and rephrasing. By default the cases are the
+evaluations of nlp_evaluation_tests.py, otherwise a JSONL file of {"response": ..., "answer": ..., "params": {...}} objects.
+
+Usage: python -m evaluation_function.cascade_report [cases.jsonl]
+"""
+import copy
+import json
+import sys
+from collections import Counter
+
+try:
+    from . import nlp_evaluation
+    from .cascade import cascade_bands, cascade_decision
+    from .compiled_question import compile_question
+    from .nlp_compression_report import run_test_cases
+except ImportError:
+    import nlp_evaluation
+    from cascade import cascade_bands, cascade_decision
+    from compiled_question import compile_question
+    from nlp_compression_report import run_test_cases
+
+PATHS = ["w2v_accept", "keystring_reject", "keystring_forbidden", "bow_reject", "ambiguous"]
+
+
+def load_cases(path):
+    with open(path) as fp:
+        cases = [json.loads(line) for line in fp if line.strip()]
+    return [(case["response"], case["answer"], case.get("params", {})) for case in cases]
+
+
+def cascade_paths(cases):
+    """
+    Cascade path of every case: the band deciding it without the SLM, or 'ambiguous'.
+    """
+    paths = []
+    for response, answer, params in cases:
+        question = compile_question(answer, params)
+        eval_response_nlp = nlp_evaluation.evaluation_function(response, answer, copy.deepcopy(params), question=question)
+        decision = cascade_decision(eval_response_nlp, question, cascade_bands(params), response)
+        paths.append(decision[0] if decision is not None else "ambiguous")
+    return paths
+
+
+def print_report(paths):
+    counts = Counter(paths)
+    print(f"{len(paths)} evaluations, {len(paths) - counts['ambiguous']} decided without the SLM")
+    print(f"{'path':<22}{'count':>8}{'share':>9}")
+    for path in PATHS:
+        print(f"{path:<22}{counts[path]:>8}{counts[path] / max(len(paths), 1):>9.1%}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        cases = load_cases(sys.argv[1])
+    else:
+        cases = []
+        run_test_cases(record=cases)
+    print_report(cascade_paths(cases))
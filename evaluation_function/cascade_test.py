@@ -0,0 +1,75 @@
+import unittest
+
+try:
+    from .cascade import CASCADE_BANDS, cascade_bands, cascade_decision
+    from .compiled_question import compile_question
+    from .evaluation_response import Result as EvaluationResponse
+    from .nlp_evaluation import custom_feedback_message
+except ImportError:
+    from cascade import CASCADE_BANDS, cascade_bands, cascade_decision
+    from compiled_question import compile_question
+    from evaluation_response import Result as EvaluationResponse
+    from nlp_evaluation import custom_feedback_message
+
+
+def nlp_response(is_correct, feedback, **metadata):
+    eval_response = EvaluationResponse(is_correct=is_correct, metadata=metadata)
+    eval_response.add_feedback("feedback", feedback)
+    return eval_response
+
+
+class TestCascade(unittest.TestCase):
+    """
+        TestCase Class used to test the confidence cascade decisions.
+    """
+
+    answer = 'Density, Velocity, Viscosity, Length'
+    params = {'keystrings': [{'string': 'density'}, {'string': 'direction', 'should_contain': False, 'custom_feedback': 'No direction.'}]}
+    response = 'density, velocity, viscosity, length'
+
+    def setUp(self):
+        self.question = compile_question(self.answer, self.params)
+
+    def test_confident_correct_response_is_decided(self):
+        decision = cascade_decision(nlp_response(True, "", method="w2v", similarity_value=0.95), self.question, CASCADE_BANDS, self.response)
+        self.assertEqual(decision[:2], ("w2v_accept", True))
+
+        decision = cascade_decision(nlp_response(True, "", method="w2v", similarity_value=0.8), self.question, CASCADE_BANDS, self.response)
+        self.assertIsNone(decision)
+
+    def test_negated_response_is_not_accepted(self):
+        eval_response_nlp = nlp_response(True, "", method="w2v", similarity_value=1.0)
+        for response in ["not density, velocity, viscosity, length", "density isn't relevant, velocity, viscosity, length"]:
+            self.assertIsNone(cascade_decision(eval_response_nlp, self.question, CASCADE_BANDS, response), msg=f'Response: {response}')
+
+        question = compile_question('The flow is not compressible', None)
+        decision = cascade_decision(eval_response_nlp, question, CASCADE_BANDS, 'the flow is not compressible')
+        self.assertEqual(decision[:2], ("w2v_accept", True))
+
+    def test_missing_keystring_is_decided_below_its_band(self):
+        metadata = dict(method="keystrings", problematic_keystring="density", similarity_value=0.1)
+        decision = cascade_decision(nlp_response(False, "", **metadata, **{"keystring-scores": [("density", 0.1)]}), self.question, CASCADE_BANDS, self.response)
+        self.assertEqual(decision[:2], ("keystring_reject", False))
+
+        decision = cascade_decision(nlp_response(False, "", **metadata, **{"keystring-scores": [("density", 0.6)]}), self.question, CASCADE_BANDS, self.response)
+        self.assertIsNone(decision)
+
+    def test_unexpected_keystring_keeps_its_custom_feedback(self):
+        metadata = dict(method="keystrings", problematic_keystring="direction", similarity_value=1.0)
+        eval_response_nlp = nlp_response(False, custom_feedback_message("No direction."), **metadata, **{"keystring-scores": [("density", 1.0), ("direction", 1.0)]})
+        band, is_correct, feedback = cascade_decision(eval_response_nlp, self.question, CASCADE_BANDS, self.response)
+
+        self.assertEqual((band, is_correct), ("keystring_forbidden", False))
+        self.assertNotIn("CUSTOM_FEEDBACK", feedback)
+        self.assertIn("No direction.", feedback)
+
+    def test_bands_can_be_overridden_per_request(self):
+        bands = cascade_bands({'cascade_bands': {'w2v_accept': 0.75}})
+        decision = cascade_decision(nlp_response(True, "", method="w2v", similarity_value=0.8), self.question, bands, self.response)
+
+        self.assertEqual(bands['bow_reject'], CASCADE_BANDS['bow_reject'])
+        self.assertEqual(decision[:2], ("w2v_accept", True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable
+
+try:
+    from .nlp_evaluation import CompiledAnswer, CompiledKeystring
+    from .slm_instructions import QuestionPrompts
+except ImportError:
+    from nlp_evaluation import CompiledAnswer, CompiledKeystring
+    from slm_instructions import QuestionPrompts
+
+# maximum number of compiled questions kept, 0 disables the cache
+COMPILED_QUESTION_CACHE_SIZE = int(os.environ.get("COMPILED_QUESTION_CACHE_SIZE", "256"))
+
+
+def question_key(answer: Any, params: Any) -> str:
+    """
+    Content hash of the parts of a question that do not depend on the response: the answer and the keystrings.
+    """
+    keystrings = params.get("keystrings") if params is not None else None
+    return hashlib.sha256(json.dumps([answer, keystrings], sort_keys=True, default=str).encode()).hexdigest()
+
+
+class CompiledQuestion:
+    """
+    Everything about a question that does not depend on the student response, computed once:
+    - compiled_answer: the answer tokens, their vectors, mean vector and BagOfWords (with information content)
+    - compiled_keystrings: the tokens, summed vector and BagOfWords of each keystring
+    - prompts: the SLM prompts pre-rendered from the answer and keystrings
+    """
+
+    def __init__(self, answer: Any, params: Any, key: str = None):
+        keystring_objects = params["keystrings"] if params is not None and "keystrings" in params else []
+        self.key = key if key is not None else question_key(answer, params)
+        self.answer = answer
+        self.compiled_answer = CompiledAnswer(answer)
+        self.compiled_keystrings = [CompiledKeystring(keystring_object) for keystring_object in keystring_objects]
+        self.prompts = QuestionPrompts(answer, [keystring.string for keystring in self.compiled_keystrings])
+
+
+_compiled_questions = OrderedDict()
+_compiled_questions_lock = threading.Lock()
+
+
+# compiled questions loaded from a question bank at startup, never evicted
+_preloaded_questions = {}
+
+
+def preload_compiled_questions(questions: Iterable[CompiledQuestion]) -> int:
+    """
+    Keep the given compiled questions for the lifetime of the process, returning how many were added.
+    """
+    questions = list(questions)
+    with _compiled_questions_lock:
+        _preloaded_questions.update((question.key, question) for question in questions)
+    return len(questions)
+
+
+def compile_question(answer: Any, params: Any) -> CompiledQuestion:
+    """
+    CompiledQuestion of the answer and params: a preloaded one, or one served from an LRU cache keyed by question_key.
+    """
+    key = question_key(answer, params)
+    with _compiled_questions_lock:
+        question = _preloaded_questions.get(key) or _compiled_questions.get(key)
+        if question is not None:
+            if key in _compiled_questions:
+                _compiled_questions.move_to_end(key)
+            return question
+
+    question = CompiledQuestion(answer, params, key)
+    with _compiled_questions_lock:
+        _compiled_questions[key] = question
+        while len(_compiled_questions) > COMPILED_QUESTION_CACHE_SIZE:
+            _compiled_questions.popitem(last=False)
+    return question
+
+
+def clear_compiled_questions() -> None:
+    """
+    Drop the compiled questions of the LRU cache (preloaded questions are kept).
+    """
+    with _compiled_questions_lock:
+        _compiled_questions.clear()
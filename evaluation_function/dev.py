@@ -1,29 +1,126 @@
-import sys
+import argparse
 import json
+import multiprocessing
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 
 # from lf_toolkit.shared.params import Params
 
 from .evaluation import evaluation_function
 
+# layers reported in the --jsonl summary: the wall-clock time of their span in the 'timings' metadata (see timings.Timings),
+# and the latency of the whole request
+SUMMARY_LAYERS = ("nlp", "slm", "rephrase", "total")
+
+
+def evaluate_request(line):
+    """Evaluate one JSONL request, a {"response": ..., "answer": ..., "params": {...}} object.
+
+    Returns the JSON-encoded result (or error) and the wall-clock time taken by each layer of SUMMARY_LAYERS it ran.
+    """
+    start_time = time.perf_counter()
+    try:
+        request = json.loads(line)
+        params = request.get("params") or {}
+        # NOTE: the layer timings are part of the test data, which is only output if requested
+        result = evaluation_function(request["response"], request["answer"], dict(params, include_test_data=True))
+    except Exception as e:
+        return json.dumps({"error": f"{type(e).__name__}: {e}"}), {}
+    latency = time.perf_counter() - start_time
+
+    spans = {span["name"]: span["wall_time"] for span in result.get("metadata", {}).get("timings", [])}
+    timings = {layer: spans[layer] for layer in SUMMARY_LAYERS if layer in spans}
+    timings["total"] = latency
+    if not params.get("include_test_data", False):
+        result = {"is_correct": result["is_correct"], "feedback": result["feedback"]}
+    return json.dumps(result, default=str), timings
+
+
+def stream_jsonl(input_file, output_file, workers=1):
+    """Evaluate the JSONL requests of input_file, writing one JSONL result per request to output_file in input order.
+
+    With several workers the requests are evaluated in separate processes (each loading its own models), with at most
+    a few requests per worker read ahead so that memory stays bounded however long the input is.
+    Returns the number of requests, the total time and the timings of each request.
+    """
+    lines = (line for line in input_file if line.strip())
+    all_timings = []
+    start_time = time.perf_counter()
+
+    def write(result, timings):
+        output_file.write(result + "\n")
+        output_file.flush()
+        all_timings.append(timings)
+
+    if workers <= 1:
+        for line in lines:
+            write(*evaluate_request(line))
+    else:
+        # NOTE: spawned workers, as the GPT4All model is not safe to use after a fork
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            pending = deque()
+            for line in lines:
+                pending.append(executor.submit(evaluate_request, line))
+                if len(pending) >= 4 * workers:
+                    write(*pending.popleft().result())
+            while pending:
+                write(*pending.popleft().result())
+    return len(all_timings), time.perf_counter() - start_time, all_timings
+
+
+def print_summary(count, seconds, all_timings, file=sys.stderr):
+    print(f"{count} requests in {seconds:.2f}s ({count / seconds if seconds > 0 else 0:.2f} req/s)", file=file)
+    print(f"{'layer':<8}{'p50':>10}{'p95':>10}{'p99':>10}", file=file)
+    for layer in SUMMARY_LAYERS:
+        values = [timings[layer] for timings in all_timings if layer in timings]
+        if values:
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            print(f"{layer:<8}{p50:>9.3f}s{p95:>9.3f}s{p99:>9.3f}s", file=file)
+
+
 def dev():
     """Run the evaluation function from the command line for development purposes.
 
-    Usage: python -m evaluation_function.dev <answer> <response>
+    Usage: python -m evaluation_function.dev <response> <answer> [params]
+           python -m evaluation_function.dev --jsonl [requests.jsonl] [--workers N]
+
+    The --jsonl mode reads {"response": ..., "answer": ..., "params": {...}} requests, one per line, from the file
+    (or stdin), writes their results as JSONL to stdout and a throughput and latency summary to stderr.
     """
-    if len(sys.argv) < 3:
-        print("Usage: python -m evaluation_function.dev <answer> <response>")
+    parser = argparse.ArgumentParser(prog="python -m evaluation_function.dev", description="Run the evaluation function for development purposes.")
+    parser.add_argument("response", nargs="?")
+    parser.add_argument("answer", nargs="?")
+    parser.add_argument("params", nargs="?", default="{}")
+    parser.add_argument("--jsonl", nargs="?", const="-", metavar="PATH", help="evaluate JSONL requests from PATH (stdin if omitted or -)")
+    parser.add_argument("--workers", type=int, default=1, help="number of parallel worker processes for --jsonl")
+    args = parser.parse_args()
+
+    if args.jsonl is not None:
+        input_file = sys.stdin if args.jsonl == "-" else open(args.jsonl)
+        try:
+            print_summary(*stream_jsonl(input_file, sys.stdout, args.workers))
+        finally:
+            if input_file is not sys.stdin:
+                input_file.close()
+        return
+
+    if args.answer is None:
+        parser.print_usage()
         return
-    
-    answer = sys.argv[1]
-    response = sys.argv[2]
-    params = sys.argv[3] if len(sys.argv) > 3 else "{}"
+
+    response = args.response
+    answer = args.answer
     # parse params into a dict
     try:
-        params = json.loads(params)
+        params = json.loads(args.params)
     except json.JSONDecodeError:
         print("Invalid JSON string for params")
         return
-    
+
     if 'include_test_data' not in params:
         params['include_test_data'] = False
 
@@ -31,7 +128,7 @@ def dev():
     print(f"Response: {response}")
     print(f"Params: {params}")
 
-    result = evaluation_function(answer, response, params)
+    result = evaluation_function(response, answer, params)
 
     if type(result) == dict:
         print(result)
@@ -39,4 +136,4 @@ def dev():
         print(result.to_dict())
 
 if __name__ == "__main__":
-    dev()
\ No newline at end of file
+    dev()
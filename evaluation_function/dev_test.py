@@ -0,0 +1,61 @@
+import io
+import json
+import unittest
+from unittest import mock
+
+try:
+    from . import dev
+except ImportError:
+    import dev
+
+
+def layer_evaluation(response, answer, params):
+    """
+    Stand-in for evaluation_function, with the timings of the layers it would have run.
+    """
+    if response == "fail":
+        raise ValueError("no answer")
+    timings = [{"name": "nlp.tokenization", "wall_time": 0.5}, {"name": "nlp", "wall_time": 1.0}]
+    if response != "cascade":
+        timings += [{"name": "slm.similarity", "wall_time": 1.5}, {"name": "slm", "wall_time": 2.0}]
+    metadata = {"nlp_processing_time": 9.0, "timings": timings}
+    return {"is_correct": response == answer, "feedback": response, "metadata": metadata}
+
+
+class TestDev(unittest.TestCase):
+    """
+        TestCase Class used to test the JSONL batch mode of the dev CLI.
+    """
+
+    def test_results_are_written_in_input_order_with_layer_wall_times(self):
+        requests = [{"response": "density", "answer": "density"},
+                    {"response": "fail", "answer": "density"},
+                    {"response": "cascade", "answer": "density", "params": {"include_test_data": True}}]
+        input_file = io.StringIO("".join(json.dumps(request) + "\n\n" for request in requests))
+        output_file = io.StringIO()
+
+        with mock.patch.object(dev, "evaluation_function", side_effect=layer_evaluation):
+            count, _, all_timings = dev.stream_jsonl(input_file, output_file)
+
+        results = [json.loads(line) for line in output_file.getvalue().splitlines()]
+        self.assertEqual(count, 3)
+        self.assertEqual(results[0], {"is_correct": True, "feedback": "density"})
+        self.assertEqual(results[1], {"error": "ValueError: no answer"})
+        self.assertEqual(results[2]["metadata"]["timings"][-1]["name"], "nlp")
+        self.assertEqual([sorted(timings) for timings in all_timings], [["nlp", "slm", "total"], [], ["nlp", "total"]])
+        self.assertEqual((all_timings[0]["nlp"], all_timings[0]["slm"]), (1.0, 2.0))
+
+    def test_summary_has_the_percentiles_of_each_layer(self):
+        summary = io.StringIO()
+        dev.print_summary(2, 4.0, [{"nlp": 1.0, "total": 3.0}, {"nlp": 3.0, "slm": 2.0, "total": 5.0}], file=summary)
+
+        lines = summary.getvalue().splitlines()
+        self.assertEqual(lines[0], "2 requests in 4.00s (0.50 req/s)")
+        self.assertEqual(lines[2].split(), ["nlp", "2.000s", "2.900s", "2.980s"])
+        self.assertEqual(lines[3].split(), ["slm", "2.000s", "2.000s", "2.000s"])
+        self.assertEqual(lines[4].split()[0], "total")
+        self.assertEqual(len(lines), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
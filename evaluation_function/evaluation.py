@@ -1,25 +1,90 @@
-from typing import Any
+import copy
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+import atexit
+import os
+import threading
 import time
 # from lf_toolkit.evaluation import Result, Params
 
 try:
-    from .nlp_evaluation import evaluation_function as nlp_evaluation_function
+    from .nlp_evaluation import evaluation_function as nlp_evaluation_function, check_custom_feedback, compile_responses
     from .slm_evaluation import evaluation_function as slm_evaluation_function
     # from .evaluation_response_utilities import EvaluationResponse as EvaluationResponse_old
     from .evaluation_response import Result as EvaluationResponse              # NOTE: instead of importing from lf_toolkit.evaluation as more attributes are added to the class
-    from .slm_rephraser import rephrase_feedback
+    from .slm_rephraser import TEMPLATE_FEEDBACK, rephrase_feedback
+    from .evaluation_cache import evaluation_cache, normalise_response
+    from .compiled_question import compile_question
+    from .cascade import CASCADE, cascade_bands, cascade_decision
+    from .timings import Timings, span
+    from .metrics import evaluation_metrics
+    from .profiling import PROFILING, profile_call, profile_top, profiling_active
 except ImportError:
-    from nlp_evaluation import evaluation_function as nlp_evaluation_function
+    from nlp_evaluation import evaluation_function as nlp_evaluation_function, check_custom_feedback, compile_responses
     from slm_evaluation import evaluation_function as slm_evaluation_function
     # from evaluation_response_utilities import EvaluationResponse as EvaluationResponse_old
     from evaluation_response import Result as EvaluationResponse
-    from slm_rephraser import rephrase_feedback
+    from slm_rephraser import TEMPLATE_FEEDBACK, rephrase_feedback
+    from evaluation_cache import evaluation_cache, normalise_response
+    from compiled_question import compile_question
+    from cascade import CASCADE, cascade_bands, cascade_decision
+    from timings import Timings, span
+    from metrics import evaluation_metrics
+    from profiling import PROFILING, profile_call, profile_top, profiling_active
+
+# run the NLP and SLM layers in parallel by default (can be overridden per request with params['concurrent_layers'])
+CONCURRENT_LAYERS = os.environ.get("EVALUATION_CONCURRENT_LAYERS", "false").lower() == "true"
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Executor the SLM layer runs on while the NLP layer runs in the calling thread, created on first use.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # NOTE: a single worker, as the GPT4All model is shared and not thread-safe
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slm-layer")
+            atexit.register(shutdown_executor)
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+def timed_layer(layer_function, response, answer, params, question=None, timings=None, stage="", **layer_kwargs):
+    """
+    Run an evaluation layer, returning its response and the wall-clock time it took (also recorded as the span
+    `stage` of the optional timings, which the layer records its stages in).
+    """
+    start_time = time.perf_counter()
+    with span(timings, stage):
+        layer_response = layer_function(response, answer, params, question=question, timings=timings, **layer_kwargs)
+    return layer_response, time.perf_counter() - start_time
+
+
+def nlp_keystring_scores(eval_response_nlp, question):
+    """
+    NLP keystring scores used to gate the SLM keystring checks, None if the question has no keystrings.
+    """
+    return eval_response_nlp.metadata.get("keystring-scores") if question.compiled_keystrings else None
 
 
 def evaluation_function(
     response: Any,
     answer: Any,
     params: Any,
+    question=None,
+    compiled_response=None,
 ) -> EvaluationResponse:
     """
     Function used to evaluate a student response.
@@ -50,25 +115,106 @@ def evaluation_function(
 
     Params:
     - include_test_data: A boolean that determines whether to include other data in the EvaluationResponse output
+    - concurrent_layers: A boolean that determines whether the NLP and SLM layers run in parallel
+        (the layer processing times are then wall-clock times). Defaults to EVALUATION_CONCURRENT_LAYERS
+    - cascade: A boolean that determines whether the NLP layer alone decides the responses it is confident about
+        (see cascade.cascade_decision), running the SLM layers only for the others. Defaults to EVALUATION_CASCADE
+    - cascade_bands: A dictionary overriding some of the cascade.CASCADE_BANDS
+    - keystring_gate: A boolean that determines whether the SLM layer decides the keystrings with clear NLP scores
+        without the LLM (see slm_evaluation.gate_keystrings). Only applies when the layers do not run in parallel
+    - profile: A boolean (or the number of hotspots to report) that determines whether the evaluation runs under the
+        profiler, reported as the 'profile' metadata (see profiling.profile_call). Only honoured with EVALUATION_PROFILING
+
+    With include_test_data, the wall-clock and CPU time of the stages of the evaluation (the layers, their
+    tokenization, embedding lookup, window matching and BOW scoring, each LLM call and the rephrasing) are
+    reported as the 'timings' metadata, see timings.Timings.
+
+    `question` (a CompiledQuestion of the answer and params) and `compiled_response` (a CompiledResponse of the
+    response) are optional precomputed data of the NLP layer, see evaluate_batch.
 
     Output:
     - EvaluationResponse: A class that contains the evaluation results with feedback
     """
-    start_time = time.process_time()
+    profile = params.get("profile", False) if PROFILING else False
+    if profile and not profiling_active():
+        return profiled_evaluation(response, answer, params, question, compiled_response)
 
-    eval_response = EvaluationResponse()
-    eval_response.is_correct = False
+    start_time = time.process_time()
+    start_wall_time = time.perf_counter()
     include_test_data = False
 
     if "include_test_data" in params:
         include_test_data = params["include_test_data"]
+    # NOTE: the timings are also recorded for the layer latencies and token rates of the process metrics
+    timings = Timings() if include_test_data or evaluation_metrics.enabled else None
+
+    # duplicate submissions (differing only in case, whitespace or punctuation) are served from the evaluation cache
+    cache_key = None
+    if evaluation_cache.enabled and not profile:
+        with span(timings, "evaluation_cache"):
+            cache_key = evaluation_cache.key(response, answer, params)
+            cached_result = evaluation_cache.get(cache_key)
+        if cached_result is not None:
+            if "metadata" in cached_result:
+                cached_result["metadata"]["evaluation_cache"] = "hit"
+                if include_test_data:
+                    cached_result["metadata"]["timings"] = timings.to_list()
+            evaluation_metrics.observe_evaluation(time.perf_counter() - start_wall_time, evaluation_cache_hit=True)
+            return cached_result
+
+    eval_response = EvaluationResponse()
+    eval_response.is_correct = False
+
+    # answer and keystring data (embeddings, prompts) is computed once per question and shared by both layers
+    if question is None:
+        with span(timings, "compile_question"):
+            question = compile_question(answer, params)
 
     # NOTE: Layer responses are classes and are not serialised
-    eval_response_nlp = nlp_evaluation_function(response, answer, params)
-    eval_response_slm = slm_evaluation_function(response, answer, params)
+    if params.get("cascade", CASCADE):
+        with span(timings, "nlp"):
+            eval_response_nlp = nlp_evaluation_function(response, answer, params, question=question, compiled_response=compiled_response, timings=timings)
+        decision = cascade_decision(eval_response_nlp, question, cascade_bands(params), response)
+        eval_response.add_metadata("cascade_band", decision[0] if decision is not None else "ambiguous")
+        if decision is not None:
+            # the NLP response is decisive: neither the SLM evaluation nor the rephrasing is run
+            band, is_correct, feedback = decision
+            eval_response.add_metadata("nlp_similarity_value", eval_response_nlp.metadata["similarity_value"])
+            eval_response.add_metadata("nlp_processing_time", eval_response_nlp.get_processing_time())
+            eval_response.add_metadata("slm_processing_time", 0)
+            eval_response.add_metadata("llm_cache", {"hits": 0, "misses": 0})
+            eval_response.add_feedback("feedback", feedback) # NOTE: lf_toolkit Result in evaluation_response.py
+            eval_response.is_correct = is_correct
+            eval_response.add_metadata("tag", "CASCADE_NLP_PASS" if is_correct else "CASCADE_NLP_FAIL")
+            if include_test_data:
+                eval_response.add_metadata("timings", timings.to_list())
+            eval_response.add_processing_time(time.process_time() - start_time)
+            evaluation_metrics.observe_evaluation(time.perf_counter() - start_wall_time, timings, eval_response.metadata["tag"],
+                                                  evaluation_cache_hit=False if cache_key is not None else None)
+
+            result = eval_response.to_dict(include_test_data=include_test_data)
+            if cache_key is not None:
+                evaluation_cache.put(cache_key, result)
+            return result
+        with span(timings, "slm"):
+            eval_response_slm = slm_evaluation_function(response, answer, params, question=question, keystring_scores=nlp_keystring_scores(eval_response_nlp, question), timings=timings)
+        nlp_processing_time = eval_response_nlp.get_processing_time()
+        slm_processing_time = eval_response_slm.get_processing_time()
+    elif params.get("concurrent_layers", CONCURRENT_LAYERS):
+        # the layers are independent until response_handler: GPT4All releases the GIL while the NLP layer runs
+        slm_future = get_executor().submit(timed_layer, slm_evaluation_function, response, answer, params, question, timings, "slm")
+        eval_response_nlp, nlp_processing_time = timed_layer(nlp_evaluation_function, response, answer, params, question, timings, "nlp", compiled_response=compiled_response)
+        eval_response_slm, slm_processing_time = slm_future.result()
+    else:
+        with span(timings, "nlp"):
+            eval_response_nlp = nlp_evaluation_function(response, answer, params, question=question, compiled_response=compiled_response, timings=timings)
+        with span(timings, "slm"):
+            eval_response_slm = slm_evaluation_function(response, answer, params, question=question, keystring_scores=nlp_keystring_scores(eval_response_nlp, question), timings=timings)
+        nlp_processing_time = eval_response_nlp.get_processing_time()
+        slm_processing_time = eval_response_slm.get_processing_time()
     eval_response.add_metadata("nlp_similarity_value", eval_response_nlp.metadata["similarity_value"])
-    eval_response.add_metadata("nlp_processing_time", eval_response_nlp.get_processing_time())
-    eval_response.add_metadata("slm_processing_time", eval_response_slm.get_processing_time())
+    eval_response.add_metadata("nlp_processing_time", nlp_processing_time)
+    eval_response.add_metadata("slm_processing_time", slm_processing_time)
 
     """
     Looking for different mistake scenarios
@@ -83,18 +229,72 @@ def evaluation_function(
         feedback_layers = custom_feedback_layers
 
     # STEP B: Use the SLM to rephrase the feedback
-    rephrased_feedback = rephrase_feedback(response, answer, feedback_layers, custom_feedback)
+    llm_cache_stats = dict(eval_response_slm.metadata.get("llm_cache", {"hits": 0, "misses": 0}))
+    rephrase_generation = {}
+    with span(timings, "rephrase"):
+        rephrased_feedback = rephrase_feedback(response, answer, feedback_layers, custom_feedback, llm_cache_stats, question.prompts, rephrase_generation, tag=tag, timings=timings)
+    eval_response.add_metadata("llm_cache", llm_cache_stats)
+    eval_response.add_metadata("rephrase_generation", rephrase_generation)
 
     # eval_response.add_feedback(("feedback", rephrased_feedback))
     eval_response.add_feedback("feedback", rephrased_feedback) # NOTE: lf_toolkit Result in evaluation_response.py
     eval_response.is_correct = is_correct
     eval_response.add_metadata("tag", tag)
+    if include_test_data:
+        eval_response.add_metadata("timings", timings.to_list())
 
     end_time = time.process_time()
     eval_response.add_processing_time(end_time - start_time)
+    evaluation_metrics.observe_evaluation(time.perf_counter() - start_wall_time, timings, tag, evaluation_cache_hit=False if cache_key is not None else None,
+                                          llm_cache=llm_cache_stats, rephrase_plan=rephrase_generation.get("plan"))
 
     # NOTE: expected serialised output for the server handler called by main.py
-    return eval_response.to_dict(include_test_data=include_test_data)
+    result = eval_response.to_dict(include_test_data=include_test_data)
+    if cache_key is not None:
+        evaluation_cache.put(cache_key, result)
+    return result
+
+def profiled_evaluation(response, answer, params, question=None, compiled_response=None) -> Dict[str, Any]:
+    """
+    evaluation_function() run under the profiler, with the summary of its hotspots and traced memory peak added as
+    the 'profile' metadata. The layers run one after the other, as only the calling thread is profiled, and the
+    evaluation cache is bypassed so that the evaluation itself is profiled.
+    """
+    result, summary = profile_call(evaluation_function, response, answer, dict(params, concurrent_layers=False),
+                                   question=question, compiled_response=compiled_response, top=profile_top(params["profile"]))
+    result.setdefault("metadata", {})["profile"] = summary
+    return result
+
+
+def evaluate_batch(responses: Iterable[Any], answer: Any, params: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Evaluate many responses against one answer and params (e.g. regrading a class after editing a question),
+    yielding the evaluation_function result of each response in input order.
+
+    The answer and keystring data is compiled once, the token vectors and w2v similarities of all responses are
+    computed together (see nlp_evaluation.compile_responses), and responses differing only in case, whitespace or
+    punctuation (see evaluation_cache.normalise_response) are only evaluated once, so only their distinct prompts
+    reach the LLM.
+
+    NOTE: the later variants of a response get a copy of the result of its first variant, so the parts of the result
+    quoting the response (e.g. the rephrased feedback) show the spelling of the first variant.
+    """
+    responses = list(responses)
+    question = compile_question(answer, params)
+    distinct_responses = {}
+    normalised_responses = [normalise_response(str(response)) for response in responses]
+    for normalised_response, response in zip(normalised_responses, responses):
+        distinct_responses.setdefault(normalised_response, response)
+    compiled_responses = dict(zip(distinct_responses, compile_responses(list(distinct_responses.values()), question.compiled_answer)))
+
+    # results are only kept until the last duplicate of their response was yielded
+    remaining, results = Counter(normalised_responses), {}
+    for normalised_response in normalised_responses:
+        if normalised_response not in results:
+            results[normalised_response] = evaluation_function(distinct_responses[normalised_response], answer, params,
+                question=question, compiled_response=compiled_responses.pop(normalised_response))
+        remaining[normalised_response] -= 1
+        yield results.pop(normalised_response) if remaining[normalised_response] == 0 else copy.deepcopy(results[normalised_response])
 
 def response_handler(eval_response_nlp, eval_response_slm) -> Any:
     tag = ""
@@ -103,8 +303,8 @@ def response_handler(eval_response_nlp, eval_response_slm) -> Any:
 
     if eval_response_nlp.is_correct and eval_response_slm.is_correct:
         is_correct = True
-        feedback_layers = "The response is correct (matched key points and follows the right context)."
         tag = "FEEDBACK_SLM_PASS_NLP_PASS"
+        feedback_layers = TEMPLATE_FEEDBACK[tag]
     elif eval_response_slm.is_correct and eval_response_nlp.metadata["similarity_value"] > 0.75: # set threshold in nlp_evaluation
         is_correct = False
         feedback_layers = "The response is ALMOST correct. But the student missed some key points. " + eval_response_nlp.feedback + " " + eval_response_slm.feedback
@@ -124,12 +324,6 @@ def response_handler(eval_response_nlp, eval_response_slm) -> Any:
 
     return feedback_layers, tag, is_correct
 
-def check_custom_feedback(feedback):
-    if "CUSTOM_FEEDBACK" in feedback:
-        # cut out the CUSTOM_FEEDBACK tag from the feedback and return the feedback
-        return True, feedback.replace("CUSTOM_FEEDBACK", "")
-    return False, feedback
-
 # if __name__ == "__main__":
 #     responses = [
 #         "A GAN is a type of algorithm used to detect fake data on the internet.",
@@ -0,0 +1,106 @@
+import copy
+import hashlib
+import json
+import os
+import re
+import string
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from .compiled_question import question_key
+except ImportError:
+    from compiled_question import question_key
+
+# maximum number of evaluation results kept, 0 disables the cache
+EVALUATION_CACHE_SIZE = int(os.environ.get("EVALUATION_CACHE_SIZE", "1024"))
+# seconds after which a cached result expires, 0 keeps results until they are pushed out by newer ones
+EVALUATION_CACHE_TTL = float(os.environ.get("EVALUATION_CACHE_TTL", "0"))
+
+PUNCTUATION = re.compile("[%s]" % re.escape(string.punctuation))
+
+
+def normalise_response(response: str) -> str:
+    """
+    Normalise the case, whitespace and punctuation of a response.
+
+    NOTE: stopwords are kept, as many of them change the meaning of a response (e.g. 'pressure goes up' and
+    'pressure goes down', or 'not light blue' and 'light blue').
+    """
+    return " ".join(PUNCTUATION.sub(" ", response.lower()).split())
+
+
+def canonical_params(params: Any) -> str:
+    return json.dumps(params if params is not None else {}, sort_keys=True, default=str)
+
+
+class EvaluationCache:
+    """
+    Cache of serialised evaluation results, keyed by (answer, canonical params, normalised response).
+
+    Results are evicted least recently used first once more than `capacity` are stored, or once they are
+    older than `ttl` seconds (if set). All results of a question can be dropped with invalidate() when its
+    answer or keystrings change.
+
+    Results are copied when they are put and when they are served, so that callers changing a result (e.g. annotating
+    the results of a batch) do not change the cached one.
+    """
+
+    def __init__(self, capacity: int = EVALUATION_CACHE_SIZE, ttl: float = EVALUATION_CACHE_TTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def key(self, response: Any, answer: Any, params: Any) -> Tuple[str, str]:
+        response_key = hashlib.sha256(json.dumps([canonical_params(params), normalise_response(str(response))]).encode()).hexdigest()
+        return question_key(answer, params), response_key
+
+    def get(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and time.time() - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(entry[0])
+
+    def put(self, key: Tuple[str, str], result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (copy.deepcopy(result), time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, answer: Any, params: Any) -> int:
+        """
+        Drop all cached results of the question with the given answer and keystrings, returning how many were dropped.
+        """
+        invalidated_key = question_key(answer, params)
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == invalidated_key]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+evaluation_cache = EvaluationCache()
@@ -0,0 +1,67 @@
+import unittest
+
+try:
+    from .evaluation_cache import EvaluationCache, normalise_response
+except ImportError:
+    from evaluation_cache import EvaluationCache, normalise_response
+
+
+class TestEvaluationCache(unittest.TestCase):
+    """
+        TestCase Class used to test the whole-evaluation result cache.
+    """
+
+    answer = 'Density, Velocity, Viscosity, Length'
+    params = {'keystrings': [{'string': 'density'}], 'include_test_data': True}
+
+    def test_duplicate_responses_share_a_key(self):
+        cache = EvaluationCache(capacity=10, ttl=0)
+        responses = [
+            'density,velocity,viscosity,length',
+            'Density, Velocity, Viscosity, Length',
+            '  DENSITY;  velocity, viscosity -  length.',
+        ]
+
+        keys = {cache.key(response, self.answer, self.params) for response in responses}
+        self.assertEqual(len(keys), 1)
+
+    def test_negations_are_not_normalised_away(self):
+        self.assertNotEqual(normalise_response('not light blue'), normalise_response('light blue'))
+
+    def test_opposite_responses_have_different_keys(self):
+        cache = EvaluationCache(capacity=10, ttl=0)
+        for response, opposite in [('pressure goes up', 'pressure goes down'),
+                                   ('the ball is above the line', 'the ball is below the line'),
+                                   ('heat it before mixing', 'heat it after mixing'),
+                                   ('only the density', 'the density'),
+                                   ('more viscous', 'most viscous')]:
+            self.assertNotEqual(cache.key(response, self.answer, self.params), cache.key(opposite, self.answer, self.params))
+
+    def test_params_are_part_of_the_key(self):
+        cache = EvaluationCache(capacity=10, ttl=0)
+        response = 'density,velocity,viscosity,length'
+
+        self.assertNotEqual(cache.key(response, self.answer, self.params), cache.key(response, self.answer, {}))
+
+    def test_hits_return_a_copy(self):
+        cache = EvaluationCache(capacity=10, ttl=0)
+        key = cache.key('density', self.answer, self.params)
+        cache.put(key, {'is_correct': False, 'feedback': 'feedback', 'metadata': {}})
+
+        cache.get(key)['metadata']['changed'] = True
+        self.assertEqual(cache.get(key), {'is_correct': False, 'feedback': 'feedback', 'metadata': {}})
+
+    def test_invalidate_question(self):
+        cache = EvaluationCache(capacity=10, ttl=0)
+        key = cache.key('density', self.answer, self.params)
+        other_key = cache.key('density', 'Density', self.params)
+        cache.put(key, {'is_correct': True, 'feedback': ''})
+        cache.put(other_key, {'is_correct': True, 'feedback': ''})
+
+        self.assertEqual(cache.invalidate(self.answer, self.params), 1)
+        self.assertIsNone(cache.get(key))
+        self.assertIsNotNone(cache.get(other_key))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -51,7 +51,7 @@ class Result:
         # latex: str = "",
         # simplified: str = "",
         feedback_items: List[FeedbackItem] = [],
-        metadata: Dict[str, Any] = {},
+        metadata: Dict[str, Any] = None,
         processing_time: float = 0,
         evaluation_type: str = "",
     ):
@@ -59,7 +59,7 @@ class Result:
         # self.response_latex = latex
         # self.response_simplified = simplified
         self._feedback = update_feedback({}, feedback_items)
-        self._metadata = metadata
+        self._metadata = metadata if metadata is not None else {}
         self._processing_time = processing_time
         self._evaluation_type = evaluation_type
 
@@ -0,0 +1,28 @@
+import unittest
+
+try:
+    from .evaluation_response import Result
+except ImportError:
+    from evaluation_response import Result
+
+
+class TestResult(unittest.TestCase):
+    """
+        TestCase Class used to test the evaluation results.
+    """
+
+    def test_results_have_their_own_metadata(self):
+        first, second = Result(), Result()
+        first.add_metadata('method', 'w2v')
+
+        self.assertEqual(second.metadata, {})
+        self.assertEqual(Result().to_dict(include_test_data=True), {'is_correct': False, 'feedback': '', 'tags': [], 'processing_time': 0})
+
+    def test_metadata_is_kept(self):
+        metadata = {'method': 'w2v'}
+
+        self.assertIs(Result(metadata=metadata).metadata, metadata)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,233 +1,355 @@
+import re
 import unittest
+from unittest import mock
 
 try:
-    from .evaluation import evaluation_function
+    from . import evaluation
+    from .evaluation import evaluation_function, evaluate_batch
     from .nlp_evaluation_tests import TestEvaluationFunction as NLPTestEvaluationFunction
-    # from .slm_evaluation_tests import TestEvaluationFunction as SLMTestEvaluationFunction
+    from .evaluation_cache import EvaluationCache
+    from .slm_evaluation_tests import StubTestCase, canned_verdicts, TestBatchedKeystrings, TestKeystringGate
+    from .slm_evaluation_tests import TestEvaluationFunction as SLMTestEvaluationFunction
 except ImportError:
-    from evaluation import evaluation_function
+    import evaluation
+    from evaluation import evaluation_function, evaluate_batch
     from nlp_evaluation_tests import TestEvaluationFunction as NLPTestEvaluationFunction
-    # from slm_evaluation_tests import TestEvaluationFunction as SLMTestEvaluationFunction
+    from evaluation_cache import EvaluationCache
+    from slm_evaluation_tests import StubTestCase, canned_verdicts, TestBatchedKeystrings, TestKeystringGate
+    from slm_evaluation_tests import TestEvaluationFunction as SLMTestEvaluationFunction
 
-# class TestEvaluationFunction(unittest.TestCase):
-#     """
-#         TestCase Class used to test the algorithm.
-#         ---
-#         Tests are used here to check that the algorithm written 
-#         is working as it should. 
-        
-#         It's best practise to write these tests first to get a 
-#         kind of 'specification' for how your algorithm should 
-#         work, and you should run these tests before committing 
-#         your code to AWS.
 
-#         Read the docs on how to use unittest here:
-#         https://docs.python.org/3/library/unittest.html
+class CombinedStubTestCase(StubTestCase):
+    """
+        TestCase Class running the combined evaluation against the stub LLM (see StubTestCase), without the evaluation cache.
+    """
 
-#         Use evaluation_function() to check your algorithm works 
-#         as it should.
-#     """
+    def setUp(self):
+        super().setUp()
+        patch = mock.patch.object(evaluation, "evaluation_cache", EvaluationCache(capacity=0))
+        patch.start()
+        self.addCleanup(patch.stop)
 
-#     # NOTE: Parameter defining the metadata to be included in the response of the evaluation function
-#     include_test_data = True
-
-#     def test_returns_is_correct_true(self):
-#         response, answer, params = "A xor gate takes 2 inputs", "There are 2 inputs in a xor gate", dict(include_test_data=self.include_test_data)
-#         result = evaluation_function(response, answer, params)
-
-#         self.assertEqual(result.get("is_correct"), True)
-
-#     def test_reynolds_number_is_correct(self):
-#         answer, params = 'Density, Velocity, Viscosity, Length', dict(include_test_data=self.include_test_data)
-#         correct_responses = [
-#             'density,velocity,viscosity,length',
-#             'Density,Velocity,Viscosity,Length',
-#             'density,characteristic velocity,viscosity,characteristic length',
-#             'Density,Velocity,Shear viscosity,Length',                                              
-#             'density,velocity,viscosity,lengthscale',
-#             'density,velocity,shear viscosity,length',
-#             'density,characteristic velocity,shear viscosity,characteristic lengthscale',
-#             'density,velocity,shear viscosity,characteristic lengthscale',
-#             'density,velocity,viscosity,length scale',
-#             'pressure,characteristic velocity of flow,shear viscosity,characteristic length scale', 
-#         ]
-
-#         for response in correct_responses:
-#             result = evaluation_function(response, answer, params)
-
-#             self.assertEqual(result.get("is_correct"), True, msg=f'{result}, Answer: {answer}, Response: {response}')
-
-#     def test_reynolds_number_is_incorrect(self):
-#         answer, params = 'Density, Velocity, Viscosity, Length', dict(include_test_data=self.include_test_data)
-#         incorrect_responses = [
-#             'density,,,',
-#             'rho,u,mu,L',
-#         ]
-
-#         for response in incorrect_responses:
-#             result = evaluation_function(response, answer, params)
-
-#             self.assertEqual(result.get("is_correct"), False, msg=f'{result}, Answer: {answer}, Response: {response}')
-
-#     def test_reynolds_number_is_incorrect_with_keystring(self):
-#         answer, params = 'Density, Velocity, Viscosity, Length', {'keystrings': [{'string': 'density'}, {'string': 'velocity'}, {'string': 'viscosity'}, {'string': 'length'}],
-#                                                                     'include_test_data': self.include_test_data}
-#         incorrect_responses = [
-#             'density,velocity,visc,',
-#         ]
-
-#         for response in incorrect_responses:
-#             result = evaluation_function(response, answer, params)
-
-#             self.assertEqual(result.get("is_correct"), False, msg=f'{result}, Answer: {answer}')
-
-#     def test_reynolds_number_exact_match(self):
-#         answer, params = 'Density, Velocity, Viscosity, Length', {
-#             'keystrings': [{'string': 'velocity', 'exact_match': True}],
-#             'include_test_data': self.include_test_data}
-#         incorrect_responses = [
-#             'density,speed,viscosity, length',
-#         ]
-
-#         for response in incorrect_responses:
-#             result = evaluation_function(response, answer, params)
-
-#             self.assertEqual(result.get("is_correct"), False, msg=f'{result}, Answer: {answer}')
-
-#     def test_reynolds_number_should_not_contain(self):
-#         answer, params = 'Density, Velocity, Viscosity, Length', {
-#             'keystrings': [{'string': 'direction', 'should_contain': False}],
-#             'include_test_data': self.include_test_data}
-#         incorrect_responses = [
-#             'density,speed,viscosity, length, direction',
-#         ]
-
-#         for response in incorrect_responses:
-#             result = evaluation_function(response, answer, params)
-
-#             self.assertEqual(result.get("is_correct"), False, msg=f'{result}, Answer: {answer}')
-
-#     def test_reynolds_number_custom_feedback(self):
-#         answer, params = 'Density, Velocity, Viscosity, Length', {
-#             'keystrings': [{'string': 'banana', 'custom_feedback': 'custom feedback with the word banana'}],
-#             'include_test_data': self.include_test_data}
-#         incorrect_responses = [
-#             'An incorrect response',
-#         ]
-
-#         for response in incorrect_responses:
-#             result = evaluation_function(response, answer, params)
-
-#             self.assertIn('banana', result.get("feedback"), msg=f'{result}, Answer: {answer}')
-
-#     navier_stokes_answer = "The density of the film is uniform and constant, therefore the flow is incompressible. " \
-#                            "Since we have incompressible flow, uniform viscosity, Newtonian fluid, " \
-#                            "the most appropriate set of equations for the solution of the problem is the " \
-#                            "Navier-Stokes equations. The Navier-Stokes equations in Cartesian coordinates are used: " \
-#                            "mass conservation and components of the momentum balance"
-
-#     navier_stokes_params = {'keystrings': [{'string': 'Navier-Stokes equations'}, {'string': 'mass conservation'},
-#                                                                     {'string': 'momentum balance'}, {'string': 'incompressible flow'},
-#                                                                     {'string': 'uniform viscosity'}, {'string': 'Newtonian fluid'}],
-#                             'include_test_data': include_test_data }
-
-#     def test_navier_stokes_equation(self):
-#         answer, params = self.navier_stokes_answer, dict(include_test_data=self.include_test_data)
-#         correct_responses = [
-#             #'Navier-stokes. Continuum, const and uniform density and viscosity so incompressible, newtonian. Fits all '
-#             #'requirements for navier stokes',
-#             'Navier-Stokes in a Cartesian reference coordinates would be chosen for this particular flow. This is due '
-#             'to the reason that the flow is Newtonian, the viscosity is uniform and constant. Additionally, '
-#             'the density is uniform and constant; implying that it is an incompressible flow. This flow obeys the '
-#             'main assumptions in order to employ the Navier Stokes equations.',
-#         ]
-
-#         for response in correct_responses:
-#             result = evaluation_function(response, answer, params)
-#             self.assertEqual(result.get("is_correct"), True, msg=f'{result}, Answer: {answer}')
-
-#     def test_combined_evaluation_negation(self):
-#         answer, params = 'light blue', dict(include_test_data=self.include_test_data)
-#         correct_responses = [
-#             'not light blue', 
-#             'dark blue'       
-#         ]
-
-#         for response in correct_responses:
-#             result = evaluation_function(response, answer, params)
-#             self.assertEqual(result.get("is_correct"), False, msg=f'{result}, Answer: {answer}')
-
-# class TestEvaluationComputingFunction(unittest.TestCase):
-
-#     include_test_data = True
-
-#     answer_networking_1 = "A networking algorithm is a set of rules or instructions designed to manage the operations of a computer network. These algorithms help in tasks like routing data between devices, managing traffic to avoid congestion, and ensuring data packets reach their destination efficiently and reliably."
-
-#     def test_networking_1_correct(self):
-#         answer = self.answer_networking_1
-#         responses = [
-#             "A networking algorithm is a method that helps in determining how data moves across a network, like deciding the best path for data packets to travel.",
-#             "Networking algorithms guide the way data is transferred through a network, making sure everything is sent smoothly and efficiently without congestion."
-#         ]
-#         params = {"include_test_data": True}
-
-#         for response in responses:
-#             result = evaluation_function(response, answer, params)
-#             self.assertEqual(result.get("is_correct"), True, msg=f'{result}, Answer: {answer}, Response: {response}')
+
+class TestEvaluationFunction(CombinedStubTestCase):
+    """
+        TestCase Class used to test the algorithm.
+        ---
+        Tests are used here to check that the algorithm written 
+        is working as it should. 
+        
+        It's best practise to write these tests first to get a 
+        kind of 'specification' for how your algorithm should 
+        work, and you should run these tests before committing 
+        your code to AWS.
+
+        Read the docs on how to use unittest here:
+        https://docs.python.org/3/library/unittest.html
+
+        Use evaluation_function() to check your algorithm works 
+        as it should.
+
+        NOTE: the SLM verdicts come from the stub LLM (see slm_evaluation_tests.TestEvaluationFunction)
+    """
+
+    stub_outputs = {**SLMTestEvaluationFunction.stub_outputs, **canned_verdicts({'dark blue': False})}
+
+    # NOTE: Parameter defining the metadata to be included in the response of the evaluation function
+    include_test_data = True
+
+    def test_returns_is_correct_true(self):
+        response, answer, params = "A xor gate takes 2 inputs", "There are 2 inputs in a xor gate", dict(include_test_data=self.include_test_data)
+        result = evaluation_function(response, answer, params)
+
+        self.assertEqual(result.get("is_correct"), True)
+
+    def test_reynolds_number_is_correct(self):
+        answer, params = 'Density, Velocity, Viscosity, Length', dict(include_test_data=self.include_test_data)
+        correct_responses = [
+            'density,velocity,viscosity,length',
+            'Density,Velocity,Viscosity,Length',
+            'density,characteristic velocity,viscosity,characteristic length',
+            'Density,Velocity,Shear viscosity,Length',                                              
+            'density,velocity,viscosity,lengthscale',
+            'density,velocity,shear viscosity,length',
+            'density,characteristic velocity,shear viscosity,characteristic lengthscale',
+            'density,velocity,shear viscosity,characteristic lengthscale',
+            'density,velocity,viscosity,length scale',
+            'pressure,characteristic velocity of flow,shear viscosity,characteristic length scale', 
+        ]
+
+        for response in correct_responses:
+            result = evaluation_function(response, answer, params)
+
+            self.assertEqual(result.get("is_correct"), True, msg=f'{result}, Answer: {answer}, Response: {response}')
+
+    def test_reynolds_number_is_incorrect(self):
+        answer, params = 'Density, Velocity, Viscosity, Length', dict(include_test_data=self.include_test_data)
+        incorrect_responses = [
+            'density,,,',
+            'rho,u,mu,L',
+        ]
+
+        for response in incorrect_responses:
+            result = evaluation_function(response, answer, params)
+
+            self.assertEqual(result.get("is_correct"), False, msg=f'{result}, Answer: {answer}, Response: {response}')
+
+    def test_reynolds_number_is_incorrect_with_keystring(self):
+        answer, params = 'Density, Velocity, Viscosity, Length', {'keystrings': [{'string': 'density'}, {'string': 'velocity'}, {'string': 'viscosity'}, {'string': 'length'}],
+                                                                    'include_test_data': self.include_test_data}
+        incorrect_responses = [
+            'density,velocity,visc,',
+        ]
+
+        for response in incorrect_responses:
+            result = evaluation_function(response, answer, params)
+
+            self.assertEqual(result.get("is_correct"), False, msg=f'{result}, Answer: {answer}')
+
+    def test_reynolds_number_exact_match(self):
+        answer, params = 'Density, Velocity, Viscosity, Length', {
+            'keystrings': [{'string': 'velocity', 'exact_match': True}],
+            'include_test_data': self.include_test_data}
+        incorrect_responses = [
+            'density,speed,viscosity, length',
+        ]
+
+        for response in incorrect_responses:
+            result = evaluation_function(response, answer, params)
+
+            self.assertEqual(result.get("is_correct"), False, msg=f'{result}, Answer: {answer}')
+
+    def test_reynolds_number_should_not_contain(self):
+        answer, params = 'Density, Velocity, Viscosity, Length', {
+            'keystrings': [{'string': 'direction', 'should_contain': False}],
+            'include_test_data': self.include_test_data}
+        incorrect_responses = [
+            'density,speed,viscosity, length, direction',
+        ]
+
+        for response in incorrect_responses:
+            result = evaluation_function(response, answer, params)
+
+            self.assertEqual(result.get("is_correct"), False, msg=f'{result}, Answer: {answer}')
+
+    def test_reynolds_number_custom_feedback(self):
+        answer, params = 'Density, Velocity, Viscosity, Length', {
+            'keystrings': [{'string': 'banana', 'custom_feedback': 'custom feedback with the word banana'}],
+            'include_test_data': self.include_test_data}
+        incorrect_responses = [
+            'An incorrect response',
+        ]
+
+        for response in incorrect_responses:
+            result = evaluation_function(response, answer, params)
+
+            self.assertIn('banana', result.get("feedback"), msg=f'{result}, Answer: {answer}')
+
+    navier_stokes_answer = "The density of the film is uniform and constant, therefore the flow is incompressible. " \
+                           "Since we have incompressible flow, uniform viscosity, Newtonian fluid, " \
+                           "the most appropriate set of equations for the solution of the problem is the " \
+                           "Navier-Stokes equations. The Navier-Stokes equations in Cartesian coordinates are used: " \
+                           "mass conservation and components of the momentum balance"
+
+    navier_stokes_params = {'keystrings': [{'string': 'Navier-Stokes equations'}, {'string': 'mass conservation'},
+                                                                    {'string': 'momentum balance'}, {'string': 'incompressible flow'},
+                                                                    {'string': 'uniform viscosity'}, {'string': 'Newtonian fluid'}],
+                            'include_test_data': include_test_data }
+
+    def test_navier_stokes_equation(self):
+        answer, params = self.navier_stokes_answer, dict(include_test_data=self.include_test_data)
+        correct_responses = [
+            #'Navier-stokes. Continuum, const and uniform density and viscosity so incompressible, newtonian. Fits all '
+            #'requirements for navier stokes',
+            'Navier-Stokes in a Cartesian reference coordinates would be chosen for this particular flow. This is due '
+            'to the reason that the flow is Newtonian, the viscosity is uniform and constant. Additionally, '
+            'the density is uniform and constant; implying that it is an incompressible flow. This flow obeys the '
+            'main assumptions in order to employ the Navier Stokes equations.',
+        ]
+
+        for response in correct_responses:
+            result = evaluation_function(response, answer, params)
+            self.assertEqual(result.get("is_correct"), True, msg=f'{result}, Answer: {answer}')
+
+    def test_combined_evaluation_negation(self):
+        answer, params = 'light blue', dict(include_test_data=self.include_test_data)
+        correct_responses = [
+            'not light blue', 
+            'dark blue'       
+        ]
+
+        for response in correct_responses:
+            result = evaluation_function(response, answer, params)
+            self.assertEqual(result.get("is_correct"), False, msg=f'{result}, Answer: {answer}')
+
+    def test_cascade_evaluation_negation(self):
+        # NOTE: the NLP layer finds 'not light blue' as similar as the answer itself, so the cascade must leave it to the SLM
+        answer, params = 'light blue', dict(include_test_data=self.include_test_data, cascade=True)
+        result, prompts = self.prompts(evaluation_function, 'not light blue', answer, params)
+
+        self.assertEqual(result["metadata"]["cascade_band"], "ambiguous")
+        self.assertTrue(any("Response='not light blue'" in prompt for prompt in prompts))
+        self.assertEqual(result.get("is_correct"), False, msg=f'{result}, Answer: {answer}')
+
+class TestEvaluationComputingFunction(CombinedStubTestCase):
+
+    # NOTE: the stub LLM finds enough of the words of these wrong responses in the answers, unlike the model
+    stub_outputs = canned_verdicts({
+        "A networking algorithm is the software used to connect computers to the internet, kind of like Wi-Fi or Bluetooth.": False,
+        "A networking algorithm is a program that sends data from one computer to another.": False,
+        "It’s a set of steps or instructions used in networks to control how information is sent and received between devices.": False,
+        "A GAN is a type of algorithm used to detect fake data on the internet.": False,
+        "A GAN is a network that generates data based on fake examples.": False,
+        "It’s a model where two networks compete: one creates data, and the other tries to detect if it’s real or not. This makes the generator get better over time.": False,
+    })
+
+    include_test_data = True
+
+    answer_networking_1 = "A networking algorithm is a set of rules or instructions designed to manage the operations of a computer network. These algorithms help in tasks like routing data between devices, managing traffic to avoid congestion, and ensuring data packets reach their destination efficiently and reliably."
+
+    def test_networking_1_correct(self):
+        answer = self.answer_networking_1
+        responses = [
+            "A networking algorithm is a method that helps in determining how data moves across a network, like deciding the best path for data packets to travel.",
+            "Networking algorithms guide the way data is transferred through a network, making sure everything is sent smoothly and efficiently without congestion."
+        ]
+        params = {"include_test_data": True}
+
+        for response in responses:
+            result = evaluation_function(response, answer, params)
+            self.assertEqual(result.get("is_correct"), True, msg=f'{result}, Answer: {answer}, Response: {response}')
     
-#     def test_networking_1_wrong(self):
-#         answer = self.answer_networking_1
-#         responses = [
-#             "A networking algorithm is the software used to connect computers to the internet, kind of like Wi-Fi or Bluetooth.",
-#             "A networking algorithm is a program that sends data from one computer to another.",
-#             "It’s a set of steps or instructions used in networks to control how information is sent and received between devices.", #similarity 0.69 < threshold , recommend to mention 'routing'
-#         ]
-#         params = {"include_test_data": True}
-
-#         for response in responses:
-#             result = evaluation_function(response, answer, params)
-#             self.assertEqual(result.get("is_correct"), False, msg=f'{result}, Answer: {answer}, Response: {response}')
-
-#     answer_ml_1 = "A Generative Adversarial Network (GAN) is a type of machine learning model composed of two neural networks: a generator and a discriminator. The generator creates fake data, while the discriminator tries to distinguish between real and fake data. Through this adversarial process, both networks improve over time, and the generator eventually becomes capable of producing data that closely resembles the real data."
-
-#     def test_ml_1_correct(self):
-#         answer = self.answer_ml_1
-#         responses = [
-#             "A GAN is a machine learning system with two networks: one generates fake data, and the other tries to spot the fake from the real, helping both improve.",
-#             "A GAN uses two neural networks that work against each other. The generator makes fake data, and the discriminator figures out if it’s real or fake."
-#         ]
-#         params = { 
-#             "keystrings": [{"string": "generator of fake data"}, {"string": "discriminates fake from real"}, {"string": "two neural networks"}],
-#             "include_test_data": True}
-
-#         for response in responses:
-#             result = evaluation_function(response, answer, params)
-#             self.assertEqual(result.get("is_correct"), True, msg=f'{result}, Answer: {answer}, Response: {response}')
-
-#     def test_ml_1_wrong(self):
-#         answer = self.answer_ml_1
-#         responses = [
-#             "A GAN is a type of algorithm used to detect fake data on the internet.",
-#             "A GAN is a network that generates data based on fake examples."
-#         ]
-#         params = {"include_test_data": True}
-
-#         for response in responses:
-#             result = evaluation_function(response, answer, params)
-#             self.assertEqual(result.get("is_correct"), False, msg=f'{result}, Answer: {answer}, Response: {response}')
-
-#     def test_ml_2_wrong(self):
-#         answer = self.answer_ml_1
-#         responses = [
-#             "It’s a model where two networks compete: one creates data, and the other tries to detect if it’s real or not. This makes the generator get better over time." # similarity of 0.71, not enough detail regarding 'generator of fake data'
-#         ]
-#         params = {
-#             "keystrings": [{"string": "generator of fake data"}, {"string": "discriminates fake from real"}, {"string": "two neural networks"}],
-#             "include_test_data": True}
-
-#         for response in responses:
-#             result = evaluation_function(response, answer, params)
-#             self.assertEqual(result.get("is_correct"), False, msg=f'{result}, Answer: {answer}, Response: {response}')
+    def test_networking_1_wrong(self):
+        answer = self.answer_networking_1
+        responses = [
+            "A networking algorithm is the software used to connect computers to the internet, kind of like Wi-Fi or Bluetooth.",
+            "A networking algorithm is a program that sends data from one computer to another.",
+            "It’s a set of steps or instructions used in networks to control how information is sent and received between devices.", #similarity 0.69 < threshold , recommend to mention 'routing'
+        ]
+        params = {"include_test_data": True}
+
+        for response in responses:
+            result = evaluation_function(response, answer, params)
+            self.assertEqual(result.get("is_correct"), False, msg=f'{result}, Answer: {answer}, Response: {response}')
+
+    answer_ml_1 = "A Generative Adversarial Network (GAN) is a type of machine learning model composed of two neural networks: a generator and a discriminator. The generator creates fake data, while the discriminator tries to distinguish between real and fake data. Through this adversarial process, both networks improve over time, and the generator eventually becomes capable of producing data that closely resembles the real data."
+
+    def test_ml_1_correct(self):
+        answer = self.answer_ml_1
+        responses = [
+            "A GAN is a machine learning system with two networks: one generates fake data, and the other tries to spot the fake from the real, helping both improve.",
+            "A GAN uses two neural networks that work against each other. The generator makes fake data, and the discriminator figures out if it’s real or fake."
+        ]
+        params = { 
+            "keystrings": [{"string": "generator of fake data"}, {"string": "discriminates fake from real"}, {"string": "two neural networks"}],
+            "include_test_data": True}
+
+        for response in responses:
+            result = evaluation_function(response, answer, params)
+            self.assertEqual(result.get("is_correct"), True, msg=f'{result}, Answer: {answer}, Response: {response}')
+
+    def test_ml_1_wrong(self):
+        answer = self.answer_ml_1
+        responses = [
+            "A GAN is a type of algorithm used to detect fake data on the internet.",
+            "A GAN is a network that generates data based on fake examples."
+        ]
+        params = {"include_test_data": True}
+
+        for response in responses:
+            result = evaluation_function(response, answer, params)
+            self.assertEqual(result.get("is_correct"), False, msg=f'{result}, Answer: {answer}, Response: {response}')
+
+    def test_ml_2_wrong(self):
+        answer = self.answer_ml_1
+        responses = [
+            "It’s a model where two networks compete: one creates data, and the other tries to detect if it’s real or not. This makes the generator get better over time." # similarity of 0.71, not enough detail regarding 'generator of fake data'
+        ]
+        params = {
+            "keystrings": [{"string": "generator of fake data"}, {"string": "discriminates fake from real"}, {"string": "two neural networks"}],
+            "include_test_data": True}
+
+        for response in responses:
+            result = evaluation_function(response, answer, params)
+            self.assertEqual(result.get("is_correct"), False, msg=f'{result}, Answer: {answer}, Response: {response}')
+
+class TestEvaluationCacheHits(StubTestCase):
+    """
+        TestCase Class used to test the combined evaluation served from the evaluation cache.
+    """
+
+    def setUp(self):
+        super().setUp()
+        patch = mock.patch.object(evaluation, "evaluation_cache", EvaluationCache(capacity=8))
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_variants_skip_both_layers_and_are_unaffected_by_changes_to_earlier_results(self):
+        answer, params = 'light blue', dict(include_test_data=True)
+        first = evaluation_function('Light blue.', answer, params)
+        expected = (first['is_correct'], first['feedback'], first['metadata']['tag'], dict(first['metadata']['llm_cache']))
+        first['feedback'] = 'changed'
+        first['metadata']['llm_cache']['hits'] = 99
+
+        with mock.patch.object(evaluation, 'nlp_evaluation_function') as nlp, mock.patch.object(evaluation, 'slm_evaluation_function') as slm:
+            second, prompts = self.prompts(evaluation_function, 'light  BLUE', answer, params)
+
+        self.assertEqual((prompts, nlp.call_count, slm.call_count), ([], 0, 0))
+        self.assertEqual(second['metadata']['evaluation_cache'], 'hit')
+        self.assertEqual((second['is_correct'], second['feedback'], second['metadata']['tag'], second['metadata']['llm_cache']), expected)
+
+
+class TestEvaluateBatch(unittest.TestCase):
+    """
+        TestCase Class used to test the batch evaluation of many responses to one answer.
+    """
+
+    answer = 'Density, Velocity, Viscosity, Length'
+    params = {'keystrings': [{'string': 'density'}]}
+
+    def evaluate_batch(self, responses):
+        def response_evaluation(response, answer, params, question=None, compiled_response=None):
+            return {'is_correct': False, 'feedback': response, 'metadata': {'keystrings': [question.key]}}
+
+        with mock.patch.object(evaluation, 'evaluation_function', side_effect=response_evaluation) as evaluated:
+            results = list(evaluate_batch(responses, self.answer, self.params))
+        return results, [call.args[0] for call in evaluated.call_args_list]
+
+    def test_duplicate_responses_are_evaluated_once_in_input_order(self):
+        responses = ['density, velocity', 'pressure', 'Density velocity.', 'DENSITY;  velocity', 'pressure!']
+        results, evaluated = self.evaluate_batch(responses)
+
+        self.assertEqual(evaluated, ['density, velocity', 'pressure'])
+        self.assertEqual([result['feedback'] for result in results],
+                         ['density, velocity', 'pressure', 'density, velocity', 'density, velocity', 'pressure'])
+
+    def test_opposite_responses_are_evaluated_separately(self):
+        results, evaluated = self.evaluate_batch(['pressure goes up', 'pressure goes down', 'the flow is above', 'the flow is below'])
+
+        self.assertEqual(evaluated, ['pressure goes up', 'pressure goes down', 'the flow is above', 'the flow is below'])
+
+    def test_duplicates_get_their_own_copy_of_the_result(self):
+        results, _ = self.evaluate_batch(['density', 'Density', 'density.'])
+        results[0]['metadata']['keystrings'].append('changed')
+        results[1]['feedback'] = 'changed'
+
+        self.assertEqual([len(result['metadata']['keystrings']) for result in results], [2, 1, 1])
+        self.assertEqual(results[2]['feedback'], 'density')
+
+class TestEvaluateBatchEvaluations(CombinedStubTestCase):
+    """
+        TestCase Class used to test the batch evaluation against the stub LLM.
+    """
+
+    stub_outputs = canned_verdicts({'not light blue': False})
+
+    def test_variants_are_evaluated_once_and_yielded_in_input_order(self):
+        responses = ['Light blue', 'not light blue', 'light  blue.', 'Not light BLUE!', 'LIGHT BLUE']
+        results, prompts = self.prompts(lambda: list(evaluate_batch(responses, 'light blue', dict())))
+
+        self.assertEqual([result['is_correct'] for result in results], [True, False, True, False, True])
+        self.assertEqual([match.group(1) for match in map(re.compile(r"Response='(.*)' & Answer=").search, prompts) if match],
+                         ['Light blue', 'not light blue'])
 
 # def load_tests(loader, tests, pattern):
 #     """
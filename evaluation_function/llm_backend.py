@@ -0,0 +1,179 @@
+import functools
+import os
+import re
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Iterator, Optional
+
+try:
+    from . import llm_cache
+    from .llm_cache import StopCondition, cached_generate, generation_key
+    from .stub_llm import StubModel
+    from .timings import Timings
+except ImportError:
+    import llm_cache
+    from llm_cache import StopCondition, cached_generate, generation_key
+    from stub_llm import StubModel
+    from timings import Timings
+
+# call sites of the LLM: the True/False checks of slm_evaluation and the feedback rephrasing of slm_rephraser
+CALL_SITES = ("verdict", "rephrase")
+
+# backend and model file of every call site, which SLM_VERDICT_BACKEND / SLM_VERDICT_MODEL and
+# SLM_REPHRASE_BACKEND / SLM_REPHRASE_MODEL override per call site (e.g. a smaller model for the True/False checks)
+SLM_BACKEND = os.environ.get("SLM_BACKEND", "gpt4all")
+SLM_MODEL = os.environ.get("SLM_MODEL", "Phi-3.5-mini-instruct-Q6_K.gguf")
+# directory of the GGUF model files
+SLM_MODEL_PATH = os.environ.get("SLM_MODEL_PATH", "evaluation_function/models/")
+
+
+def load_gpt4all(model_file: str):
+    # NOTE: imported here, so that the other backends do not need gpt4all
+    from gpt4all import GPT4All
+    return GPT4All(model_name=model_file, model_path=SLM_MODEL_PATH, allow_download=False, device="cpu")
+
+
+def load_stub(model_file: str):
+    return StubModel()
+
+
+# loaders of the backends by name, returning a GPT4All-like model for a model file (see register_backend)
+BACKENDS: Dict[str, Callable[[str], Any]] = {
+    "gpt4all": load_gpt4all,
+    "stub": load_stub,
+}
+
+
+def register_backend(name: str, loader: Callable[[str], Any]) -> None:
+    """
+    Make a backend selectable by name. The loader returns a model for a model file, with the GPT4All interface used by
+    the SLM layer: generate(prompt, max_tokens=..., callback=..., streaming=..., **sampling settings),
+    chat_session(), current_chat_session and config['path'].
+    """
+    BACKENDS[name] = loader
+    load_backend.cache_clear()
+
+
+class LLMBackend:
+    """
+    A loaded model behind one or more LLM call sites, with generate, classify and stream going through the
+    generation cache (see llm_cache.cached_generate).
+    """
+
+    def __init__(self, name: str, model: Any):
+        self.name = name
+        self.model = model
+
+    def generate(self, prompt: str, max_tokens: int, cache_stats: Optional[Dict[str, int]] = None, stop: Optional[StopCondition] = None,
+                 generation_stats: Optional[Dict[str, Any]] = None, prefix: str = "", timings: Optional[Timings] = None,
+                 stage: str = "llm", **generate_kwargs) -> str:
+        """
+        cached_generate of the model. With `timings`, the call is recorded as the span `stage` with the backend, whether
+        it was a cache hit, the prompt and generated tokens and the tokens per second.
+        """
+        if timings is None:
+            return cached_generate(self.model, prompt, max_tokens=max_tokens, cache_stats=cache_stats, stop=stop,
+                                   generation_stats=generation_stats, prefix=prefix, **generate_kwargs)
+
+        generation_stats = generation_stats if generation_stats is not None else {}
+        call_cache_stats = {"hits": 0, "misses": 0}
+        with timings.span(stage, backend=self.name) as record:
+            generation = cached_generate(self.model, prompt, max_tokens=max_tokens, cache_stats=call_cache_stats, stop=stop,
+                                         generation_stats=generation_stats, prefix=prefix, **generate_kwargs)
+            cache_hit = call_cache_stats["hits"] > 0
+            generated_tokens = generation_stats.get("tokens", 0)
+            seconds = generation_stats.get("seconds", 0.0)
+            record.update(cache_hit=cache_hit, prompt_tokens=None if cache_hit else self.prompt_tokens(generated_tokens),
+                          generated_tokens=generated_tokens, tokens_per_second=generated_tokens / seconds if seconds > 0 else None)
+        if cache_stats is not None:
+            for outcome, count in call_cache_stats.items():
+                cache_stats[outcome] += count
+        return generation
+
+    def prompt_tokens(self, generated_tokens: int) -> Optional[int]:
+        """
+        Tokens in the context of the model before its last generation (the templated prompt, and the chat session
+        history if any), None if the model does not expose its context.
+        """
+        context = getattr(getattr(self.model, "model", None), "context", None)
+        n_past = getattr(context, "n_past", None)
+        return max(n_past - generated_tokens, 0) if n_past is not None else None
+
+    def classify(self, prompt: str, cache_stats: Optional[Dict[str, int]] = None, prefix: str = "", timings: Optional[Timings] = None,
+                 stage: str = "llm") -> Optional[bool]:
+        """
+        Answer of the model to a True/False prompt from its single next word: True, False, or None for any other word.
+
+        NOTE: GPT4All does not expose token likelihoods, so this is not a calibrated score: the next token is decoded
+        greedily (temp=0, top_k=1) and generation stops after the first token containing a letter.
+        """
+        result = self.generate(prompt, max_tokens=3, cache_stats=cache_stats, stop=StopCondition(first_word=True), temp=0, top_k=1, prefix=prefix,
+                               timings=timings, stage=stage)
+        return process_verdict(result)
+
+    def stream(self, prompt: str, max_tokens: int, cache_stats: Optional[Dict[str, int]] = None, stop: Optional[StopCondition] = None,
+               **generate_kwargs) -> Iterator[str]:
+        """
+        The tokens of generate(prompt, max_tokens, ...) as they are generated; a generation served from the cache is
+        yielded at once. The complete generation is added to the cache.
+        """
+        key = None
+        if llm_cache.generation_cache.enabled:
+            key = generation_key(self.model, prompt, max_tokens, stop, **generate_kwargs)
+            generation = llm_cache.generation_cache.get(key)
+            if cache_stats is not None:
+                cache_stats["hits" if generation is not None else "misses"] += 1
+            if generation is not None:
+                yield generation
+                return
+
+        if stop is not None:
+            generate_kwargs = dict(generate_kwargs, callback=stop.callback())
+        output = []
+        for token in self.model.generate(prompt, max_tokens=max_tokens, streaming=True, **generate_kwargs):
+            output.append(token)
+            yield token
+        if key is not None:
+            llm_cache.generation_cache.put(key, "".join(output))
+
+    def chat_session(self):
+        chat_session = getattr(self.model, "chat_session", None)
+        return chat_session() if chat_session is not None else nullcontext()
+
+
+def process_verdict(result: Any) -> Optional[bool]:
+    word = re.search(r"[a-z]+", result.lower())
+    if word is not None:
+        word = word.group()
+        if "true".startswith(word) or word.startswith("true"):
+            return True
+        if "false".startswith(word) or word.startswith("false"):
+            return False
+    return None
+
+
+def backend_settings(call_site: str) -> Dict[str, str]:
+    """
+    {'backend': ..., 'model': ...} of a call site, from its SLM_<CALL_SITE>_BACKEND / SLM_<CALL_SITE>_MODEL environment
+    variables, defaulting to SLM_BACKEND / SLM_MODEL.
+    """
+    if call_site not in CALL_SITES:
+        raise ValueError(f"Unknown LLM call site '{call_site}', expected one of {', '.join(CALL_SITES)}")
+    return {
+        "backend": os.environ.get(f"SLM_{call_site.upper()}_BACKEND", SLM_BACKEND),
+        "model": os.environ.get(f"SLM_{call_site.upper()}_MODEL", SLM_MODEL),
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def load_backend(backend: str, model_file: str) -> LLMBackend:
+    """
+    The LLMBackend of a model file, loaded once and shared by all call sites using it.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend '{backend}', expected one of {', '.join(BACKENDS)}")
+    return LLMBackend(backend if backend == "stub" else f"{backend}:{model_file}", BACKENDS[backend](model_file))
+
+
+def backend_for(call_site: str) -> LLMBackend:
+    settings = backend_settings(call_site)
+    return load_backend(settings["backend"], settings["model"])
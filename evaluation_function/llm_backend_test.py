@@ -0,0 +1,95 @@
+import os
+import unittest
+from unittest import mock
+
+try:
+    from . import llm_cache
+    from .llm_backend import backend_for, backend_settings, load_backend, register_backend, BACKENDS
+    from .llm_cache import GenerationCache, StopCondition
+    from .slm_instructions import build_instruction
+    from .stub_llm import StubModel
+    from .timings import Timings
+except ImportError:
+    import llm_cache
+    from llm_backend import backend_for, backend_settings, load_backend, register_backend, BACKENDS
+    from llm_cache import GenerationCache, StopCondition
+    from slm_instructions import build_instruction
+    from stub_llm import StubModel
+    from timings import Timings
+
+
+class TestLLMBackend(unittest.TestCase):
+    """
+        TestCase Class used to test the LLM backends of the call sites.
+    """
+
+    answer = 'Density, Velocity, Viscosity, Length'
+
+    def setUp(self):
+        self.original_cache = llm_cache.generation_cache
+        llm_cache.generation_cache = GenerationCache(capacity=10, max_age=0, path="")
+
+    def tearDown(self):
+        llm_cache.generation_cache = self.original_cache
+
+    def test_call_sites_override_the_default_backend(self):
+        with mock.patch.dict(os.environ, {"SLM_VERDICT_BACKEND": "stub", "SLM_VERDICT_MODEL": "small.gguf"}):
+            self.assertEqual(backend_settings("verdict"), {"backend": "stub", "model": "small.gguf"})
+            self.assertNotEqual(backend_settings("rephrase")["model"], "small.gguf")
+        with self.assertRaises(ValueError):
+            backend_settings("summary")
+
+    def test_registered_backends_are_loaded_once_per_model_file(self):
+        loaded = []
+        register_backend("test", lambda model_file: loaded.append(model_file) or StubModel())
+        self.addCleanup(load_backend.cache_clear)
+        self.addCleanup(BACKENDS.pop, "test", None)
+        with mock.patch.dict(os.environ, {"SLM_VERDICT_BACKEND": "test", "SLM_REPHRASE_BACKEND": "test",
+                                          "SLM_VERDICT_MODEL": "small.gguf", "SLM_REPHRASE_MODEL": "large.gguf"}):
+            verdict_backend, rephrase_backend = backend_for("verdict"), backend_for("rephrase")
+            self.assertIs(backend_for("verdict"), verdict_backend)
+        self.assertEqual(loaded, ["small.gguf", "large.gguf"])
+        self.assertEqual((verdict_backend.name, rephrase_backend.name), ("test:small.gguf", "test:large.gguf"))
+
+    def test_generate_and_classify(self):
+        backend, cache_stats = load_backend("stub", ""), {"hits": 0, "misses": 0}
+        prompt = build_instruction('density, velocity, viscosity', self.answer, 'similarity')
+
+        self.assertEqual(backend.generate(prompt, max_tokens=10, cache_stats=cache_stats), ' True')
+        self.assertIs(backend.classify(prompt, cache_stats), True)
+        self.assertIs(backend.classify(build_instruction('atoms form molecules', self.answer, 'similarity')), False)
+        self.assertEqual(cache_stats, {"hits": 0, "misses": 2})
+
+    def test_classify_has_no_verdict_for_other_words(self):
+        backend = load_backend("stub", "")
+        backend.model.outputs['Response='] = ' Maybe'
+        try:
+            self.assertIsNone(backend.classify(build_instruction('density', self.answer, 'similarity')))
+        finally:
+            backend.model.outputs.clear()
+
+    def test_llm_calls_are_recorded_in_the_timings(self):
+        backend, cache_stats, timings = load_backend("stub", ""), {"hits": 0, "misses": 0}, Timings()
+        prompt = build_instruction('density', self.answer, 'rephrase', 'The response is missing the velocity.')
+
+        for _ in range(2):
+            backend.generate(prompt, max_tokens=150, cache_stats=cache_stats, timings=timings, stage="rephrase.llm")
+        self.assertEqual(cache_stats, {"hits": 1, "misses": 1})
+        live, cached = timings.to_list()
+        self.assertEqual((live["name"], live["backend"], live["cache_hit"], live["generated_tokens"]), ("rephrase.llm", "stub", False, 6))
+        self.assertEqual((cached["cache_hit"], cached["generated_tokens"], cached["tokens_per_second"]), (True, 0, None))
+
+    def test_streamed_generations_are_cached(self):
+        backend, cache_stats = load_backend("stub", ""), {"hits": 0, "misses": 0}
+        prompt = build_instruction('density', self.answer, 'rephrase', 'The response is missing the velocity.')
+        stop = StopCondition(max_words=3)
+
+        tokens = list(backend.stream(prompt, max_tokens=150, cache_stats=cache_stats, stop=stop))
+        self.assertEqual(tokens, [' The', ' response', ' is'])
+        self.assertEqual(list(backend.stream(prompt, max_tokens=150, cache_stats=cache_stats, stop=stop)), [' The response is'])
+        self.assertEqual(cache_stats, {"hits": 1, "misses": 1})
+        self.assertEqual(backend.model.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+try:
+    from .prefix_cache import prefix_cache
+except ImportError:
+    from prefix_cache import prefix_cache
+
+# maximum number of generations kept in memory, 0 disables the cache
+LLM_CACHE_SIZE = int(os.environ.get("LLM_CACHE_SIZE", "1024"))
+# seconds after which a cached generation is evicted, 0 keeps generations until they are pushed out by newer ones
+LLM_CACHE_MAX_AGE = float(os.environ.get("LLM_CACHE_MAX_AGE", "0"))
+# optional SQLite file for a persistent tier that survives restarts
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", "")
+# maximum number of generations kept in the SQLite file (oldest deleted first), 0 lets the file grow without limit
+LLM_CACHE_MAX_ROWS = int(os.environ.get("LLM_CACHE_MAX_ROWS", "100000"))
+
+
+class GenerationCache:
+    """
+    Cache for LLM generations with an in-memory LRU tier and an optional on-disk SQLite tier.
+
+    Entries are evicted once the memory tier holds more than `capacity` entries (least recently used first)
+    or once they are older than `max_age` seconds (if set). Hits of the SQLite tier are promoted to memory.
+    The SQLite tier keeps the `max_rows` most recently put generations (if set).
+    """
+
+    def __init__(self, capacity: int = LLM_CACHE_SIZE, max_age: float = LLM_CACHE_MAX_AGE, path: str = LLM_CACHE_PATH,
+                 max_rows: int = LLM_CACHE_MAX_ROWS):
+        self.capacity = capacity
+        self.max_age = max_age
+        self.max_rows = max_rows
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS generations (key TEXT PRIMARY KEY, text TEXT, created REAL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS generations_created ON generations (created)")
+            if max_age:
+                self._db.execute("DELETE FROM generations WHERE created < ?", (time.time() - max_age,))
+            self._trim()
+            self._db.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    @staticmethod
+    def key(model_file: str, prompt: str, max_tokens: int, settings: Dict[str, Any]) -> str:
+        payload = json.dumps([model_file, prompt, max_tokens, settings], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _expired(self, created: float) -> bool:
+        return bool(self.max_age) and time.time() - created > self.max_age
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[1]):
+                del self._entries[key]
+                entry = None
+            if entry is None and self._db is not None:
+                row = self._db.execute("SELECT text, created FROM generations WHERE key = ?", (key,)).fetchone()
+                if row is not None and not self._expired(row[1]):
+                    entry = row
+                    self._store(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, text: str) -> None:
+        with self._lock:
+            entry = (text, time.time())
+            self._store(key, entry)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO generations (key, text, created) VALUES (?, ?, ?)", (key, *entry))
+                self._trim()
+                self._db.commit()
+
+    def _trim(self) -> None:
+        if self.max_rows:
+            self._db.execute("DELETE FROM generations WHERE key IN "
+                             "(SELECT key FROM generations ORDER BY created DESC, rowid DESC LIMIT -1 OFFSET ?)", (self.max_rows,))
+
+    def _store(self, key: str, entry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM generations")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+generation_cache = GenerationCache()
+
+
+class StopCondition:
+    """
+    Condition ending a generation early, checked on every generated token through the GPT4All response callback:
+    - first_word: stop once a token containing a letter was generated
+    - newline: stop once a newline was generated
+    - max_words: stop once more than this many words were generated (0 for no limit)
+    """
+
+    def __init__(self, first_word: bool = False, newline: bool = False, max_words: int = 0):
+        self.first_word = first_word
+        self.newline = newline
+        self.max_words = max_words
+
+    def settings(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+    def callback(self):
+        text = ""
+
+        def callback(token_id: int, response: str) -> bool:
+            nonlocal text
+            text += response
+            # NOTE: GPT4All stops generating once the callback returns False
+            if self.first_word and any(character.isalpha() for character in response):
+                return False
+            if self.newline and "\n" in response:
+                return False
+            return not (self.max_words and len(text.split()) > self.max_words)
+        return callback
+
+
+def generation_key(model, prompt: str, max_tokens: int, stop: Optional[StopCondition] = None, **generate_kwargs) -> str:
+    """
+    Cache key of model.generate(prompt, max_tokens=max_tokens, **generate_kwargs), stopped early by `stop`,
+    in the model's current chat session.
+    """
+    model_file = getattr(model, "config", {}).get("path", type(model).__name__)
+    settings = dict(generate_kwargs, chat_session=getattr(model, "current_chat_session", None))
+    if stop is not None:
+        settings["stop"] = stop.settings()
+    return generation_cache.key(model_file, prompt, max_tokens, settings)
+
+
+def preload_generations(model, entries) -> int:
+    """
+    Put pre-generated {'prompt': ..., 'max_tokens': ..., 'stop': StopCondition settings or None, 'text': ...} outputs
+    of the model into the generation cache, as generated outside a chat session without other settings.
+    Returns the number of generations added.
+    """
+    if not generation_cache.enabled:
+        return 0
+    for entry in entries:
+        stop = StopCondition(**entry["stop"]) if entry.get("stop") else None
+        generation_cache.put(generation_key(model, entry["prompt"], entry["max_tokens"], stop), entry["text"])
+    return len(entries)
+
+
+def cached_generate(model, prompt: str, max_tokens: int, cache_stats: Optional[Dict[str, int]] = None, stop: Optional[StopCondition] = None,
+                    generation_stats: Optional[Dict[str, Any]] = None, prefix: str = "", **generate_kwargs) -> str:
+    """
+    model.generate(prompt, max_tokens=max_tokens, **generate_kwargs), stopped early by the optional StopCondition,
+    served from the generation cache if possible.
+
+    The cache key covers the model file, the prompt, max_tokens, the sampling settings, the stop condition and the
+    chat session history (which changes how the prompt is templated). `cache_stats`, a {'hits': 0, 'misses': 0}
+    dictionary, collects the hits and misses of a request. `generation_stats`, a dictionary, receives the number of
+    generated tokens, the time to the first token and the total time in seconds (no tokens for cache hits).
+    `prefix`, the static start of the prompt, is evaluated once and reused by later prompts starting with it when
+    the prefix cache is enabled (see PrefixCache).
+    NOTE: a hit inside a chat session does not add the exchange to the session history.
+    """
+    key = None
+    if generation_cache.enabled:
+        key = generation_key(model, prompt, max_tokens, stop, **generate_kwargs)
+        generation = generation_cache.get(key)
+        if cache_stats is not None:
+            cache_stats["hits" if generation is not None else "misses"] += 1
+        if generation is not None:
+            if generation_stats is not None:
+                generation_stats.update(tokens=0, time_to_first_token=None, seconds=0.0)
+            return generation
+
+    if stop is not None or generation_stats is not None:
+        generate_kwargs = dict(generate_kwargs, callback=streaming_callback(stop, generation_stats))
+    if prefix and prefix_cache.enabled:
+        generation = prefix_cache.generate(model, prompt, prefix, max_tokens, **generate_kwargs)
+    else:
+        generation = model.generate(prompt, max_tokens=max_tokens, **generate_kwargs)
+    if key is not None:
+        generation_cache.put(key, generation)
+    return generation
+
+
+def streaming_callback(stop: Optional[StopCondition] = None, generation_stats: Optional[Dict[str, Any]] = None):
+    """
+    GPT4All response callback applying the stop condition and recording the generation_stats of cached_generate.
+    """
+    stop_callback = stop.callback() if stop is not None else None
+    stats = generation_stats if generation_stats is not None else {}
+    start_time = time.perf_counter()
+    stats.update(tokens=0, time_to_first_token=None, seconds=0.0)
+
+    def callback(token_id: int, response: str) -> bool:
+        if stats["time_to_first_token"] is None:
+            stats["time_to_first_token"] = time.perf_counter() - start_time
+        stats["tokens"] += 1
+        stats["seconds"] = time.perf_counter() - start_time
+        return stop_callback(token_id, response) if stop_callback is not None else True
+    return callback
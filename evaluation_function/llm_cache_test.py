@@ -0,0 +1,109 @@
+import os
+import tempfile
+import time
+import unittest
+
+try:
+    from . import llm_cache
+    from .llm_cache import GenerationCache, StopCondition, cached_generate
+    from .stub_llm import StubModel
+except ImportError:
+    import llm_cache
+    from llm_cache import GenerationCache, StopCondition, cached_generate
+    from stub_llm import StubModel
+
+
+# output of the stub, generated as the tokens ' True,', ' because', ' it' and ' is'
+OUTPUT = " True, because it is"
+
+
+class TestGenerationCache(unittest.TestCase):
+    """
+        TestCase Class used to test the LLM generation cache.
+    """
+
+    def setUp(self):
+        self.original_cache = llm_cache.generation_cache
+        llm_cache.generation_cache = GenerationCache(capacity=2, max_age=0, path="")
+
+    def tearDown(self):
+        llm_cache.generation_cache = self.original_cache
+
+    def test_identical_prompts_are_generated_once(self):
+        model, cache_stats = StubModel(), {"hits": 0, "misses": 0}
+        first = cached_generate(model, "prompt", max_tokens=10, cache_stats=cache_stats)
+        second = cached_generate(model, "prompt", max_tokens=10, cache_stats=cache_stats)
+
+        self.assertEqual(first, second)
+        self.assertEqual(model.calls, 1)
+        self.assertEqual(cache_stats, {"hits": 1, "misses": 1})
+
+    def test_settings_are_part_of_the_key(self):
+        model = StubModel()
+        cached_generate(model, "prompt", max_tokens=10)
+        cached_generate(model, "prompt", max_tokens=150)
+        cached_generate(model, "prompt", max_tokens=10, temp=0)
+
+        self.assertEqual(model.calls, 3)
+
+    def test_stop_conditions_end_generations_early(self):
+        model = StubModel(outputs={"": OUTPUT})
+        stopped = cached_generate(model, "prompt", max_tokens=10, stop=StopCondition(first_word=True))
+        unstopped = cached_generate(model, "prompt", max_tokens=10)
+
+        self.assertEqual(stopped, " True,")
+        self.assertEqual(unstopped, OUTPUT)
+        self.assertEqual(model.calls, 2)
+
+    def test_generation_stats_are_recorded(self):
+        model, generation_stats = StubModel(outputs={"": OUTPUT}), {}
+        cached_generate(model, "prompt", max_tokens=10, stop=StopCondition(max_words=2), generation_stats=generation_stats)
+        self.assertEqual(generation_stats["tokens"], 3)
+        self.assertIsNotNone(generation_stats["time_to_first_token"])
+
+        cached_generate(model, "prompt", max_tokens=10, stop=StopCondition(max_words=2), generation_stats=generation_stats)
+        self.assertEqual(generation_stats["tokens"], 0)
+        self.assertEqual(model.calls, 1)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = GenerationCache(capacity=2, max_age=0, path="")
+        cache.put("a", "A")
+        cache.put("b", "B")
+        cache.get("a")
+        cache.put("c", "C")
+
+        self.assertEqual(cache.get("a"), "A")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), "C")
+
+    def test_old_entries_are_evicted(self):
+        cache = GenerationCache(capacity=2, max_age=0.01, path="")
+        cache.put("a", "A")
+        time.sleep(0.02)
+
+        self.assertIsNone(cache.get("a"))
+
+    def test_sqlite_tier_survives_restarts(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "generations.sqlite")
+            GenerationCache(capacity=2, max_age=0, path=path).put("a", "A")
+
+            self.assertEqual(GenerationCache(capacity=2, max_age=0, path=path).get("a"), "A")
+
+    def test_sqlite_tier_keeps_the_newest_rows(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "generations.sqlite")
+            cache = GenerationCache(capacity=1, max_age=0, path=path, max_rows=2)
+            for key in ["a", "b", "c"]:
+                cache.put(key, key.upper())
+
+            restarted = GenerationCache(capacity=3, max_age=0, path=path, max_rows=2)
+            self.assertEqual([restarted.get(key) for key in ["a", "b", "c"]], [None, "B", "C"])
+
+            GenerationCache(capacity=3, max_age=0, path=path, max_rows=1)
+            restarted = GenerationCache(capacity=3, max_age=0, path=path, max_rows=0)
+            self.assertEqual([restarted.get(key) for key in ["b", "c"]], [None, "C"])
+
+
+if __name__ == "__main__":
+    unittest.main()
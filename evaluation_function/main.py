@@ -4,15 +4,28 @@ from lf_toolkit import create_server, run
 try:
     from .evaluation import evaluation_function
     from .preview import preview_function
+    from .question_bank import QUESTION_BANK_PATH, load_question_bank
+    from .llm_backend import CALL_SITES, backend_for
+    from .metrics import start_metrics_export
 except ImportError:
     from evaluation import evaluation_function
     from preview import preview_function
+    from question_bank import QUESTION_BANK_PATH, load_question_bank
+    from llm_backend import CALL_SITES, backend_for
+    from metrics import start_metrics_export
 
 def main():
     """Run the IPC server with the evaluation and preview functions.
     """
     server = create_server()
 
+    # warm the compiled questions (and pre-generated LLM outputs) of a known question bank before serving
+    if QUESTION_BANK_PATH:
+        load_question_bank(QUESTION_BANK_PATH, *(backend_for(call_site).model for call_site in CALL_SITES))
+
+    # snapshots of the evaluation metrics on SIGUSR1 (and periodically with EVALUATION_METRICS_PATH / _INTERVAL)
+    start_metrics_export()
+
     server.eval(evaluation_function)
     server.preview(preview_function)
 
@@ -0,0 +1,278 @@
+import bisect
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+# record the latency, cache, LLM and verdict tag metrics of every evaluation in this process
+METRICS = os.environ.get("EVALUATION_METRICS", "true").lower() == "true"
+# seconds covered by the rolling quantiles, hit ratios and token rates of a snapshot
+METRICS_WINDOW = float(os.environ.get("EVALUATION_METRICS_WINDOW", "300"))
+# file a snapshot is written to on SIGUSR1 and every METRICS_INTERVAL seconds (stderr on SIGUSR1 if not set)
+METRICS_PATH = os.environ.get("EVALUATION_METRICS_PATH", "")
+# seconds between the snapshots written to METRICS_PATH, 0 only writes them on SIGUSR1
+METRICS_INTERVAL = float(os.environ.get("EVALUATION_METRICS_INTERVAL", "0"))
+
+# upper bounds of the latency buckets in seconds, from the NLP layer alone to slow LLM generations
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 60)
+QUANTILES = (0.5, 0.95, 0.99)
+# number of slots the rolling window is divided into, the oldest slot is dropped as a whole
+WINDOW_SLOTS = 10
+
+
+class RollingCounts:
+    """
+    Counts added over the last `window` seconds, kept per time slot so that old counts drop out without storing
+    every observation.
+    """
+
+    def __init__(self, size: int, window: float = METRICS_WINDOW, slots: int = WINDOW_SLOTS):
+        self.slot_seconds = window / slots
+        self._counts = [[0] * size for _ in range(slots)]
+        self._epochs = [-1] * slots
+
+    def _slot(self, now: float) -> int:
+        epoch = int(now / self.slot_seconds)
+        slot = epoch % len(self._counts)
+        if self._epochs[slot] != epoch:
+            self._epochs[slot] = epoch
+            self._counts[slot] = [0] * len(self._counts[slot])
+        return slot
+
+    def add(self, index: int, amount: float, now: float) -> None:
+        self._counts[self._slot(now)][index] += amount
+
+    def totals(self, now: float) -> List[float]:
+        oldest = int(now / self.slot_seconds) - len(self._counts)
+        return [sum(counts[index] for counts, epoch in zip(self._counts, self._epochs) if epoch > oldest)
+                for index in range(len(self._counts[0]))]
+
+
+class RollingHistogram:
+    """
+    Histogram of observations (e.g. latencies) since the start of the process, and of the last `window` seconds
+    for quantiles.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window: float = METRICS_WINDOW):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.window = RollingCounts(len(self.counts), window)
+
+    def observe(self, value: float, now: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+        self.window.add(index, 1, now)
+
+    def quantile(self, q: float, now: float) -> Optional[float]:
+        """
+        Estimated quantile of the last window, interpolating linearly within its bucket (like Prometheus'
+        histogram_quantile). None without observations, the largest bucket bound if it falls in the last bucket.
+        """
+        counts = self.window.totals(now)
+        rank = q * sum(counts)
+        if rank <= 0:
+            return None
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if cumulative + count >= rank and count > 0:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+
+class EvaluationMetrics:
+    """
+    In-memory metrics of the evaluations of this process: latency histograms of the evaluations and their layers,
+    hits and misses of the evaluation, generation and rephrase caches, generated LLM tokens and generation time per
+    call site, and the count of each verdict tag. A snapshot in the Prometheus text format is returned by
+    to_prometheus(), with the latency quantiles, cache hit ratios and token rates of the last `window` seconds.
+    """
+
+    def __init__(self, window: float = METRICS_WINDOW, enabled: bool = METRICS):
+        self.window = window
+        self.enabled = enabled
+        self.latencies: Dict[str, RollingHistogram] = {}
+        self.cache_requests: Dict[str, List[int]] = {}
+        self.cache_window: Dict[str, RollingCounts] = {}
+        self.llm_generations: Dict[str, List[float]] = {}
+        self.llm_window: Dict[str, RollingCounts] = {}
+        self.tags = Counter()
+        self.start_time = time.time()
+        self._lock = threading.Lock()
+
+    def observe_latency(self, layer: str, seconds: float, now: float) -> None:
+        if layer not in self.latencies:
+            self.latencies[layer] = RollingHistogram(window=self.window)
+        self.latencies[layer].observe(seconds, now)
+
+    def observe_cache(self, cache: str, hits: int, misses: int, now: float) -> None:
+        if cache not in self.cache_requests:
+            self.cache_requests[cache] = [0, 0]
+            self.cache_window[cache] = RollingCounts(2, self.window)
+        for index, count in enumerate((hits, misses)):
+            self.cache_requests[cache][index] += count
+            self.cache_window[cache].add(index, count, now)
+
+    def observe_generation(self, stage: str, tokens: int, seconds: float, now: float) -> None:
+        if stage not in self.llm_generations:
+            self.llm_generations[stage] = [0, 0.0]
+            self.llm_window[stage] = RollingCounts(2, self.window)
+        for index, value in enumerate((tokens, seconds)):
+            self.llm_generations[stage][index] += value
+            self.llm_window[stage].add(index, value, now)
+
+    def observe_evaluation(self, latency: float, timings=None, tag: Optional[str] = None, evaluation_cache_hit: Optional[bool] = None,
+                           llm_cache: Optional[Dict[str, int]] = None, rephrase_plan: Optional[str] = None) -> None:
+        """
+        Record an evaluation: its wall-clock latency, the layers and LLM calls of its Timings (see timings.py), its
+        verdict tag, whether it was served from the evaluation cache (None if that cache is disabled), its generation
+        cache stats and how its feedback was rephrased (see slm_rephraser.rephrase_feedback).
+        """
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            self.observe_latency("total", latency, now)
+            if evaluation_cache_hit is not None:
+                self.observe_cache("evaluation", int(evaluation_cache_hit), int(not evaluation_cache_hit), now)
+            if llm_cache is not None and (llm_cache.get("hits", 0) or llm_cache.get("misses", 0)):
+                self.observe_cache("generation", llm_cache.get("hits", 0), llm_cache.get("misses", 0), now)
+            if rephrase_plan in ("pool", "question"):
+                self.observe_cache("rephrase_pool", int(rephrase_plan == "pool"), int(rephrase_plan == "question"), now)
+            if tag:
+                self.tags[tag] += 1
+            for record in timings.spans if timings is not None else []:
+                if "." not in record["name"] and record["name"] in ("nlp", "slm", "rephrase"):
+                    self.observe_latency(record["name"], record["wall_time"], now)
+                elif record.get("generated_tokens") and record.get("tokens_per_second"):
+                    tokens = record["generated_tokens"]
+                    self.observe_generation(record["name"], tokens, tokens / record["tokens_per_second"], now)
+
+    def to_prometheus(self, now: Optional[float] = None) -> str:
+        """
+        Snapshot of the metrics in the Prometheus text exposition format.
+        """
+        now = time.time() if now is None else now
+        lines = []
+
+        def family(name: str, kind: str, description: str):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            family("evaluation_latency_seconds", "histogram", "Wall-clock latency of the evaluations (layer 'total') and of their layers.")
+            for layer, histogram in sorted(self.latencies.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f'evaluation_latency_seconds_bucket{{layer="{layer}",le="{bound}"}} {cumulative}')
+                lines.append(f'evaluation_latency_seconds_sum{{layer="{layer}"}} {histogram.sum}')
+                lines.append(f'evaluation_latency_seconds_count{{layer="{layer}"}} {histogram.count}')
+
+            family("evaluation_latency_window_seconds", "gauge", f"Latency quantiles of the last {self.window:g} seconds.")
+            for layer, histogram in sorted(self.latencies.items()):
+                for q in QUANTILES:
+                    value = histogram.quantile(q, now)
+                    if value is not None:
+                        lines.append(f'evaluation_latency_window_seconds{{layer="{layer}",quantile="{q}"}} {value}')
+
+            family("evaluation_cache_requests_total", "counter", "Hits and misses of the evaluation, generation and rephrase pool caches.")
+            for cache, (hits, misses) in sorted(self.cache_requests.items()):
+                lines.append(f'evaluation_cache_requests_total{{cache="{cache}",outcome="hit"}} {hits}')
+                lines.append(f'evaluation_cache_requests_total{{cache="{cache}",outcome="miss"}} {misses}')
+
+            family("evaluation_cache_hit_ratio", "gauge", f"Cache hit ratios of the last {self.window:g} seconds.")
+            for cache, window in sorted(self.cache_window.items()):
+                hits, misses = window.totals(now)
+                if hits + misses > 0:
+                    lines.append(f'evaluation_cache_hit_ratio{{cache="{cache}"}} {hits / (hits + misses)}')
+
+            family("evaluation_llm_generated_tokens_total", "counter", "Tokens generated by the LLM calls (not served from the cache).")
+            for stage, (tokens, _) in sorted(self.llm_generations.items()):
+                lines.append(f'evaluation_llm_generated_tokens_total{{stage="{stage}"}} {tokens}')
+            family("evaluation_llm_generation_seconds_total", "counter", "Seconds spent generating the tokens of the LLM calls.")
+            for stage, (_, seconds) in sorted(self.llm_generations.items()):
+                lines.append(f'evaluation_llm_generation_seconds_total{{stage="{stage}"}} {seconds}')
+
+            family("evaluation_llm_tokens_per_second", "gauge", f"LLM generation rate of the last {self.window:g} seconds.")
+            for stage, window in sorted(self.llm_window.items()):
+                tokens, seconds = window.totals(now)
+                if seconds > 0:
+                    lines.append(f'evaluation_llm_tokens_per_second{{stage="{stage}"}} {tokens / seconds}')
+
+            family("evaluation_tags_total", "counter", "Verdict tags of the evaluations (not served from the evaluation cache).")
+            for tag, count in sorted(self.tags.items()):
+                lines.append(f'evaluation_tags_total{{tag="{tag}"}} {count}')
+
+        family("evaluation_start_time_seconds", "gauge", "Start time of the process in seconds since the epoch.")
+        lines.append(f"evaluation_start_time_seconds {self.start_time}")
+        return "\n".join(lines) + "\n"
+
+
+evaluation_metrics = EvaluationMetrics()
+
+
+def write_metrics(path: str = METRICS_PATH) -> None:
+    """
+    Write a snapshot of the evaluation metrics to the file (replaced atomically, so that a scraper never reads
+    a partial snapshot), or to stderr without a path.
+    """
+    snapshot = evaluation_metrics.to_prometheus()
+    if not path:
+        sys.stderr.write(snapshot)
+        sys.stderr.flush()
+        return
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as fp:
+        fp.write(snapshot)
+    os.replace(temporary_path, path)
+
+
+# set on SIGUSR1 to have the export thread write a snapshot
+# NOTE: signal handlers run on the main thread between bytecodes, possibly while it holds the lock of the metrics,
+# so the handler must not write the snapshot (taking that lock) itself
+metrics_requested = threading.Event()
+
+
+def request_metrics(signum=None, frame=None) -> None:
+    """
+    SIGUSR1 handler: ask the export thread to write a snapshot of the evaluation metrics.
+    """
+    metrics_requested.set()
+
+
+def start_metrics_export(path: str = METRICS_PATH, interval: float = METRICS_INTERVAL) -> None:
+    """
+    Write a snapshot of the evaluation metrics on SIGUSR1 and, with a path and interval, every `interval` seconds,
+    from a daemon thread.
+    """
+    if not evaluation_metrics.enabled:
+        return
+    # NOTE: signal handlers can only be installed from the main thread, and SIGUSR1 does not exist on Windows
+    on_signal = hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread()
+    periodic = bool(path) and interval > 0
+    if not (on_signal or periodic):
+        return
+
+    def export():
+        while True:
+            metrics_requested.wait(interval if periodic else None)
+            metrics_requested.clear()
+            try:
+                write_metrics(path)
+            except OSError as e:
+                print(f"Could not write the evaluation metrics to {path}: {e}", file=sys.stderr)
+    threading.Thread(target=export, name="evaluation-metrics", daemon=True).start()
+    if on_signal:
+        signal.signal(signal.SIGUSR1, request_metrics)
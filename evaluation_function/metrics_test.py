@@ -0,0 +1,95 @@
+import os
+import signal
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+try:
+    from . import metrics
+    from .metrics import EvaluationMetrics, RollingHistogram, write_metrics
+    from .timings import Timings
+except ImportError:
+    import metrics
+    from metrics import EvaluationMetrics, RollingHistogram, write_metrics
+    from timings import Timings
+
+
+class TestMetrics(unittest.TestCase):
+    """
+        TestCase Class used to test the process metrics of the evaluations.
+    """
+
+    def test_window_quantiles_forget_old_observations(self):
+        histogram = RollingHistogram(buckets=(0.1, 1, 10), window=100)
+        for _ in range(10):
+            histogram.observe(5, now=0)
+        for _ in range(90):
+            histogram.observe(0.05, now=50)
+
+        self.assertAlmostEqual(histogram.quantile(0.5, now=60), 0.1 * 50 / 90)
+        self.assertEqual(histogram.quantile(0.99, now=60), 1 + 9 * 9 / 10)
+        self.assertAlmostEqual(histogram.quantile(0.99, now=120), 0.1 * 89.1 / 90)
+        self.assertIsNone(histogram.quantile(0.5, now=200))
+        self.assertEqual((histogram.count, histogram.counts), (100, [90, 0, 10, 0]))
+
+    def test_evaluations_are_exported_in_the_prometheus_format(self):
+        evaluation_metrics = EvaluationMetrics(window=60, enabled=True)
+        timings = Timings()
+        with timings.span("nlp"):
+            pass
+        with timings.span("slm.similarity", generated_tokens=4, tokens_per_second=8.0):
+            pass
+        evaluation_metrics.observe_evaluation(0.3, timings, "FEEDBACK_SLM_PASS_NLP_PASS", evaluation_cache_hit=False,
+                                              llm_cache={"hits": 1, "misses": 3}, rephrase_plan="pool")
+        evaluation_metrics.observe_evaluation(0.002, evaluation_cache_hit=True)
+
+        snapshot = evaluation_metrics.to_prometheus().splitlines()
+        for line in ['evaluation_latency_seconds_bucket{layer="total",le="0.0025"} 1',
+                     'evaluation_latency_seconds_bucket{layer="total",le="+Inf"} 2',
+                     'evaluation_latency_seconds_count{layer="nlp"} 1',
+                     'evaluation_cache_requests_total{cache="generation",outcome="miss"} 3',
+                     'evaluation_cache_hit_ratio{cache="evaluation"} 0.5',
+                     'evaluation_cache_hit_ratio{cache="rephrase_pool"} 1.0',
+                     'evaluation_llm_generated_tokens_total{stage="slm.similarity"} 4',
+                     'evaluation_llm_tokens_per_second{stage="slm.similarity"} 8.0',
+                     'evaluation_tags_total{tag="FEEDBACK_SLM_PASS_NLP_PASS"} 1',
+                     '# TYPE evaluation_latency_seconds histogram']:
+            self.assertIn(line, snapshot)
+
+    def test_disabled_metrics_record_nothing(self):
+        evaluation_metrics = EvaluationMetrics(enabled=False)
+        evaluation_metrics.observe_evaluation(0.3, tag="FEEDBACK_SLM_PASS_NLP_PASS")
+
+        self.assertEqual((evaluation_metrics.latencies, dict(evaluation_metrics.tags)), ({}, {}))
+
+    def test_snapshots_are_written_to_a_file(self):
+        evaluation_metrics = EvaluationMetrics(enabled=True)
+        evaluation_metrics.observe_evaluation(0.3, tag="CASCADE_NLP_PASS")
+        with tempfile.TemporaryDirectory() as directory, mock.patch.object(metrics, "evaluation_metrics", evaluation_metrics):
+            path = os.path.join(directory, "metrics.prom")
+            write_metrics(path)
+            with open(path) as fp:
+                self.assertIn('evaluation_tags_total{tag="CASCADE_NLP_PASS"} 1', fp.read())
+            self.assertEqual(os.listdir(directory), ["metrics.prom"])
+
+    @unittest.skipUnless(hasattr(signal, "SIGUSR1"), "SIGUSR1 does not exist on this platform")
+    def test_signal_during_an_observation_does_not_deadlock(self):
+        evaluation_metrics = EvaluationMetrics(enabled=True)
+        self.addCleanup(signal.signal, signal.SIGUSR1, signal.getsignal(signal.SIGUSR1))
+        with tempfile.TemporaryDirectory() as directory, mock.patch.object(metrics, "evaluation_metrics", evaluation_metrics):
+            path = os.path.join(directory, "metrics.prom")
+            metrics.start_metrics_export(path, interval=0)
+            # the handler runs on the main thread while it holds the lock, like in the middle of observe_evaluation
+            with evaluation_metrics._lock:
+                os.kill(os.getpid(), signal.SIGUSR1)
+                evaluation_metrics.observe_latency("total", 0.3, time.time())
+            deadline = time.time() + 5
+            while not os.path.exists(path) and time.time() < deadline:
+                time.sleep(0.01)
+            with open(path) as fp:
+                self.assertIn('evaluation_latency_seconds_count{layer="total"} 1', fp.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+Accuracy report for the compressed word2vec representations (see nlp_word2vec.CompressedVectors).
+
+Re-runs the cases of nlp_evaluation_tests.py with the float32 vectors and with every compressed mode,
+and reports the memory used by the vectors, the time taken, the failing tests and how the similarity
+values and verdicts drift against float32.
+
+Usage: python -m evaluation_function.nlp_compression_report [mode ...]
+"""
+import copy
+import io
+import sys
+import time
+import unittest
+from contextlib import contextmanager
+
+try:
+    from . import nlp_evaluation
+    from . import nlp_evaluation_tests
+    from .compiled_question import clear_compiled_questions
+    from .nlp_word2vec import CompressedVectors, compress_word2vec, load_word2vec, vectors_nbytes
+except ImportError:
+    import nlp_evaluation
+    import nlp_evaluation_tests
+    from compiled_question import clear_compiled_questions
+    from nlp_word2vec import CompressedVectors, compress_word2vec, load_word2vec, vectors_nbytes
+
+DEFAULT_MODES = ['float16', 'int8', 'pca200', 'pca100', 'pca50']
+
+
+def run_test_cases(record=None):
+    """
+    Run the NLP test cases, optionally recording the (response, answer, params) of every evaluation.
+    Returns the number of failed tests.
+    """
+    evaluation_function = nlp_evaluation_tests.evaluation_function
+
+    def recording_evaluation_function(response, answer, params):
+        record.append((response, answer, copy.deepcopy(params)))
+        return evaluation_function(response, answer, params)
+
+    if record is not None:
+        nlp_evaluation_tests.evaluation_function = recording_evaluation_function
+    try:
+        suite = unittest.defaultTestLoader.loadTestsFromTestCase(nlp_evaluation_tests.TestEvaluationFunction)
+        result = unittest.TextTestRunner(stream=io.StringIO()).run(suite)
+    finally:
+        nlp_evaluation_tests.evaluation_function = evaluation_function
+    return len(result.failures) + len(result.errors)
+
+
+def evaluate_cases(cases):
+    """
+    Verdict and similarity values of every case.
+    """
+    outcomes = []
+    for response, answer, params in cases:
+        result = nlp_evaluation.evaluation_function(response, answer, copy.deepcopy(params))
+        metadata = result.metadata
+        if "problematic_keystring" in metadata:
+            values = [score for _, score in metadata["keystring-scores"]]
+        elif metadata["method"] == "BOW vector similarity":
+            values = [metadata["similarity_value"], metadata["BOW_similarity_value"]]
+        else:
+            values = [metadata["similarity_value"]]
+        outcomes.append((result.is_correct, [float(value) for value in values]))
+    return outcomes
+
+
+@contextmanager
+def using_vectors(w2v):
+    """
+    Evaluate with the given word vectors inside the block, without the compiled questions (and their vectors)
+    of other vectors.
+    """
+    original_w2v = nlp_evaluation.w2v
+    nlp_evaluation.w2v = nlp_evaluation_tests.w2v = w2v
+    clear_compiled_questions()
+    try:
+        yield w2v
+    finally:
+        nlp_evaluation.w2v = nlp_evaluation_tests.w2v = original_w2v
+        clear_compiled_questions()
+
+
+def compression_report(modes=DEFAULT_MODES):
+    w2v = nlp_evaluation.w2v
+    # NOTE: the modes are compressed from (and compared against) the float32 vectors, also when the loaded
+    # vectors are compressed themselves (WORD2VEC_COMPRESSION)
+    if isinstance(w2v, CompressedVectors):
+        w2v = load_word2vec(compression='float32')
+    cases = []
+    run_test_cases(record=cases)
+
+    with using_vectors(w2v):
+        start_time = time.perf_counter()
+        baseline = evaluate_cases(cases)
+        report = [dict(mode="float32", nbytes=vectors_nbytes(w2v), failed_tests=run_test_cases(),
+                       seconds=time.perf_counter() - start_time, verdict_changes=[], max_drift=0.0, mean_drift=0.0)]
+
+    for mode in modes:
+        with using_vectors(compress_word2vec(w2v, mode)) as compressed_w2v:
+            start_time = time.perf_counter()
+            outcomes = evaluate_cases(cases)
+            seconds = time.perf_counter() - start_time
+            failed_tests = run_test_cases()
+
+        drifts = []
+        verdict_changes = []
+        for case, (is_correct, values), (baseline_is_correct, baseline_values) in zip(cases, outcomes, baseline):
+            if is_correct != baseline_is_correct or len(values) != len(baseline_values):
+                verdict_changes.append(case)
+                continue
+            drifts += [abs(value - baseline_value) for value, baseline_value in zip(values, baseline_values)]
+
+        report.append(dict(mode=mode, nbytes=vectors_nbytes(compressed_w2v),
+                           failed_tests=failed_tests, seconds=seconds, verdict_changes=verdict_changes,
+                           max_drift=max(drifts, default=0.0), mean_drift=sum(drifts) / len(drifts) if drifts else 0.0))
+    return cases, report
+
+
+def print_report(cases, report):
+    print(f"{len(cases)} evaluations from nlp_evaluation_tests.py")
+    print(f"{'mode':<10}{'MB':>9}{'seconds':>10}{'failed tests':>14}{'verdict changes':>17}{'max drift':>12}{'mean drift':>12}")
+    for row in report:
+        print(f"{row['mode']:<10}{row['nbytes'] / 2 ** 20:>9.2f}{row['seconds']:>10.3f}{row['failed_tests']:>14}"
+              f"{len(row['verdict_changes']):>17}{row['max_drift']:>12.5f}{row['mean_drift']:>12.5f}")
+    for row in report:
+        for response, answer, params in row['verdict_changes']:
+            print(f"[{row['mode']}] verdict changed - Response: {response}, Answer: {answer}, Params: {params}")
+
+
+if __name__ == "__main__":
+    print_report(*compression_report(sys.argv[1:] or DEFAULT_MODES))
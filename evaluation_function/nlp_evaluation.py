@@ -1,24 +1,44 @@
-import pickle
 import string
+import threading
 import time
 
-import gensim
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from nltk.corpus import stopwords
 from nltk import word_tokenize
-from nltk.data import find
 
 try:
     # from .evaluation_response_utilities import EvaluationResponse
     from .evaluation_response import Result as EvaluationResponse              # NOTE: instead of importing from lf_toolkit.evaluation as more attributes are added to the class
+    from .nlp_information_content import InformationContentTable
+    from .nlp_word2vec import load_word2vec, get_word_vectors
+    from .timings import span
 except ImportError:
     # from evaluation_response_utilities import EvaluationResponse
     from evaluation_response import Result as EvaluationResponse
+    from nlp_information_content import InformationContentTable
+    from nlp_word2vec import load_word2vec, get_word_vectors
+    from timings import span
 
-word2vec_sample = str(find('models/word2vec_sample/pruned.word2vec.txt'))
-w2v = gensim.models.KeyedVectors.load_word2vec_format(word2vec_sample, binary=False)
+w2v = load_word2vec()
 
-def evaluation_function(response, answer, params) -> EvaluationResponse:
+_information_content = None
+_information_content_lock = threading.Lock()
+
+
+def get_information_content() -> InformationContentTable:
+    """
+    Information content table aligned with the w2v vocabulary, loaded from the Brown frequencies on first use.
+    """
+    global _information_content
+    if _information_content is None:
+        with _information_content_lock:
+            if _information_content is None:
+                _information_content = InformationContentTable.from_files(w2v.index_to_key, w2v.key_to_index)
+    return _information_content
+
+
+def evaluation_function(response, answer, params, question=None, compiled_response=None, timings=None) -> EvaluationResponse:
     """
     Function used to evaluate a student response.
     ---
@@ -40,53 +60,62 @@ def evaluation_function(response, answer, params) -> EvaluationResponse:
     split into many) is entirely     up to you. All that matters are the
     return types and that evaluation_function() is the main function used 
     to output the evaluation response.
+
+    `question` is an optional CompiledQuestion (see compiled_question.py) of the answer and params, whose
+    answer and keystring data is then reused instead of being computed for this response. Likewise `compiled_response`
+    is an optional CompiledResponse of the response (see compile_responses).
+    `timings` is an optional Timings (see timings.py) recording the tokenization, embedding lookup, window matching
+    (of each keystring), w2v similarity and BOW scoring stages.
     """
     start_time = time.process_time()
     eval_response = EvaluationResponse() 
     eval_response.is_correct = False
     eval_response.add_evaluation_type("nlp")
 
+    if compiled_response is None:
+        with span(timings, "nlp.tokenization"):
+            response_tokens = preprocess_tokens(response)
+        with span(timings, "nlp.embedding_lookup"):
+            compiled_response = CompiledResponse(response, tokens=response_tokens)
+    response_tokens = compiled_response.tokens
+    response_vectors, response_indices = compiled_response.vectors, compiled_response.indices
+    response_known = response_indices >= 0
+    if question is not None:
+        compiled_keystrings = question.compiled_keystrings
+    elif params is not None and "keystrings" in params:
+        compiled_keystrings = [CompiledKeystring(keystring_object) for keystring_object in params["keystrings"]]
+    else:
+        compiled_keystrings = []
+
     # params of the form {'keystrings': ['keystring1', 'keystring2', ...]}
     # keystring of the form {'string':..., 'exact_match:False', 'should_contain:True', 'custom_feedback:None}
-    if params is not None and "keystrings" in params:
-        keystrings = params["keystrings"]
+    keystring_scores = []
+    if compiled_keystrings:
         problematic_keystring = None
-        keystring_scores = []
-        response_tokens = preprocess_tokens(response)
-        for keystring_object in keystrings:
-            # Unpack keystring object
-            keystring = keystring_object['string']
-            exact_match = keystring_object['exact_match'] if 'exact_match' in keystring_object else False
-            should_contain = keystring_object['should_contain'] if 'should_contain' in keystring_object else True
-            custom_feedback = keystring_object['custom_feedback'] if 'custom_feedback' in keystring_object else None
-            keystring_tokens = preprocess_tokens(keystring)
+        # stop scanning a keystring's windows once one clears its threshold (the reported score is then a lower bound)
+        early_exit = params.get("keystring_early_exit", False)
+        response_token_words = [bow_words(token) for token in response_tokens]
+        response_bow = BagOfWords(word for words in response_token_words for word in words)
+        for compiled_keystring in compiled_keystrings:
+            keystring = compiled_keystring.string
+            threshold = compiled_keystring.threshold
 
             # Sliding window matching
-            window_size = len(keystring_tokens)
-            i = 0
-            max_score = 0
-            while i + window_size <= len(response_tokens):
-                response_substring = " ".join(response_tokens[i:i + window_size])
-                score1 = sentence_similarity_mean_w2v(response_substring, keystring)
-                score2, _, _ = sentence_similarity(response_substring, keystring)
-                max_score = max(score1, score2, max_score)
-                i += 1
+            with span(timings, "nlp.window_matching", keystring=keystring):
+                window_scores = keystring_window_scores(compiled_keystring, response_vectors, response_known, response_token_words, response_bow, early_exit)
+            max_score = max(float(window_scores.max()), 0) if window_scores.size > 0 else 0
             keystring_scores.append((keystring, max_score))
 
-            threshold = 0.75
-            if exact_match is True:
-                threshold = 0.99
-
-            if should_contain is True and max_score < threshold and problematic_keystring is None:
+            if compiled_keystring.should_contain is True and max_score < threshold and problematic_keystring is None:
                 problematic_keystring = keystring
                 feedback = f"Similarity: {'%.3f'%(max_score)}. Please provide more information about '{problematic_keystring}'"
 
-            if should_contain is False and max_score > threshold and problematic_keystring is None:
+            if compiled_keystring.should_contain is False and max_score > threshold and problematic_keystring is None:
                 problematic_keystring = keystring
                 feedback = f"Identified '{problematic_keystring}' in the answer, which was not expected."
 
-            if custom_feedback is not None:
-                feedback = f"Cannot determine if the answer is correct. {custom_feedback} CUSTOM_FEEDBACK"
+            if compiled_keystring.custom_feedback is not None:
+                feedback = custom_feedback_message(compiled_keystring.custom_feedback)
 
         if problematic_keystring is not None:
             # eval_response.add_feedback(("feedback", feedback))
@@ -95,11 +124,16 @@ def evaluation_function(response, answer, params) -> EvaluationResponse:
             eval_response.add_processing_time(time.process_time() - start_time)
             eval_response.add_metadata("keystring-scores", keystring_scores)
             eval_response.add_metadata("response", response)
+            eval_response.add_metadata("method", "keystrings")
             eval_response.add_metadata("problematic_keystring", problematic_keystring)
             eval_response.add_metadata("similarity_value", max_score)
             return eval_response
 
-    w2v_similarity = sentence_similarity_mean_w2v(response, answer)
+    compiled_answer = question.compiled_answer if question is not None else CompiledAnswer(answer)
+    w2v_similarity = compiled_response.w2v_similarity
+    if w2v_similarity is None:
+        with span(timings, "nlp.w2v_similarity"):
+            w2v_similarity = mean_vector_similarity(response_vectors[response_known], compiled_answer.vector)
 
     if w2v_similarity > 0.75:
         feedback = f"Similarity: {'%.3f'%(w2v_similarity)}%"
@@ -108,12 +142,15 @@ def evaluation_function(response, answer, params) -> EvaluationResponse:
         eval_response.is_correct = True
         eval_response.add_metadata("response", response)
         eval_response.add_metadata("method", "w2v")
+        if compiled_keystrings:
+            eval_response.add_metadata("keystring-scores", keystring_scores)
         eval_response.add_metadata("similarity_value", w2v_similarity)
         eval_response.add_processing_time(time.process_time() - start_time)
         return eval_response
 
     else:
-        similarity, response_scores, answer_scores = sentence_similarity(response, answer)
+        with span(timings, "nlp.bow_scoring"):
+            similarity, response_scores, answer_scores = sentence_similarity(response, answer, compiled_answer.bow)
         dif = 0
         word = None             # this is the word that is most responsible for the difference between the answer and response
         for (resp_score, ans_score) in zip(response_scores, answer_scores):
@@ -132,6 +169,8 @@ def evaluation_function(response, answer, params) -> EvaluationResponse:
         eval_response.is_correct = False
         eval_response.add_metadata("response", response)
         eval_response.add_metadata("method", "BOW vector similarity")
+        if compiled_keystrings:
+            eval_response.add_metadata("keystring-scores", keystring_scores)
         eval_response.add_metadata("similarity_value", w2v_similarity)
         eval_response.add_metadata("BOW_similarity_value", similarity)
         eval_response.add_metadata("problematic_word", word)
@@ -139,12 +178,18 @@ def evaluation_function(response, answer, params) -> EvaluationResponse:
         return eval_response
 
 
-def word_information_content(word, blen, freqs):
-    if word not in freqs:
-        f = 0
-    else:
-        f = freqs[word]
-    return 1 - (np.log(f + 1)) / (np.log(blen + 1))
+def custom_feedback_message(custom_feedback):
+    """
+    NLP feedback of a keystring with custom feedback, tagged for check_custom_feedback.
+    """
+    return f"Cannot determine if the answer is correct. {custom_feedback} CUSTOM_FEEDBACK"
+
+
+def check_custom_feedback(feedback):
+    if "CUSTOM_FEEDBACK" in feedback:
+        # cut out the CUSTOM_FEEDBACK tag from the feedback and return the feedback
+        return True, feedback.replace("CUSTOM_FEEDBACK", "")
+    return False, feedback
 
 
 def word_similarity(word1, word2, w2v):
@@ -155,69 +200,331 @@ def word_similarity(word1, word2, w2v):
     return w2v.similarity(word1, word2)
 
 
-def sentence_similarity(response: str, answer: str):
-    response = response.lower()
-    answer = answer.lower()
+def lookup_word_vectors(words, normalise=True):
+    """
+    Look up the vector (unit-normalised by default) and vocabulary index of each word once.
+    Words outside the w2v vocabulary get a zero vector and index -1.
+    """
+    indices = np.fromiter((w2v.key_to_index.get(word, -1) for word in words), dtype=np.int64, count=len(words))
+    vectors = np.zeros((len(words), w2v.vector_size), dtype=np.float32)
+    known = indices >= 0
+    vectors[known] = get_word_vectors(w2v, indices[known])
+    if normalise:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors, indices
+
+
+def word_similarity_matrix(vectors):
+    """
+    Pairwise word_similarity between distinct words from their lookup_word_vectors vectors, in one matmul.
+    Rows of out of vocabulary words are zero (masked by their zero vectors), the diagonal is an exact match.
+    """
+    similarities = vectors @ vectors.T
+    np.fill_diagonal(similarities, 1)
+    return similarities
+
+
+def best_word_matches(similarities):
+    """
+    Best similarity in each row and the column it was found at (first one on ties, like a strict > scan).
+    Rows without any column to compare to get a similarity of -1 and column -1.
+    """
+    rows = similarities.shape[0]
+    if similarities.shape[1] == 0:
+        return np.full(rows, -1, dtype=similarities.dtype), np.full(rows, -1, dtype=np.int64)
+    best_columns = similarities.argmax(axis=1)
+    return similarities[np.arange(rows), best_columns], best_columns
+
+
+def bow_words(text: str):
+    """
+    Split a text into the lower case words compared by sentence_similarity, with punctuation as separators.
+    """
+    text = text.lower()
     for punc in string.punctuation:
-        response = response.replace(punc, ' ')
-        answer = answer.replace(punc, ' ')
-    response_words = response.split()
-    answer_words = answer.split()
-    all_words = list(set((response_words + answer_words)))
-
-    with open('evaluation_function/nlp/brown_length', 'rb') as fp:
-        blen = pickle.load(fp)
-    with open('evaluation_function/nlp/word_freqs', 'rb') as fp:
-        freqs = pickle.load(fp)
-
-    def sencence_scores(common_words, sentence):
-        scores = []
-        for word in common_words:
-            best_similarity = -1
-            best_word = word
-            for other_word in sentence:
-                similarity = word_similarity(word, other_word, w2v)
-                if similarity > best_similarity:
-                    best_similarity = similarity
-                    best_word = other_word
-            scores.append(
-                (best_similarity * word_information_content(word, blen, freqs) * word_information_content(best_word,
-                                                                                                          blen, freqs),
-                 word))
-        return scores
+        text = text.replace(punc, ' ')
+    return text.split()
 
-    response_scores = sencence_scores(all_words, response_words)
-    answer_scores = sencence_scores(all_words, answer_words)
 
-    resp_scores = response_scores.copy()
-    ans_scores = answer_scores.copy()
-    for idx in range(len(response_scores)):
-        response_scores[idx] = response_scores[idx][0]
-        answer_scores[idx] = answer_scores[idx][0]
+class BagOfWords:
+    """
+    Distinct bow_words of a text with their unit-normalised vectors, vocabulary indices and information content,
+    looked up once so that bags can be merged (see union) and compared without further lookups.
+    """
+
+    def __init__(self, words, vectors=None, indices=None, information_content=None):
+        self.words = list(dict.fromkeys(words))
+        if vectors is None:
+            vectors, indices = lookup_word_vectors(self.words)
+            information_content = get_information_content().gather(self.words, indices).astype(np.float64)
+        self.vectors = vectors
+        self.indices = indices
+        self.information_content = information_content
+        self.positions = {word: i for i, word in enumerate(self.words)}
+
+    def columns(self, words):
+        return np.array([self.positions[word] for word in words], dtype=np.int64)
+
+    def union(self, other: "BagOfWords") -> "BagOfWords":
+        """
+        Bag of the words of both bags, this bag's words first.
+        """
+        new = [i for i, word in enumerate(other.words) if word not in self.positions]
+        if not new:
+            return self
+        return BagOfWords(
+            self.words + [other.words[i] for i in new],
+            np.concatenate((self.vectors, other.vectors[new])),
+            np.concatenate((self.indices, other.indices[new])),
+            np.concatenate((self.information_content, other.information_content[new])))
+
+
+def sentence_similarity(response: str, answer: str, answer_bow: BagOfWords = None):
+    """
+    `answer_bow` is an optional BagOfWords of the answer words (e.g. from its CompiledAnswer) to reuse.
+    """
+    if answer_bow is None:
+        answer_bow = BagOfWords(bow_words(answer))
+    response_bow = BagOfWords(bow_words(response))
+    bag = answer_bow.union(response_bow)
+    all_words = bag.words
+    similarities = word_similarity_matrix(bag.vectors)
+    all_words_ic = bag.information_content
+
+    def sencence_scores(sentence_bow):
+        columns = bag.columns(sentence_bow.words)
+        best_similarity, best_columns = best_word_matches(similarities[:, columns])
+        # a word without anything to compare to is weighted by its own information content
+        best_word_ic = all_words_ic[columns[best_columns]] if columns.size else all_words_ic
+        return best_similarity.astype(np.float64) * all_words_ic * best_word_ic
+
+    response_scores = sencence_scores(response_bow)
+    answer_scores = sencence_scores(answer_bow)
+
+    resp_scores = [(float(word_score), word) for word_score, word in zip(response_scores, all_words)]
+    ans_scores = [(float(word_score), word) for word_score, word in zip(answer_scores, all_words)]
     score = np.dot(response_scores, answer_scores) / (np.linalg.norm(response_scores) * np.linalg.norm(answer_scores))
     return score, resp_scores, ans_scores
 
 
-def preprocess_tokens(text: str):
+def window_mean_similarities(token_vectors, token_known, keystring_vector, window_size):
+    """
+    sentence_similarity_mean_w2v between every `window_size` long window of the tokens and the keystring.
+
+    The window means come from cumulative sums over the embedded tokens, so every window is scored in
+    one vectorised operation. `keystring_vector` can be the sum or the mean of the keystring token vectors.
+    """
+    windows = len(token_known) - window_size + 1
+    if windows <= 0:
+        return np.zeros(0)
+
+    vector_sums = np.zeros((len(token_known) + 1, token_vectors.shape[1]))
+    np.cumsum(token_vectors, axis=0, out=vector_sums[1:])
+    known_counts = np.concatenate(([0], np.cumsum(token_known)))
+    window_vectors = vector_sums[window_size:] - vector_sums[:windows]
+    window_counts = known_counts[window_size:] - known_counts[:windows]
+
+    scores = np.zeros(windows)
+    keystring_norm = np.linalg.norm(keystring_vector)
+    if keystring_norm == 0:
+        return scores
+    valid = window_counts > 0
+    scores[valid] = (window_vectors[valid] @ keystring_vector) / (np.linalg.norm(window_vectors[valid], axis=1) * keystring_norm)
+    return scores
+
+
+def window_bow_similarities(token_words, response_bow, keystring_bow, window_size):
+    """
+    sentence_similarity between every `window_size` long window of tokens and the keystring.
+
+    `token_words` holds the bow_words of each response token and `response_bow` the BagOfWords of all of
+    them. One similarity matrix between the response and keystring words is built per keystring, and each
+    window's score is derived by slicing it and weighting with the bags' information content.
+    Windows without any words to compare score NaN, like sentence_similarity.
+    """
+    tokens = len(token_words)
+    windows = tokens - window_size + 1
+    if windows <= 0:
+        return np.zeros(0)
+
+    bag = response_bow.union(keystring_bow)
+    similarities = word_similarity_matrix(bag.vectors)
+    all_words_ic = bag.information_content
+    rows = len(bag.words)
+
+    # best match of every word within each token, and which words each token holds
+    token_similarity = np.full((rows, tokens), -1, dtype=similarities.dtype)
+    token_best = np.full((rows, tokens), -1, dtype=np.int64)
+    token_contains = np.zeros((rows, tokens), dtype=np.int64)
+    for t, words in enumerate(token_words):
+        if len(words) == 0:
+            continue
+        columns = bag.columns(words)
+        best_similarity, best_columns = best_word_matches(similarities[:, columns])
+        token_similarity[:, t] = best_similarity
+        token_best[:, t] = columns[best_columns]
+        token_contains[columns, t] = 1
+
+    # best match of every word within each window: the first token holding the window maximum
+    if window_size > 0:
+        window_similarity = sliding_window_view(token_similarity, window_size, axis=1)
+        best_tokens = window_similarity.argmax(axis=2)[..., None]
+        response_similarity = np.take_along_axis(window_similarity, best_tokens, axis=2)[..., 0]
+        response_best = np.take_along_axis(sliding_window_view(token_best, window_size, axis=1), best_tokens, axis=2)[..., 0]
+    else:
+        response_similarity = np.full((rows, windows), -1, dtype=similarities.dtype)
+        response_best = np.full((rows, windows), -1, dtype=np.int64)
+    response_best_ic = np.where(response_best >= 0, all_words_ic[response_best], all_words_ic[:, None])
+    response_scores = response_similarity * all_words_ic[:, None] * response_best_ic
+
+    keystring_columns = bag.columns(keystring_bow.words)
+    keystring_similarity, keystring_best = best_word_matches(similarities[:, keystring_columns])
+    keystring_best_ic = all_words_ic[keystring_columns[keystring_best]] if keystring_columns.size else all_words_ic
+    keystring_scores = (keystring_similarity * all_words_ic * keystring_best_ic)[:, None]
+
+    # each window is scored over its own words and the keystring words
+    contains_sums = np.zeros((rows, tokens + 1), dtype=np.int64)
+    np.cumsum(token_contains, axis=1, out=contains_sums[:, 1:])
+    in_window = (contains_sums[:, window_size:] - contains_sums[:, :windows]) > 0
+    in_window[keystring_columns] = True
+    response_scores = np.where(in_window, response_scores, 0)
+    keystring_scores = np.where(in_window, keystring_scores, 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (response_scores * keystring_scores).sum(axis=0) / (
+            np.linalg.norm(response_scores, axis=0) * np.linalg.norm(keystring_scores, axis=0))
+
+
+def keystring_window_scores(compiled_keystring, response_vectors, response_known, response_token_words, response_bow, early_exit=False):
+    """
+    Similarity of each window of response tokens (as many as the keystring has) to the CompiledKeystring: the best of
+    the mean w2v and the BOW similarity. With early_exit, the BOW similarities are skipped if a w2v similarity clears
+    the keystring threshold, and the scores end at the first window clearing it.
+    """
+    threshold = compiled_keystring.threshold
+    window_size = len(compiled_keystring.tokens)
+    window_scores = window_mean_similarities(response_vectors, response_known, compiled_keystring.vector, window_size)
+    if not (early_exit and window_scores.size > 0 and window_scores.max() > threshold):
+        # np.fmax skips the NaN BOW scores of windows without any words to compare
+        window_scores = np.fmax(window_scores, window_bow_similarities(
+            response_token_words, response_bow, compiled_keystring.bow, window_size))
+    if early_exit:
+        cleared = np.flatnonzero(window_scores > threshold)
+        if cleared.size > 0:
+            window_scores = window_scores[:cleared[0] + 1]
+    return window_scores
+
+
+def preprocess_tokens(text: str, keep=()):
     text = text.lower()
-    to_remove = stopwords.words('english') + list(string.punctuation)
+    to_remove = set(stopwords.words('english') + list(string.punctuation)).difference(keep)
     tokens = [word for word in word_tokenize(text) if word not in to_remove]
     return tokens
 
 
-def sentence_similarity_mean_w2v(response: str, answer: str):
-    response = preprocess_tokens(response)
-    answer = preprocess_tokens(answer)
-    response_embeddings = [w2v[word] for word in response if w2v.has_index_for(word)]
-    answer_embeddings = [w2v[word] for word in answer if w2v.has_index_for(word)]
-    if len(response_embeddings) == 0 or len(answer_embeddings) == 0:
+def mean_vector_similarity(response_vectors, answer_vector):
+    """
+    Cosine similarity between the mean of the (in vocabulary) response token vectors and an answer mean vector,
+    0 if either has no known tokens.
+    """
+    if len(response_vectors) == 0 or answer_vector is None:
         return 0
-    response_vector = np.mean(response_embeddings, axis=0)
-    answer_vector = np.mean(answer_embeddings, axis=0)
+    response_vector = np.mean(response_vectors, axis=0)
     return float(
         np.dot(response_vector, answer_vector) / (np.linalg.norm(response_vector) * np.linalg.norm(answer_vector)))
 
 
+def mean_vector_similarities(response_vectors, response_segments, response_count, answer_vector):
+    """
+    mean_vector_similarity of many responses at once: `response_vectors` are the (in vocabulary) token vectors of all
+    responses and `response_segments` the response each belongs to. The mean vectors are summed per response and
+    compared to the answer mean vector in one matrix-vector product (equal to mean_vector_similarity up to float32 rounding).
+    """
+    similarities = np.zeros(response_count)
+    if answer_vector is None:
+        return similarities
+    counts = np.bincount(response_segments, minlength=response_count)
+    means = np.zeros((response_count, response_vectors.shape[1]), dtype=response_vectors.dtype)
+    np.add.at(means, response_segments, response_vectors)
+    known = counts > 0
+    means[known] /= counts[known, None]
+    norms = np.linalg.norm(means, axis=1) * np.linalg.norm(answer_vector)
+    np.divide(means @ answer_vector, norms, out=similarities, where=known)
+    return similarities
+
+
+def sentence_similarity_mean_w2v(response: str, answer: str):
+    response_vectors, response_indices = lookup_word_vectors(preprocess_tokens(response), normalise=False)
+    return mean_vector_similarity(response_vectors[response_indices >= 0], CompiledAnswer(answer).vector)
+
+
+class CompiledAnswer:
+    """
+    Response-independent data of an answer: its tokens, their vectors and mean vector, and its BagOfWords.
+    """
+
+    def __init__(self, answer: str):
+        self.tokens = preprocess_tokens(answer)
+        self.token_vectors, self.token_indices = lookup_word_vectors(self.tokens, normalise=False)
+        known = self.token_vectors[self.token_indices >= 0]
+        self.vector = np.mean(known, axis=0) if len(known) > 0 else None
+        self.bow = BagOfWords(bow_words(answer))
+
+
+class CompiledResponse:
+    """
+    Answer-independent data of a response: its tokens and their vectors and vocabulary indices, and optionally its
+    mean_vector_similarity to the answer it is evaluated against.
+    """
+
+    def __init__(self, response: str, tokens=None, vectors=None, indices=None, w2v_similarity=None):
+        self.tokens = tokens if tokens is not None else preprocess_tokens(response)
+        if vectors is None:
+            vectors, indices = lookup_word_vectors(self.tokens, normalise=False)
+        self.vectors = vectors
+        self.indices = indices
+        self.w2v_similarity = w2v_similarity
+
+
+def compile_responses(responses, compiled_answer: CompiledAnswer = None):
+    """
+    CompiledResponse of each response, looking up the vectors of all their tokens at once and, given the
+    CompiledAnswer, computing all their similarities to it with mean_vector_similarities.
+    """
+    token_lists = [preprocess_tokens(str(response)) for response in responses]
+    lengths = np.fromiter((len(tokens) for tokens in token_lists), dtype=np.int64, count=len(token_lists))
+    vectors, indices = lookup_word_vectors([token for tokens in token_lists for token in tokens], normalise=False)
+    similarities = [None] * len(token_lists)
+    if compiled_answer is not None:
+        segments = np.repeat(np.arange(len(token_lists)), lengths)
+        known = indices >= 0
+        similarities = [float(similarity) for similarity in mean_vector_similarities(
+            vectors[known], segments[known], len(token_lists), compiled_answer.vector)]
+    offsets = np.cumsum(lengths)[:-1]
+    return [CompiledResponse(response, tokens, response_vectors, response_indices, similarity)
+            for response, tokens, response_vectors, response_indices, similarity
+            in zip(responses, token_lists, np.split(vectors, offsets), np.split(indices, offsets), similarities)]
+
+
+class CompiledKeystring:
+    """
+    Response-independent data of a keystring object: its settings, tokens, summed token vector and BagOfWords.
+    """
+
+    def __init__(self, keystring_object):
+        # Unpack keystring object
+        self.string = keystring_object['string']
+        self.exact_match = keystring_object['exact_match'] if 'exact_match' in keystring_object else False
+        self.should_contain = keystring_object['should_contain'] if 'should_contain' in keystring_object else True
+        self.custom_feedback = keystring_object['custom_feedback'] if 'custom_feedback' in keystring_object else None
+        self.threshold = 0.99 if self.exact_match is True else 0.75
+        self.tokens = preprocess_tokens(self.string)
+        vectors, indices = lookup_word_vectors(self.tokens, normalise=False)
+        self.vector = vectors[indices >= 0].sum(axis=0)
+        self.bow = BagOfWords(bow_words(self.string))
+
+
 if __name__ == "__main__":
     pass
     print(evaluation_function("Density, speed, Viscosity, Length", "Density, Velocity, Viscosity, Length", {'keystrings': [{"string": "density"}, {"string": "velocity", "exact_match": False, 'should_contain': False}, {"string": "viscosity"}, {"string": "length"}]}))
@@ -1,9 +1,17 @@
 import unittest
 
+import numpy as np
+
 try:
-    from .nlp_evaluation import evaluation_function
+    from .nlp_evaluation import evaluation_function, sentence_similarity, word_similarity, get_information_content, w2v, compile_responses
+    from .nlp_evaluation import CompiledKeystring, preprocess_tokens, lookup_word_vectors, sentence_similarity_mean_w2v, window_mean_similarities
+    from .nlp_evaluation import BagOfWords, bow_words, window_bow_similarities
+    from .compiled_question import compile_question
 except ImportError:
-    from nlp_evaluation import evaluation_function
+    from nlp_evaluation import evaluation_function, sentence_similarity, word_similarity, get_information_content, w2v, compile_responses
+    from nlp_evaluation import CompiledKeystring, preprocess_tokens, lookup_word_vectors, sentence_similarity_mean_w2v, window_mean_similarities
+    from nlp_evaluation import BagOfWords, bow_words, window_bow_similarities
+    from compiled_question import compile_question
 
 class TestEvaluationFunction(unittest.TestCase):
     """
@@ -148,5 +156,94 @@ class TestEvaluationFunction(unittest.TestCase):
             result = evaluation_function(response, answer, params)
             self.assertEqual(result.get_is_correct(), True, msg=f'Response: {response}')
 
+    def test_nlp_sentence_similarity_matches_pairwise_scores(self):
+        response, answer = 'density, characteristic velocity of flow, qwertyuiop', 'Density, Velocity, Viscosity, Length'
+        _, response_scores, answer_scores = sentence_similarity(response, answer)
+        information_content = get_information_content()
+        response_words = ['density', 'characteristic', 'velocity', 'of', 'flow', 'qwertyuiop']
+
+        for (word_score, word) in response_scores:
+            best_similarity = max(word_similarity(word, other_word, w2v) for other_word in response_words)
+            best_word = next(other_word for other_word in response_words if word_similarity(word, other_word, w2v) == best_similarity)
+            expected = best_similarity * information_content.word(word) * information_content.word(best_word)
+            self.assertAlmostEqual(word_score, expected, places=5, msg=f'Word: {word}')
+        self.assertEqual(len(response_scores), len(answer_scores))
+
+    def test_nlp_compiled_question_gives_the_same_result(self):
+        answer = 'Density, Velocity, Viscosity, Length'
+        params = {'keystrings': [{'string': 'density'}, {'string': 'velocity', 'exact_match': True}, {'string': 'direction', 'should_contain': False}]}
+        question = compile_question(answer, params)
+        self.assertIs(compile_question(answer, dict(params)), question)
+
+        for response in ['density,velocity,viscosity,length', 'density,speed,viscosity, length', 'Molecules are made out of atoms']:
+            expected = evaluation_function(response, answer, params)
+            expected_result = (expected.get_is_correct(), expected.feedback, expected.metadata["similarity_value"])
+            result = evaluation_function(response, answer, params, question=question)
+            self.assertEqual((result.get_is_correct(), result.feedback), expected_result[:2], msg=f'Response: {response}')
+            self.assertAlmostEqual(result.metadata["similarity_value"], expected_result[2], places=5, msg=f'Response: {response}')
+
+    def test_nlp_compiled_responses_give_the_same_result(self):
+        answer = 'Density, Velocity, Viscosity, Length'
+        params = {'keystrings': [{'string': 'density'}, {'string': 'velocity', 'exact_match': True}]}
+        question = compile_question(answer, params)
+        responses = ['density,velocity,viscosity,length', 'density,speed,viscosity, length', 'Molecules are made out of atoms', 'the']
+
+        for response, compiled_response in zip(responses, compile_responses(responses, question.compiled_answer)):
+            expected = evaluation_function(response, answer, params, question=question)
+            expected_result = (expected.get_is_correct(), expected.feedback, expected.metadata["similarity_value"])
+            result = evaluation_function(response, answer, params, question=question, compiled_response=compiled_response)
+            self.assertEqual((result.get_is_correct(), result.feedback), expected_result[:2], msg=f'Response: {response}')
+            self.assertAlmostEqual(result.metadata["similarity_value"], expected_result[2], places=5, msg=f'Response: {response}')
+
+    def test_nlp_keystring_scores_are_reported_by_every_method(self):
+        answer = 'Density, Velocity, Viscosity, Length'
+        params = {'keystrings': [{'string': 'density'}, {'string': 'velocity'}]}
+        responses = {'density,velocity,viscosity,length': 'w2v',
+                     'density, velocity, and also photosynthesis in green plants needs sunlight and chlorophyll': 'BOW vector similarity',
+                     'density': 'keystrings'}
+
+        for response, method in responses.items():
+            metadata = evaluation_function(response, answer, params).metadata
+            self.assertEqual(metadata['method'], method, msg=f'Response: {response}')
+            self.assertEqual([keystring for keystring, _ in metadata['keystring-scores']], ['density', 'velocity'], msg=f'Response: {response}')
+        self.assertNotIn('keystring-scores', evaluation_function('density,velocity,viscosity,length', answer, {}).metadata)
+
+    # keystrings and responses of the keystring window tests: windows shorter than the keystring, unknown words and no words
+    window_keystrings = ['density', 'characteristic velocity', 'shear viscosity of the fluid', 'qwertyuiop asdfghjkl']
+    window_responses = ['density,characteristic velocity,shear viscosity,characteristic lengthscale',
+                        'the qwertyuiop flows with asdfghjkl velocity', 'velocity', 'qwertyuiop', 'the', '']
+
+    def window_cases(self):
+        for keystring in self.window_keystrings:
+            compiled_keystring = CompiledKeystring({'string': keystring})
+            for response in self.window_responses:
+                tokens = preprocess_tokens(response)
+                windows = [' '.join(tokens[i:i + len(compiled_keystring.tokens)]) for i in range(len(tokens) - len(compiled_keystring.tokens) + 1)]
+                yield compiled_keystring, tokens, windows
+
+    def test_nlp_window_mean_similarities_match_each_window(self):
+        for compiled_keystring, tokens, windows in self.window_cases():
+            vectors, indices = lookup_word_vectors(tokens, normalise=False)
+            scores = window_mean_similarities(vectors, indices >= 0, compiled_keystring.vector, len(compiled_keystring.tokens))
+
+            expected = [sentence_similarity_mean_w2v(window, compiled_keystring.string) for window in windows]
+            self.assertEqual(len(scores), len(expected), msg=f'Keystring: {compiled_keystring.string}, Windows: {windows}')
+            for score, expected_score, window in zip(scores, expected, windows):
+                self.assertAlmostEqual(float(score), expected_score, places=5, msg=f'Keystring: {compiled_keystring.string}, Window: {window}')
+
+    def test_nlp_window_bow_similarities_match_each_window(self):
+        for compiled_keystring, tokens, windows in self.window_cases():
+            token_words = [bow_words(token) for token in tokens]
+            response_bow = BagOfWords(word for words in token_words for word in words)
+            scores = window_bow_similarities(token_words, response_bow, compiled_keystring.bow, len(compiled_keystring.tokens))
+
+            expected = [sentence_similarity(window, compiled_keystring.string)[0] for window in windows]
+            self.assertEqual(len(scores), len(expected), msg=f'Keystring: {compiled_keystring.string}, Windows: {windows}')
+            for score, expected_score, window in zip(scores, expected, windows):
+                if np.isnan(expected_score):
+                    self.assertTrue(np.isnan(score), msg=f'Keystring: {compiled_keystring.string}, Window: {window}')
+                else:
+                    self.assertAlmostEqual(float(score), float(expected_score), places=5, msg=f'Keystring: {compiled_keystring.string}, Window: {window}')
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
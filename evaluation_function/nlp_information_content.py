@@ -0,0 +1,63 @@
+import os
+import pickle
+
+import numpy as np
+
+NLP_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nlp")
+
+
+def load_word_frequencies(path: str = NLP_DATA_PATH):
+    """
+    Load the Brown corpus length and word frequencies, folding case variants
+    (e.g. 'The' and 'the') into a single lower case entry.
+    """
+    with open(os.path.join(path, "brown_length"), "rb") as fp:
+        blen = pickle.load(fp)
+    with open(os.path.join(path, "word_freqs"), "rb") as fp:
+        freqs = pickle.load(fp)
+
+    folded_freqs = {}
+    for word, count in freqs.items():
+        word = word.lower()
+        folded_freqs[word] = folded_freqs.get(word, 0) + count
+    return blen, folded_freqs
+
+
+class InformationContentTable:
+    """
+    Information content of words, precomputed for a whole vocabulary.
+
+    `table[i]` holds the information content of `vocabulary[i]`, so that the
+    table is aligned with the word2vec index and scoring a sentence is an
+    array gather. Words outside the vocabulary fall back to the frequencies.
+    """
+
+    def __init__(self, blen, freqs, vocabulary, key_to_index=None):
+        self.blen = blen
+        self.freqs = freqs
+        self.key_to_index = key_to_index if key_to_index is not None else {word: i for i, word in enumerate(vocabulary)}
+        counts = np.fromiter((freqs.get(word.lower(), 0) for word in vocabulary), dtype=np.float64, count=len(vocabulary))
+        self.table = (1 - np.log(counts + 1) / np.log(blen + 1)).astype(np.float32)
+
+    @classmethod
+    def from_files(cls, vocabulary, key_to_index=None, path: str = NLP_DATA_PATH):
+        blen, freqs = load_word_frequencies(path)
+        return cls(blen, freqs, vocabulary, key_to_index)
+
+    def word(self, word: str) -> float:
+        f = self.freqs.get(word, 0)
+        return 1 - (np.log(f + 1)) / (np.log(self.blen + 1))
+
+    def gather(self, words, indices=None) -> np.ndarray:
+        """
+        Information content of each word in `words` as a float32 array.
+        `indices` are the (optional) vocabulary indices of the words, -1 for words outside the vocabulary.
+        """
+        if indices is None:
+            indices = np.fromiter((self.key_to_index.get(word, -1) for word in words), dtype=np.int64, count=len(words))
+        known = indices >= 0
+        scores = np.empty(len(words), dtype=np.float32)
+        scores[known] = self.table[indices[known]]
+        for i in np.flatnonzero(~known):
+            scores[i] = self.word(words[i])
+        return scores
@@ -0,0 +1,60 @@
+import math
+import os
+import pickle
+import tempfile
+import unittest
+
+import numpy as np
+
+try:
+    from .nlp_information_content import InformationContentTable, load_word_frequencies
+except ImportError:
+    from nlp_information_content import InformationContentTable, load_word_frequencies
+
+
+def brown_information_content(word, blen, freqs):
+    # per-word information content, as computed before the table
+    return 1 - math.log(freqs.get(word, 0) + 1) / math.log(blen + 1)
+
+
+class TestInformationContent(unittest.TestCase):
+    """
+        TestCase Class used to test the information content table of the NLP evaluation.
+    """
+
+    blen = 1000
+    freqs = {'The': 30, 'the': 70, 'flow': 9, 'Flow': 1, 'viscosity': 2, 'reynolds': 5}
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        for name, data in [('brown_length', self.blen), ('word_freqs', self.freqs)]:
+            with open(os.path.join(self.directory.name, name), 'wb') as fp:
+                pickle.dump(data, fp)
+
+    def test_case_variants_are_folded(self):
+        blen, freqs = load_word_frequencies(self.directory.name)
+
+        self.assertEqual((blen, freqs), (self.blen, {'the': 100, 'flow': 10, 'viscosity': 2, 'reynolds': 5}))
+
+    def test_gather_matches_the_per_word_information_content(self):
+        vocabulary = ['the', 'flow', 'viscosity', 'density']
+        table = InformationContentTable.from_files(vocabulary, path=self.directory.name)
+        blen, freqs = load_word_frequencies(self.directory.name)
+        words = ['viscosity', 'the', 'density', 'flow']
+
+        scores = table.gather(words)
+        self.assertEqual(scores.dtype, np.float32)
+        np.testing.assert_allclose(scores, [brown_information_content(word, blen, freqs) for word in words], rtol=1e-6)
+
+    def test_words_outside_the_vocabulary_fall_back_to_the_frequencies(self):
+        table = InformationContentTable.from_files(['the', 'flow'], path=self.directory.name)
+        scores = table.gather(['reynolds', 'navier', 'flow'])
+
+        self.assertAlmostEqual(float(scores[0]), 1 - math.log(6) / math.log(1001), places=6)
+        self.assertEqual(float(scores[1]), 1.0)
+        self.assertAlmostEqual(float(scores[2]), 1 - math.log(11) / math.log(1001), places=6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import os
+import sys
+
+import gensim
+import numpy as np
+from nltk.data import find
+
+WORD2VEC_SAMPLE = 'models/word2vec_sample/pruned.word2vec.txt'
+MODEL_PATH = os.environ.get("MODEL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"))
+# gensim native layout of the word2vec sample: a pickled KeyedVectors plus its vectors in a separate .npy file
+WORD2VEC_NATIVE_PATH = os.environ.get("WORD2VEC_NATIVE_PATH", os.path.join(MODEL_PATH, "word2vec_sample.kv"))
+# in-memory representation of the vectors: 'float32' (as stored), 'float16', 'int8' or 'pca<dims>' (e.g. 'pca100')
+WORD2VEC_COMPRESSION = os.environ.get("WORD2VEC_COMPRESSION", "float32")
+
+
+class CompressedVectors:
+    """
+    Read-only stand-in for the gensim KeyedVectors used by nlp_evaluation, holding the vectors compressed:
+
+    - 'float16': half precision copy of the vectors.
+    - 'int8': every row scaled to [-127, 127] and rounded, with a float32 scale per row.
+    - 'pca<dims>': the vectors projected onto their `dims` principal axes (uncentred, so that the
+        dot products the cosine similarities are computed from are preserved as well as possible).
+
+    Rows are decompressed to float32 when they are looked up.
+    """
+
+    def __init__(self, w2v, compression: str):
+        self.compression = compression
+        self.key_to_index = w2v.key_to_index
+        self.index_to_key = w2v.index_to_key
+        vectors = np.asarray(w2v.vectors, dtype=np.float32)
+        self.scales = None
+        self.components = None
+        if compression == 'float16':
+            self.data = vectors.astype(np.float16)
+        elif compression == 'int8':
+            self.scales = np.abs(vectors).max(axis=1) / 127
+            self.scales[self.scales == 0] = 1
+            self.data = np.round(vectors / self.scales[:, None]).astype(np.int8)
+        elif compression.startswith('pca'):
+            dims = int(compression[3:])
+            _, eigenvectors = np.linalg.eigh(vectors.T.astype(np.float64) @ vectors)
+            self.components = eigenvectors[:, ::-1][:, :dims].astype(np.float32)
+            self.data = vectors @ self.components
+        else:
+            raise ValueError(f"Invalid compression '{compression}'. Please provide 'float16', 'int8' or 'pca<dims>'")
+        self.vector_size = self.data.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in [self.data, self.scales, self.components] if array is not None)
+
+    def has_index_for(self, key) -> bool:
+        return key in self.key_to_index
+
+    def get_rows(self, indices) -> np.ndarray:
+        rows = self.data[indices].astype(np.float32)
+        if self.scales is not None:
+            rows *= self.scales[indices, None]
+        return rows
+
+    def __getitem__(self, key) -> np.ndarray:
+        return self.get_rows(self.key_to_index[key])
+
+    def similarity(self, w1, w2) -> float:
+        v1, v2 = self[w1], self[w2]
+        return np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
+
+
+def get_word_vectors(w2v, indices) -> np.ndarray:
+    """
+    float32 vectors of the given vocabulary indices, from either a KeyedVectors or CompressedVectors.
+    """
+    if isinstance(w2v, CompressedVectors):
+        return w2v.get_rows(indices)
+    return w2v.vectors[indices]
+
+
+def vectors_nbytes(w2v) -> int:
+    """
+    Bytes held by the vectors of a gensim KeyedVectors or a CompressedVectors.
+    """
+    return w2v.nbytes if isinstance(w2v, CompressedVectors) else w2v.vectors.nbytes
+
+
+def compress_word2vec(w2v, compression: str = WORD2VEC_COMPRESSION):
+    if compression == 'float32':
+        return w2v
+    return CompressedVectors(w2v, compression)
+
+
+def load_word2vec_text():
+    """
+    Parse the NLTK word2vec sample from its text format (slow, the vectors are private to the process).
+    """
+    word2vec_sample = str(find(WORD2VEC_SAMPLE))
+    return gensim.models.KeyedVectors.load_word2vec_format(word2vec_sample, binary=False)
+
+
+def convert_word2vec(native_path: str = WORD2VEC_NATIVE_PATH):
+    """
+    One-time conversion of the word2vec sample to the gensim native layout, so that it can be memory-mapped.
+    """
+    w2v = load_word2vec_text()
+    os.makedirs(os.path.dirname(os.path.abspath(native_path)), exist_ok=True)
+    w2v.save(native_path, separately=['vectors'])
+    return native_path
+
+
+def load_word2vec(native_path: str = WORD2VEC_NATIVE_PATH, compression: str = WORD2VEC_COMPRESSION):
+    """
+    Load the word2vec sample, memory-mapping the converted native store if it exists.
+
+    The vectors are opened read-only with mmap='r', so loading takes milliseconds and every worker
+    process shares the same physical pages. Falls back to parsing the text file otherwise.
+    Any `compression` other than 'float32' builds a private compressed copy (see CompressedVectors).
+    """
+    if os.path.exists(native_path):
+        w2v = gensim.models.KeyedVectors.load(native_path, mmap='r')
+    else:
+        w2v = load_word2vec_text()
+    return compress_word2vec(w2v, compression)
+
+
+if __name__ == "__main__":
+    # Usage: python -m evaluation_function.nlp_word2vec [native_path]
+    print(convert_word2vec(sys.argv[1] if len(sys.argv) > 1 else WORD2VEC_NATIVE_PATH))
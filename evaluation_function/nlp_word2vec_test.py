@@ -0,0 +1,30 @@
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+try:
+    from .nlp_word2vec import compress_word2vec, vectors_nbytes
+except ImportError:
+    from nlp_word2vec import compress_word2vec, vectors_nbytes
+
+
+class TestVectorsNbytes(unittest.TestCase):
+    """
+        TestCase Class used to test the memory reported for the word vectors of every compression.
+    """
+
+    def setUp(self):
+        vectors = np.random.default_rng(0).standard_normal((10, 8)).astype(np.float32)
+        keys = [f"word{index}" for index in range(10)]
+        self.w2v = SimpleNamespace(vectors=vectors, index_to_key=keys, key_to_index={key: index for index, key in enumerate(keys)})
+
+    def test_every_compression_reports_its_own_arrays(self):
+        expected = {'float32': 10 * 8 * 4, 'float16': 10 * 8 * 2, 'int8': 10 * 8 + 10 * 4, 'pca4': 10 * 4 * 4 + 8 * 4 * 4}
+        nbytes = {compression: vectors_nbytes(compress_word2vec(self.w2v, compression)) for compression in expected}
+
+        self.assertEqual(nbytes, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,222 @@
+import ctypes
+import functools
+import inspect
+import os
+import threading
+import warnings
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# evaluate the static prefixes of LLM prompts once and only evaluate the request-specific suffix afterwards
+PREFIX_CACHE = os.environ.get("SLM_PREFIX_CACHE", "false").lower() == "true"
+# maximum number of prefix snapshots kept, each holding a copy of the model state (KV cache) after its prefix
+PREFIX_CACHE_SIZE = int(os.environ.get("SLM_PREFIX_CACHE_SIZE", "2"))
+
+# sampling settings of GPT4All.generate, which the underlying prompt_model does not share
+GENERATE_DEFAULTS = dict(temp=0.7, top_k=40, top_p=0.4, min_p=0.0, repeat_penalty=1.18, repeat_last_n=64, n_batch=8)
+# version of the GPT4All bindings whose internals the prefix cache relies on (pinned in pyproject.toml)
+GPT4ALL_VERSION = "2.8.2"
+
+
+def empty_callback(token_id: int, response: str) -> bool:
+    return True
+
+
+def chat_template(model) -> Optional[Tuple[Optional[str], str, str]]:
+    """
+    (system prompt, template head, template tail) a prompt of the model is wrapped in: no system prompt and an empty
+    template outside a chat session. None in a chat session with earlier exchanges, which prefixes do not cover.
+    """
+    history = getattr(model, "current_chat_session", None)
+    if history is None:
+        return None, "", ""
+    if len(history) != 1:
+        return None
+    # NOTE: GPT4All does not expose the template of the current chat session
+    template = getattr(model, "_current_prompt_template", None)
+    if template is None:
+        return None
+    head, tail = template.format("%1", "%2").split("%1", 1)
+    return history[0]["content"], head, tail
+
+
+@functools.lru_cache(maxsize=None)
+def state_library():
+    """
+    The llmodel C library with the state functions, which the GPT4All bindings load but do not declare, or None.
+    """
+    try:
+        from gpt4all._pyllmodel import llmodel
+    except ImportError:
+        return None
+    try:
+        llmodel.llmodel_get_state_size.argtypes = [ctypes.c_void_p]
+        llmodel.llmodel_get_state_size.restype = ctypes.c_uint64
+        llmodel.llmodel_save_state_data.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_uint8)]
+        llmodel.llmodel_save_state_data.restype = ctypes.c_uint64
+        llmodel.llmodel_restore_state_data.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_uint8)]
+        llmodel.llmodel_restore_state_data.restype = ctypes.c_uint64
+    except AttributeError:
+        return None
+    return llmodel
+
+
+def missing_gpt4all_internals() -> List[str]:
+    """
+    The internals of the GPT4All bindings the prefix cache relies on that the installed bindings lack: the prompt_model
+    method of LLModel and its settings, the fields of its prompt context, the state functions of the llmodel C library
+    and the sampling defaults of GPT4All.generate (GENERATE_DEFAULTS).
+    """
+    try:
+        from gpt4all import GPT4All
+        from gpt4all._pyllmodel import LLModel, LLModelPromptContext
+    except ImportError:
+        return ["gpt4all._pyllmodel"]
+
+    missing = []
+    prompt_model = getattr(LLModel, "prompt_model", None)
+    if prompt_model is None:
+        missing.append("LLModel.prompt_model")
+    else:
+        parameters = inspect.signature(prompt_model).parameters
+        missing += [f"LLModel.prompt_model({name})" for name in ["n_predict", "reset_context", "special", *GENERATE_DEFAULTS]
+                    if name not in parameters]
+    fields = {field[0] for field in getattr(LLModelPromptContext, "_fields_", [])}
+    missing += [f"LLModelPromptContext.{name}" for name in ["tokens", "tokens_size", "n_past"] if name not in fields]
+    if state_library() is None:
+        missing.append("llmodel_save_state_data/llmodel_restore_state_data")
+    defaults = {name: parameter.default for name, parameter in inspect.signature(GPT4All.generate).parameters.items()}
+    missing += [f"GPT4All.generate({name}={value})" for name, value in GENERATE_DEFAULTS.items() if defaults.get(name) != value]
+    return missing
+
+
+class PrefixCache:
+    """
+    Snapshots of a GPT4All model right after the static prefixes of prompts, so that a prompt starting with a known
+    prefix only evaluates its request-specific suffix.
+
+    A snapshot holds the position (n_past) and the tokens after the prefix, and a copy of the model state saved through
+    the llmodel C API. Restoring it rewinds the context to that position: if the context still starts with the prefix
+    tokens (e.g. the prefix was the last one evaluated) nothing else is needed, otherwise the saved state is restored
+    first. A snapshot that cannot be restored is evaluated again. At most `capacity` snapshots are kept, least recently
+    used first out.
+
+    NOTE: the suffix is tokenized separately from the prefix (as GPT4All does with the parts of a chat template), so the
+    tokens at the boundary can differ from those of the unsplit prompt. A generation inside a chat session is not added
+    to the session history.
+    """
+
+    def __init__(self, capacity: int = PREFIX_CACHE_SIZE, enabled: bool = PREFIX_CACHE):
+        self.capacity = capacity
+        self._enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._snapshots = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled and self.capacity > 0
+
+    def check_gpt4all(self) -> bool:
+        """
+        Disable the cache, with a warning, if the installed GPT4All bindings lack internals it relies on
+        (see missing_gpt4all_internals). Whether the cache is still enabled.
+        """
+        missing = missing_gpt4all_internals() if self.enabled else []
+        if missing:
+            warnings.warn(f"Prefix cache disabled: the installed GPT4All bindings (expected {GPT4ALL_VERSION}) lack "
+                          f"{', '.join(missing)}", RuntimeWarning)
+            self._enabled = False
+        return self.enabled
+
+    def generate(self, model, prompt: str, prefix: str, max_tokens: int, callback=None, **generate_kwargs) -> str:
+        """
+        model.generate(prompt, max_tokens=max_tokens, callback=callback, **generate_kwargs), evaluating only the part of
+        the prompt after `prefix` if a snapshot of the prefix can be restored.
+        Falls back to model.generate if the prompt does not start with the prefix or the model cannot be prompted directly.
+        """
+        backend = getattr(model, "model", None)
+        template = chat_template(model)
+        if not (prefix and prompt.startswith(prefix)) or template is None or not hasattr(backend, "prompt_model"):
+            if callback is not None:
+                generate_kwargs["callback"] = callback
+            return model.generate(prompt, max_tokens=max_tokens, **generate_kwargs)
+
+        system_prompt, head, tail = template
+        key = (id(backend), system_prompt, head, prefix)
+        settings = dict(GENERATE_DEFAULTS, **generate_kwargs)
+        output = []
+
+        def collect(token_id: int, response: str) -> bool:
+            output.append(response)
+            return callback(token_id, response) if callback is not None else True
+
+        with self._lock:
+            if self._restore(backend, key):
+                self.hits += 1
+            else:
+                self.misses += 1
+                self._evaluate_prefix(backend, key, system_prompt, head, prefix, settings["n_batch"])
+            backend.prompt_model(prompt[len(prefix):], "%1" + tail, collect, n_predict=max_tokens, reset_context=False, **settings)
+        return "".join(output)
+
+    def _evaluate_prefix(self, backend, key, system_prompt: Optional[str], head: str, prefix: str, n_batch: int) -> None:
+        if system_prompt is None:
+            backend.prompt_model(prefix, "%1", empty_callback, n_batch=n_batch, n_predict=0, reset_context=True)
+        else:
+            # the system prompt is ingested like GPT4All.generate does at the start of a chat session
+            backend.prompt_model(system_prompt, "%1%2", empty_callback, n_batch=n_batch, n_predict=0, reset_context=True, special=True)
+            backend.prompt_model(prefix, head + "%1", empty_callback, n_batch=n_batch, n_predict=0, reset_context=False)
+        context = getattr(backend, "context", None)
+        if context is None:
+            return
+        self._snapshots[key] = {
+            "n_past": context.n_past,
+            "tokens": list(context.tokens[:context.n_past]),
+            "state": self.save_state(backend),
+        }
+        self._snapshots.move_to_end(key)
+        while len(self._snapshots) > self.capacity:
+            self._snapshots.popitem(last=False)
+
+    def _restore(self, backend, key) -> bool:
+        snapshot = self._snapshots.get(key)
+        context = getattr(backend, "context", None)
+        if snapshot is None or context is None or context.tokens_size < snapshot["n_past"]:
+            return False
+        n_past, tokens = snapshot["n_past"], snapshot["tokens"]
+        # NOTE: the cached keys and values of a position only depend on the tokens up to it
+        if list(context.tokens[:n_past]) != tokens:
+            if snapshot["state"] is None or not self.restore_state(backend, snapshot["state"]):
+                return False
+            for index, token in enumerate(tokens):
+                context.tokens[index] = token
+        context.n_past = n_past
+        self._snapshots.move_to_end(key)
+        return True
+
+    def save_state(self, backend) -> Optional[bytes]:
+        library = state_library()
+        if library is None or not getattr(backend, "model", None):
+            return None
+        buffer = (ctypes.c_uint8 * library.llmodel_get_state_size(backend.model))()
+        return ctypes.string_at(buffer, library.llmodel_save_state_data(backend.model, buffer))
+
+    def restore_state(self, backend, state: bytes) -> bool:
+        library = state_library()
+        if library is None or not getattr(backend, "model", None):
+            return False
+        buffer = (ctypes.c_uint8 * len(state)).from_buffer_copy(state)
+        return library.llmodel_restore_state_data(backend.model, buffer) == len(state)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._snapshots.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._snapshots)}
+
+
+prefix_cache = PrefixCache()
+prefix_cache.check_gpt4all()
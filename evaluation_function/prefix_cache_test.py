@@ -0,0 +1,160 @@
+import importlib.util
+import unittest
+from unittest import mock
+
+try:
+    from . import prefix_cache
+    from .prefix_cache import PrefixCache, missing_gpt4all_internals
+except ImportError:
+    import prefix_cache
+    from prefix_cache import PrefixCache, missing_gpt4all_internals
+
+
+class FakeContext:
+    def __init__(self):
+        self.n_past = 0
+        self.tokens = []
+
+    @property
+    def tokens_size(self):
+        return len(self.tokens)
+
+
+class FakeBackend:
+    """
+    Stand-in for the GPT4All LLModel with one token per character, whose next token depends on all tokens before it.
+    """
+
+    def __init__(self):
+        self.context = None
+        self.evaluated = 0
+
+    def prompt_model(self, prompt, prompt_template, callback, n_predict=4096, reset_context=False, special=False, **kwargs):
+        if self.context is None:
+            self.context = FakeContext()
+        if reset_context:
+            self.context.n_past = 0
+        tokens = self.context.tokens
+        del tokens[self.context.n_past:]
+        text = prompt_template.split("%2")[0].replace("%1", prompt)
+        self.evaluated += len(text)
+        tokens.extend(ord(character) for character in text)
+        for token_id in range(n_predict):
+            token = chr(ord("a") + sum(tokens) % 26)
+            tokens.append(ord(token))
+            if not callback(token_id, token):
+                break
+        self.context.n_past = len(tokens)
+
+
+class FakeModel:
+    def __init__(self):
+        self.model = FakeBackend()
+        self.current_chat_session = None
+
+    def generate(self, prompt, max_tokens=200, callback=None, **kwargs):
+        output = []
+
+        def collect(token_id, response):
+            output.append(response)
+            return callback(token_id, response) if callback is not None else True
+        self.model.prompt_model(prompt, "%1", collect, n_predict=max_tokens, reset_context=True)
+        return "".join(output)
+
+
+class StateCache(PrefixCache):
+    """
+    Prefix cache saving the whole fake context as the model state.
+    """
+
+    def save_state(self, backend):
+        return list(backend.context.tokens)
+
+    def restore_state(self, backend, state):
+        backend.context.tokens[:] = state
+        return True
+
+
+class TestPrefixCache(unittest.TestCase):
+    """
+        TestCase Class used to test the reuse of evaluated prompt prefixes.
+    """
+
+    prefix = "Example Answer='A dog is in the house'; Response='"
+    other_prefix = "Rephrase the feedback on the response '"
+
+    def test_prefix_is_evaluated_once(self):
+        model, reference = FakeModel(), FakeModel()
+        cache = PrefixCache(capacity=2, enabled=True)
+        prompts = [self.prefix + "A cat is in the house'", self.prefix + "A dog is in the house'"]
+
+        for prompt in prompts:
+            self.assertEqual(cache.generate(model, prompt, self.prefix, max_tokens=5), reference.generate(prompt, max_tokens=5))
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "size": 1})
+        self.assertEqual(model.model.evaluated, len(self.prefix) + sum(len(prompt) - len(self.prefix) for prompt in prompts))
+
+    def test_saved_states_are_restored(self):
+        model, reference = FakeModel(), FakeModel()
+        cache = StateCache(capacity=2, enabled=True)
+        prompts = [(self.prefix + "A cat'", self.prefix), (self.other_prefix + "A cat'", self.other_prefix)] * 2
+
+        for prompt, prefix in prompts:
+            self.assertEqual(cache.generate(model, prompt, prefix, max_tokens=5), reference.generate(prompt, max_tokens=5))
+        self.assertEqual(cache.stats(), {"hits": 2, "misses": 2, "size": 2})
+
+    def test_unsaved_prefixes_are_evaluated_again(self):
+        model = FakeModel()
+        cache = PrefixCache(capacity=2, enabled=True)
+        for prompt, prefix in [(self.prefix + "A cat'", self.prefix), (self.other_prefix + "A cat'", self.other_prefix)] * 2:
+            cache.generate(model, prompt, prefix, max_tokens=5)
+
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 4, "size": 2})
+
+    def test_chat_sessions_with_history_are_not_covered(self):
+        model = FakeModel()
+        model.current_chat_session = [{"role": "system", "content": ""}, {"role": "user", "content": "Hi"}]
+        cache = PrefixCache(capacity=2, enabled=True)
+        cache.generate(model, self.prefix + "A cat'", self.prefix, max_tokens=5)
+
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 0, "size": 0})
+
+    def test_chat_sessions_with_an_unknown_template_are_not_covered(self):
+        model = FakeModel()
+        model.current_chat_session = [{"role": "system", "content": ""}]
+        cache = PrefixCache(capacity=2, enabled=True)
+        cache.generate(model, self.prefix + "A cat'", self.prefix, max_tokens=5)
+
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 0, "size": 0})
+
+
+def gpt4all_installed() -> bool:
+    try:
+        return importlib.util.find_spec("gpt4all._pyllmodel") is not None
+    except ImportError:
+        return False
+
+
+class TestGPT4AllInternals(unittest.TestCase):
+    """
+        TestCase Class used to test the check of the GPT4All internals the prefix cache relies on.
+    """
+
+    def test_missing_internals_disable_the_cache(self):
+        cache = PrefixCache(capacity=2, enabled=True)
+        with mock.patch.object(prefix_cache, "missing_gpt4all_internals", return_value=["LLModel.prompt_model"]):
+            with self.assertWarnsRegex(RuntimeWarning, "LLModel.prompt_model"):
+                self.assertFalse(cache.check_gpt4all())
+        self.assertFalse(cache.enabled)
+
+    def test_available_internals_keep_the_cache(self):
+        cache = PrefixCache(capacity=2, enabled=True)
+        with mock.patch.object(prefix_cache, "missing_gpt4all_internals", return_value=[]):
+            self.assertTrue(cache.check_gpt4all())
+
+    @unittest.skipUnless(gpt4all_installed(), "the GPT4All bindings are not installed")
+    def test_installed_bindings_have_the_internals(self):
+        self.assertEqual(missing_gpt4all_internals(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import cProfile
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List, Tuple
+
+# honour params['profile'], which runs the evaluation under the profiler (several times slower, one at a time)
+PROFILING = os.environ.get("EVALUATION_PROFILING", "false").lower() == "true"
+# number of functions in each hotspot list of a profile (can be overridden per request with an integer params['profile'])
+PROFILE_TOP = int(os.environ.get("EVALUATION_PROFILE_TOP", "10"))
+
+# NOTE: tracemalloc is process-wide, so profiled calls run one at a time
+_profile_lock = threading.Lock()
+_profiling = threading.local()
+
+
+def profiling_active() -> bool:
+    """
+    Whether the current thread is running a profiled call.
+    """
+    return getattr(_profiling, "active", False)
+
+
+def profile_top(profile: Any) -> int:
+    """
+    Number of hotspots requested by a params['profile'] value: the integer itself, or PROFILE_TOP for true.
+    """
+    return profile if isinstance(profile, int) and not isinstance(profile, bool) and profile > 0 else PROFILE_TOP
+
+
+def function_label(function: Tuple[str, int, str]) -> str:
+    filename, line, name = function
+    if filename == "~":
+        # built-in functions, e.g. the ctypes calls into the LLM library or file reads
+        return name
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+
+def hotspots(stats: pstats.Stats, sort: int, top: int) -> List[Dict[str, Any]]:
+    entries = sorted(stats.stats.items(), key=lambda item: item[1][sort], reverse=True)[:top]
+    return [{"function": function_label(function), "calls": calls, "own_time": own_time, "cumulative_time": cumulative_time}
+            for function, (_, calls, own_time, cumulative_time, _) in entries]
+
+
+def profile_call(function, *args, top: int = PROFILE_TOP, **kwargs) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Run function(*args, **kwargs) under cProfile and tracemalloc, returning its result and a compact summary:
+    the wall-clock time, the peak of the memory traced while it ran, and the `top` functions by own time and by
+    cumulative time.
+
+    NOTE: cProfile only profiles the calling thread (time spent in other threads shows as waiting), and tracemalloc
+    only traces the memory allocated through Python (e.g. numpy arrays, but not the LLM context).
+    """
+    with _profile_lock:
+        _profiling.active = True
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        start_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        profiler = cProfile.Profile()
+        start_time = time.perf_counter()
+        try:
+            result = profiler.runcall(function, *args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start_time
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            if not tracing:
+                tracemalloc.stop()
+            _profiling.active = False
+
+    stats = pstats.Stats(profiler)
+    return result, {
+        "profiler": "cProfile",
+        "wall_time": seconds,
+        "tracemalloc_peak_bytes": max(peak_memory - start_memory, 0),
+        "top_own_time": hotspots(stats, 2, top),
+        "top_cumulative_time": hotspots(stats, 3, top),
+    }
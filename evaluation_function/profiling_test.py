@@ -0,0 +1,45 @@
+import unittest
+
+try:
+    from .profiling import profile_call, profile_top, profiling_active, PROFILE_TOP
+except ImportError:
+    from profiling import profile_call, profile_top, profiling_active, PROFILE_TOP
+
+
+def read_vectors(size):
+    return [float(index) for index in range(size)]
+
+
+def similarity(size):
+    assert profiling_active()
+    return sum(read_vectors(size))
+
+
+class TestProfiling(unittest.TestCase):
+    """
+        TestCase Class used to test the profiling of single evaluations.
+    """
+
+    def test_hotspots_and_memory_peak_are_summarised(self):
+        result, summary = profile_call(similarity, 100000, top=3)
+
+        self.assertEqual(result, sum(range(100000)))
+        self.assertFalse(profiling_active())
+        self.assertEqual((summary["profiler"], len(summary["top_own_time"]), len(summary["top_cumulative_time"])), ("cProfile", 3, 3))
+        self.assertGreater(summary["tracemalloc_peak_bytes"], 100000 * 8)
+        self.assertRegex(summary["top_cumulative_time"][0]["function"], r"^profiling_test\.py:\d+\(similarity\)$")
+        self.assertRegex(summary["top_cumulative_time"][1]["function"], r"^profiling_test\.py:\d+\(read_vectors\)$")
+        self.assertEqual(summary["top_cumulative_time"][1]["calls"], 1)
+        self.assertGreaterEqual(summary["wall_time"], summary["top_cumulative_time"][0]["cumulative_time"])
+
+    def test_profile_param_sets_the_number_of_hotspots(self):
+        self.assertEqual([profile_top(True), profile_top(5), profile_top(0)], [PROFILE_TOP, 5, PROFILE_TOP])
+
+    def test_profiling_stops_when_the_call_fails(self):
+        with self.assertRaises(ZeroDivisionError):
+            profile_call(lambda: 1 / 0)
+        self.assertFalse(profiling_active())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,214 @@
+import argparse
+import json
+import os
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from .compiled_question import CompiledQuestion, preload_compiled_questions
+    from .nlp_evaluation import BagOfWords, CompiledAnswer, CompiledKeystring, check_custom_feedback, custom_feedback_message, w2v
+    from .nlp_word2vec import WORD2VEC_COMPRESSION
+    from .slm_instructions import QuestionPrompts, build_instruction
+    from .llm_cache import preload_generations
+except ImportError:
+    from compiled_question import CompiledQuestion, preload_compiled_questions
+    from nlp_evaluation import BagOfWords, CompiledAnswer, CompiledKeystring, check_custom_feedback, custom_feedback_message, w2v
+    from nlp_word2vec import WORD2VEC_COMPRESSION
+    from slm_instructions import QuestionPrompts, build_instruction
+    from llm_cache import preload_generations
+
+# question bank artifact loaded by main.py at startup, e.g. one written by `python -m evaluation_function.question_bank`
+QUESTION_BANK_PATH = os.environ.get("QUESTION_BANK_PATH", "")
+
+MAGIC = b"QBANK\x00\x01\n"
+ALIGNMENT = 64
+COMPILED_TYPES = {cls.__name__: cls for cls in (CompiledQuestion, CompiledAnswer, CompiledKeystring, BagOfWords, QuestionPrompts)}
+
+
+def vectors_fingerprint() -> Dict[str, Any]:
+    """
+    Description of the loaded word vectors: compiled data is only valid for the vectors it was computed with.
+    """
+    return {"compression": WORD2VEC_COMPRESSION, "vector_size": int(w2v.vector_size), "vocabulary": len(w2v.index_to_key)}
+
+
+def _encode(value, arrays: List[np.ndarray]):
+    if isinstance(value, np.ndarray):
+        arrays.append(value)
+        return {"__array__": len(arrays) - 1}
+    if type(value).__name__ in COMPILED_TYPES:
+        return {"__object__": type(value).__name__, "state": {name: _encode(item, arrays) for name, item in vars(value).items()}}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item, arrays) for item in value]
+    if isinstance(value, dict):
+        return {name: _encode(item, arrays) for name, item in value.items()}
+    return value
+
+
+def _decode(value, arrays: List[np.ndarray]):
+    if isinstance(value, list):
+        return [_decode(item, arrays) for item in value]
+    if isinstance(value, dict):
+        if "__array__" in value:
+            return arrays[value["__array__"]]
+        if "__object__" in value:
+            compiled = COMPILED_TYPES[value["__object__"]].__new__(COMPILED_TYPES[value["__object__"]])
+            compiled.__dict__.update({name: _decode(item, arrays) for name, item in value["state"].items()})
+            return compiled
+        return {name: _decode(item, arrays) for name, item in value.items()}
+    return value
+
+
+def write_question_bank(path: str, questions: List[CompiledQuestion], generations: Dict[str, Any] = None) -> None:
+    """
+    Write compiled questions (and optional pre-generated LLM outputs) to a single binary artifact:
+    the magic bytes, the length of a JSON header, the header, then the raw arrays it refers to,
+    each aligned to 64 bytes so that they can be used straight from a memory map.
+    """
+    arrays = []
+    encoded_questions = [_encode(question, arrays) for question in questions]
+    array_records, offset = [], 0
+    for array in arrays:
+        array_records.append({"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset})
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    header = json.dumps({
+        "fingerprint": vectors_fingerprint(),
+        "questions": encoded_questions,
+        "arrays": array_records,
+        "generations": generations,
+    }).encode()
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    with open(path + ".tmp", "wb") as fp:
+        fp.write(MAGIC + struct.pack("<Q", len(header)) + header)
+        for array, record in zip(arrays, array_records):
+            fp.seek(data_start + record["offset"])
+            fp.write(np.ascontiguousarray(array).tobytes())
+        fp.truncate(data_start + offset)
+    os.replace(path + ".tmp", path)
+
+
+def read_question_bank(path: str) -> Tuple[List[CompiledQuestion], Dict[str, Any]]:
+    """
+    Read a question bank artifact, returning its compiled questions (whose arrays are read-only views of a
+    memory map of the file) and its pre-generated LLM outputs (None if there are none).
+    """
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    if bytes(data[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f"'{path}' is not a question bank")
+    header_length, = struct.unpack("<Q", bytes(data[len(MAGIC):len(MAGIC) + 8]))
+    header = json.loads(bytes(data[len(MAGIC) + 8:len(MAGIC) + 8 + header_length]))
+    if header["fingerprint"] != vectors_fingerprint():
+        raise ValueError(f"Question bank '{path}' was compiled for other word vectors: {header['fingerprint']} instead of {vectors_fingerprint()}")
+
+    data_start = -(-(len(MAGIC) + 8 + header_length) // ALIGNMENT) * ALIGNMENT
+    arrays = []
+    for record in header["arrays"]:
+        dtype = np.dtype(record["dtype"])
+        start = data_start + record["offset"]
+        count = int(np.prod(record["shape"]))
+        arrays.append(data[start:start + count * dtype.itemsize].view(dtype).reshape(record["shape"]))
+    return [_decode(question, arrays) for question in header["questions"]], header["generations"]
+
+
+def pregenerate_llm_outputs(models: Dict[str, Any], questions: List[Tuple[Any, CompiledQuestion]]) -> Dict[str, Any]:
+    """
+    Generate the LLM outputs of a question bank that do not depend on the student response, each with the model of
+    its call site in `models` (see llm_backend.CALL_SITES): the keystring checks (one per keystring, and the batched
+    one) with the 'verdict' model, the rephrasing of each custom feedback and of the fixed feedback of the verdict tags
+    with the 'rephrase' model.
+    """
+    try:
+        from .slm_evaluation import BATCH_KEYSTRINGS
+        from .slm_rephraser import REPHRASE_STOP, TEMPLATE_FEEDBACK
+    except ImportError:
+        from slm_evaluation import BATCH_KEYSTRINGS
+        from slm_rephraser import REPHRASE_STOP, TEMPLATE_FEEDBACK
+
+    # the fixed feedback of a verdict tag is rephrased on its own (see slm_rephraser.plan_rephrase)
+    prompts = {build_instruction("", "", 'rephrase_custom', feedback): ("rephrase", 150, REPHRASE_STOP) for feedback in TEMPLATE_FEEDBACK.values()}
+    for params, question in questions:
+        for prompt in question.prompts.include_word:
+            prompts[prompt] = ("verdict", 10, None)
+        keystring_count = len(question.prompts.keystrings)
+        if params.get("batch_keystrings", BATCH_KEYSTRINGS) and keystring_count > 1:
+            prompts[question.prompts.include_words] = ("verdict", 8 * keystring_count + 10, None)
+        for keystring in question.compiled_keystrings:
+            if keystring.custom_feedback is not None:
+                _, info = check_custom_feedback(custom_feedback_message(keystring.custom_feedback))
+                prompts[build_instruction("", question.answer, 'rephrase_custom', info)] = ("rephrase", 150, REPHRASE_STOP)
+
+    entries = []
+    for prompt, (call_site, max_tokens, stop) in prompts.items():
+        model = models[call_site]
+        generate_kwargs = {"callback": stop.callback()} if stop is not None else {}
+        entries.append({"prompt": prompt, "max_tokens": max_tokens, "stop": stop.settings() if stop is not None else None,
+                        "model": model_name(model), "text": model.generate(prompt, max_tokens=max_tokens, **generate_kwargs)})
+    return {"entries": entries}
+
+
+def model_name(model) -> str:
+    return os.path.basename(getattr(model, "config", {}).get("path", type(model).__name__))
+
+
+def compile_question_bank(bank_path: str, output_path: str, models: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Compile a JSONL question bank, one {"answer": ..., "params": {...}} object per line, into a question bank
+    artifact, with the pre-generated LLM outputs of the given models of the call sites (if any).
+    Returns the number of questions.
+    """
+    questions = {}
+    with open(bank_path) as fp:
+        for line in fp:
+            if line.strip():
+                entry = json.loads(line)
+                params = entry.get("params", {})
+                question = CompiledQuestion(entry["answer"], params)
+                questions.setdefault(question.key, (params, question))
+
+    generations = pregenerate_llm_outputs(models, list(questions.values())) if models else None
+    write_question_bank(output_path, [question for _, question in questions.values()], generations)
+    return len(questions)
+
+
+def load_question_bank(path: str, *models) -> int:
+    """
+    Preload the compiled questions of a question bank artifact, and its pre-generated LLM outputs into the
+    generation cache for those generated by one of the given models. Returns the number of questions.
+    NOTE: preloaded generations are evicted like any other once the generation cache is full.
+    """
+    questions, generations = read_question_bank(path)
+    if generations is not None:
+        models_by_name = {model_name(model): model for model in models}
+        for name, model in models_by_name.items():
+            # NOTE: entries without a model are from artifacts generated with a single model for all call sites
+            preload_generations(model, [entry for entry in generations["entries"] if entry.get("model", generations.get("model")) == name])
+    return preload_compiled_questions(questions)
+
+
+def main():
+    """Compile a question bank from the command line.
+
+    Usage: python -m evaluation_function.question_bank <questions.jsonl> <output> [--llm-outputs]
+    """
+    parser = argparse.ArgumentParser(description="Compile a JSONL question bank into an artifact preloaded by main.py (see QUESTION_BANK_PATH).")
+    parser.add_argument("questions", help="JSONL file with one {\"answer\": ..., \"params\": {...}} object per line")
+    parser.add_argument("output", help="path of the question bank artifact")
+    parser.add_argument("--llm-outputs", action="store_true", help="pre-generate the LLM outputs that do not depend on the response")
+    args = parser.parse_args()
+
+    models = None
+    if args.llm_outputs:
+        # NOTE: imported here, as loading the models is only needed to pre-generate LLM outputs
+        try:
+            from .llm_backend import CALL_SITES, backend_for
+        except ImportError:
+            from llm_backend import CALL_SITES, backend_for
+        models = {call_site: backend_for(call_site).model for call_site in CALL_SITES}
+    print(f"Compiled {compile_question_bank(args.questions, args.output, models)} questions into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import json
+import os
+import tempfile
+import unittest
+
+try:
+    from . import llm_cache
+    from .compiled_question import CompiledQuestion, compile_question
+    from .llm_cache import GenerationCache, cached_generate
+    from .nlp_evaluation import evaluation_function
+    from .question_bank import compile_question_bank, load_question_bank, read_question_bank, write_question_bank
+    from .stub_llm import StubModel
+except ImportError:
+    import llm_cache
+    from compiled_question import CompiledQuestion, compile_question
+    from llm_cache import GenerationCache, cached_generate
+    from nlp_evaluation import evaluation_function
+    from question_bank import compile_question_bank, load_question_bank, read_question_bank, write_question_bank
+    from stub_llm import StubModel
+
+
+class TestQuestionBank(unittest.TestCase):
+    """
+        TestCase Class used to test the question bank compiler and loader.
+    """
+
+    answer = 'Density, Velocity, Viscosity, Length'
+    params = {'keystrings': [{'string': 'density'}, {'string': 'velocity', 'exact_match': True}]}
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.original_cache = llm_cache.generation_cache
+        llm_cache.generation_cache = GenerationCache(capacity=10, max_age=0, path="")
+
+    def tearDown(self):
+        llm_cache.generation_cache = self.original_cache
+        self.directory.cleanup()
+
+    def test_compiled_questions_round_trip(self):
+        bank_path = os.path.join(self.directory.name, 'questions.jsonl')
+        output_path = os.path.join(self.directory.name, 'questions.qb')
+        with open(bank_path, 'w') as fp:
+            fp.write(json.dumps({'answer': self.answer, 'params': self.params}) + '\n')
+            fp.write(json.dumps({'answer': self.answer, 'params': self.params}) + '\n')
+            fp.write(json.dumps({'answer': 'Many atoms form a molecule'}) + '\n')
+
+        self.assertEqual(compile_question_bank(bank_path, output_path), 2)
+        questions, generations = read_question_bank(output_path)
+        self.assertIsNone(generations)
+
+        question = next(question for question in questions if question.answer == self.answer)
+        self.assertEqual(question.key, CompiledQuestion(self.answer, self.params).key)
+        for response in ['density,velocity,viscosity,length', 'density,speed,viscosity, length']:
+            expected = evaluation_function(response, self.answer, self.params)
+            expected_result = (expected.get_is_correct(), expected.feedback)
+            result = evaluation_function(response, self.answer, self.params, question=question)
+            self.assertEqual((result.get_is_correct(), result.feedback), expected_result, msg=f'Response: {response}')
+
+    def test_loading_preloads_questions_and_generations(self):
+        model = StubModel(path="models/model.gguf")
+        question = CompiledQuestion(self.answer, self.params)
+        output_path = os.path.join(self.directory.name, 'questions.qb')
+        generations = {'model': 'model.gguf', 'entries': [{'prompt': question.prompts.include_word[0], 'max_tokens': 10, 'text': 'True'}]}
+        write_question_bank(output_path, [question], generations)
+
+        self.assertEqual(load_question_bank(output_path, model), 1)
+        self.assertEqual(compile_question(self.answer, self.params).key, question.key)
+        self.assertEqual(cached_generate(model, question.prompts.include_word[0], max_tokens=10), 'True')
+        self.assertEqual(model.calls, 0)
+
+    def test_generations_are_preloaded_for_the_model_of_their_call_site(self):
+        verdict_model, rephrase_model = StubModel(path="models/model.gguf"), StubModel(path="models/large.gguf")
+        bank_path = os.path.join(self.directory.name, 'questions.jsonl')
+        output_path = os.path.join(self.directory.name, 'questions.qb')
+        with open(bank_path, 'w') as fp:
+            fp.write(json.dumps({'answer': self.answer, 'params': self.params}) + '\n')
+
+        compile_question_bank(bank_path, output_path, {'verdict': verdict_model, 'rephrase': rephrase_model})
+        _, generations = read_question_bank(output_path)
+        self.assertEqual({entry['model'] for entry in generations['entries']}, {'model.gguf', 'large.gguf'})
+
+        load_question_bank(output_path, verdict_model)
+        prompt = CompiledQuestion(self.answer, self.params).prompts.include_word[0]
+        calls = (verdict_model.calls, rephrase_model.calls)
+        cached_generate(verdict_model, prompt, max_tokens=10)
+        cached_generate(rephrase_model, prompt, max_tokens=10)
+        self.assertEqual((verdict_model.calls, rephrase_model.calls), (calls[0], calls[1] + 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,25 +1,39 @@
-from gpt4all import GPT4All
+import os
+import re
 import time
-from typing import Any, TypedDict
+from typing import Any, List, TypedDict
 try:
     # from .evaluation_response_utilities import EvaluationResponse
     from .evaluation_response import Result as EvaluationResponse              # NOTE: instead of importing from lf_toolkit.evaluation as more attributes are added to the class
-    from .slm_instructions import build_instruction
+    from .slm_instructions import build_instruction, QuestionPrompts
+    from .llm_backend import backend_for
     from .nlp_evaluation import evaluation_function as nlp_evaluation_function
 except ImportError:
     # from evaluation_response_utilities import EvaluationResponse
     from evaluation_response import Result as EvaluationResponse
-    from slm_instructions import build_instruction
+    from slm_instructions import build_instruction, QuestionPrompts
+    from llm_backend import backend_for
     from nlp_evaluation import evaluation_function as nlp_evaluation_function
 
 
 class Params(TypedDict):
     pass
 
-model = GPT4All(model_name="Phi-3.5-mini-instruct-Q6_K.gguf",model_path="evaluation_function/models/", allow_download=False, device="cpu") # downloads / loads the model
+# LLM of the True/False checks, loaded at import (see llm_backend.py for choosing the backend and model file)
+verdict_backend = backend_for("verdict")
+
+# ask about all keystrings in a single prompt by default (can be overridden per request with params['batch_keystrings'])
+BATCH_KEYSTRINGS = os.environ.get("SLM_BATCH_KEYSTRINGS", "false").lower() == "true"
+# decide the keystrings the NLP layer is confident about without the LLM (can be overridden per request with params['keystring_gate'])
+KEYSTRING_GATE = os.environ.get("SLM_KEYSTRING_GATE", "false").lower() == "true"
+# NLP keystring scores at most the first value are missing, at least the second are found, the LLM checks the ones in between
+KEYSTRING_GATE_BAND = tuple(float(value) for value in os.environ.get("SLM_KEYSTRING_GATE_BAND", "0.4,0.9").split(","))
+# how the similarity and keystring checks get their True/False verdict (can be overridden per request with params['verdict_mode']):
+# 'generate' searches up to 10 generated tokens for 'true'/'false', 'classify' scores a single greedily decoded token (see LLMBackend.classify)
+VERDICT_MODE = os.environ.get("SLM_VERDICT_MODE", "generate")
 # instruction = "Compare the following two sections: Response='{response}' & Answer='{answer}'. Write 'True' if the response perfectly matches the answer, 'False' otherwise. Do not provide any explanation."
 
-def evaluation_function(response: Any, answer: Any, params: Any) -> EvaluationResponse:
+def evaluation_function(response: Any, answer: Any, params: Any, question=None, keystring_scores=None, timings=None) -> EvaluationResponse:
     """
     Function used to evaluate a student response.
     ---
@@ -41,6 +55,12 @@ def evaluation_function(response: Any, answer: Any, params: Any) -> EvaluationRe
     split into many) is entirely up to you. All that matters are the
     return types and that evaluation_function() is the main function used
     to output the evaluation response.
+
+    `question` is an optional CompiledQuestion (see compiled_question.py) of the answer and params,
+    whose pre-rendered prompts are then used.
+    `keystring_scores` are the optional NLP 'keystring-scores' of the response, used to decide the keystrings
+    outside the params['keystring_gate_band'] without the LLM when params['keystring_gate'] is set.
+    `timings` is an optional Timings (see timings.py) recording each LLM call.
     """
     start_time = time.process_time()
 
@@ -61,32 +81,57 @@ def evaluation_function(response: Any, answer: Any, params: Any) -> EvaluationRe
     TODO: Could the eval function receive the question for context checking? 
     """
 
+    llm_cache_stats = {"hits": 0, "misses": 0}
+    classify = params is not None and params.get("verdict_mode", VERDICT_MODE) == "classify"
+
+    if question is not None:
+        prompts = question.prompts
+    else:
+        keystrings = [keystring_object['string'] for keystring_object in params["keystrings"]] if params is not None and "keystrings" in params else []
+        prompts = QuestionPrompts(answer, keystrings)
+
     # STEP 1: check if the keystrings are present in the response (contextually)
     problematic_keystrings = []
-    if params is not None and "keystrings" in params:
-        keystrings = params["keystrings"]
-        for keystring_object in keystrings:
-            keystring = keystring_object['string']      # string that evaluation and feedback will be focused on
-            
-            # check if the keystring is found in the response or if something similar is contained in the response
-            keystring_instruction = build_instruction(response, answer, "include_word", keystring)
-            keystring_llm_response = model.generate(keystring_instruction, max_tokens=10)
-            if not process_response_corectness(keystring_llm_response):
+    if prompts.keystrings:
+        keystrings = prompts.keystrings      # strings that evaluation and feedback will be focused on
+        keystrings_found = [None] * len(keystrings)
+        if params.get("keystring_gate", KEYSTRING_GATE) and keystring_scores is not None and len(keystring_scores) == len(keystrings):
+            keystrings_found = gate_keystrings(keystring_scores, *params.get("keystring_gate_band", KEYSTRING_GATE_BAND))
+            eval_response.add_metadata("gated_keystrings", sum(found is not None for found in keystrings_found))
+        uncertain = [i for i, keystring_found in enumerate(keystrings_found) if keystring_found is None]
+        if params.get("batch_keystrings", BATCH_KEYSTRINGS) and len(uncertain) > 1:
+            if len(uncertain) == len(keystrings):
+                keystrings_instruction = prompts.include_words
+            else:
+                keystrings_instruction = build_instruction(response, answer, "include_words", [keystrings[i] for i in uncertain])
+            keystrings_llm_response = verdict_backend.generate(keystrings_instruction, max_tokens=8 * len(uncertain) + 10, cache_stats=llm_cache_stats,
+                                                               timings=timings, stage="slm.keystrings")
+            for i, keystring_found in zip(uncertain, process_batched_response_corectness(keystrings_llm_response, len(uncertain))):
+                keystrings_found[i] = keystring_found
+
+        for keystring, keystring_instruction, keystring_found in zip(keystrings, prompts.include_word, keystrings_found):
+            if keystring_found is None:
+                # check if the keystring is found in the response or if something similar is contained in the response
+                # (also the fallback for keystrings that could not be parsed from the batched response)
+                keystring_found = check_verdict(keystring_instruction, classify, llm_cache_stats, timings=timings, stage="slm.keystring")
+            if not keystring_found:
                 # if the keystring is not found in the response, add it to the list of problematic keystrings
                 problematic_keystrings.append(keystring)
                 # print(keystring_instruction)
                 # print("Keystring not found in response: ", keystring)
 
     # STEP 2: default to similarity case if no parameters are provided
-    evaluation_instruction = build_instruction(response, answer, "similarity")
+    evaluation_instruction = prompts.similarity(response)
 
-    with model.chat_session():
-        llm_response = model.generate(evaluation_instruction, max_tokens=10)
+    with verdict_backend.chat_session():
+        is_correct = check_verdict(evaluation_instruction, classify, llm_cache_stats, prompts.similarity_prefix, timings, "slm.similarity")
         end_time = time.process_time()
 
         eval_response.add_processing_time(end_time - start_time)
         eval_response.add_metadata("response", response)
-        is_correct = process_response_corectness(llm_response)
+        eval_response.add_metadata("llm_cache", llm_cache_stats)
+        if classify:
+            eval_response.add_metadata("similarity_verdict", is_correct)
         feedback = ""
         if is_correct is not None:
             eval_response.is_correct = is_correct
@@ -114,6 +159,23 @@ def evaluation_function(response: Any, answer: Any, params: Any) -> EvaluationRe
 
     return eval_response
 
+def check_verdict(prompt: str, classify: bool, llm_cache_stats=None, prefix: str = "", timings=None, stage: str = "slm") -> Any:
+    """
+    Verdict of a True/False prompt, None if the output could not be parsed (see LLMBackend.classify when classifying).
+    `prefix` is the static start of the prompt (see cached_generate), `stage` the name of the LLM call in the `timings`.
+    """
+    if classify:
+        return verdict_backend.classify(prompt, llm_cache_stats, prefix, timings, stage)
+    llm_response = verdict_backend.generate(prompt, max_tokens=10, cache_stats=llm_cache_stats, prefix=prefix, timings=timings, stage=stage)
+    return process_response_corectness(llm_response)
+
+def gate_keystrings(keystring_scores, low: float, high: float) -> List[Any]:
+    """
+    Whether each keystring was found from its NLP (keystring, score): False at most `low`, True at least `high`,
+    None (to be checked by the LLM) in between.
+    """
+    return [False if score <= low else True if score >= high else None for _, score in keystring_scores]
+
 def process_response_corectness(result: Any) -> bool:
     result = result.lower()
     if "true" in result:
@@ -121,4 +183,16 @@ def process_response_corectness(result: Any) -> bool:
     elif "false" in result:
         return False
     else:
-        return None
\ No newline at end of file
+        return None
+
+def process_batched_response_corectness(result: Any, count: int) -> List[Any]:
+    """
+    Parse the '<number>: True;' / '<number>: False;' entries of a batched keystring response.
+    Keystrings without a (valid) entry are None.
+    """
+    keystrings_found = [None] * count
+    for number, verdict in re.findall(r"(\d+)\s*[:.)=-]\s*'?(true|false)", result.lower()):
+        index = int(number) - 1
+        if 0 <= index < count and keystrings_found[index] is None:
+            keystrings_found[index] = verdict == "true"
+    return keystrings_found
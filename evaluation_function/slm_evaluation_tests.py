@@ -1,149 +1,260 @@
-# import unittest
-
-# try:
-#     from .slm_evaluation import evaluation_function
-# except ImportError:
-#     from slm_evaluation import evaluation_function
-
-# class TestEvaluationFunction(unittest.TestCase):
-#     """
-#         TestCase Class used to test the algorithm.
-#         ---
-#         Tests are used here to check that the algorithm written 
-#         is working as it should. 
+import re
+import unittest
+from unittest import mock
+
+try:
+    from . import llm_cache, slm_evaluation, slm_rephraser
+    from .llm_backend import LLMBackend
+    from .llm_cache import GenerationCache
+    from .slm_evaluation import evaluation_function, gate_keystrings, process_batched_response_corectness
+    from .stub_llm import StubModel
+except ImportError:
+    import llm_cache
+    import slm_evaluation
+    import slm_rephraser
+    from llm_backend import LLMBackend
+    from llm_cache import GenerationCache
+    from slm_evaluation import evaluation_function, gate_keystrings, process_batched_response_corectness
+    from stub_llm import StubModel
+
+
+def canned_verdicts(verdicts):
+    """
+    Canned stub outputs (see StubModel) answering the similarity check of each response with its verdict.
+    """
+    return {r"Response='%s' & Answer=" % re.escape(response): f" {verdict}" for response, verdict in verdicts.items()}
+
+
+class StubTestCase(unittest.TestCase):
+    """
+        TestCase Class running the SLM evaluation and rephrasing against the deterministic stub LLM (see stub_llm.py),
+        without the generation cache. `stub_outputs` are canned outputs of the stub (see StubModel).
+    """
+
+    stub_outputs = {}
+
+    def setUp(self):
+        self.model = StubModel(outputs=self.stub_outputs)
+        backend = LLMBackend("stub", self.model)
+        patches = [mock.patch.object(slm_evaluation, "verdict_backend", backend),
+                   mock.patch.object(slm_rephraser, "rephrase_backend", backend),
+                   mock.patch.object(llm_cache, "generation_cache", GenerationCache(capacity=0, max_age=0, path=""))]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def prompts(self, result_function, *args):
+        with mock.patch.object(self.model, "generate", wraps=self.model.generate) as generate:
+            result = result_function(*args)
+        return result, [call.args[0] for call in generate.call_args_list]
+
+
+class TestBatchedKeystrings(StubTestCase):
+    """
+        TestCase Class used to test the keystring checks asking about all keystrings in one prompt.
+    """
+
+    answer = 'Density, Velocity, Viscosity, Length'
+    params = {'keystrings': [{'string': 'density'}, {'string': 'velocity'}, {'string': 'viscosity'}], 'batch_keystrings': True}
+    # the stub answers the batched prompt about the first and third keystring only
+    stub_outputs = {r"Keystrings=1: ": " 1: True; 3: False;"}
+
+    def test_entry_formats(self):
+        self.assertEqual(process_batched_response_corectness(" 1: True; 2: false;", 2), [True, False])
+        self.assertEqual(process_batched_response_corectness("1) True\n2. 'false'\n3 - TRUE\n4= False", 4), [True, False, True, False])
+
+    def test_out_of_range_and_duplicate_entries(self):
+        self.assertEqual(process_batched_response_corectness("0: True; 3: True; 12: False", 2), [None, None])
+        self.assertEqual(process_batched_response_corectness("1: True; 1: False; 2: False; 2: True", 2), [True, False])
+        self.assertEqual(process_batched_response_corectness("Velocity is True", 2), [None, None])
+
+    def test_missing_entries_fall_back_to_one_prompt_per_keystring(self):
+        result, prompts = self.prompts(slm_evaluation.evaluation_function, 'density and speed', self.answer, self.params)
+
+        self.assertEqual(len(prompts), 3)
+        self.assertIn("Keystrings=1: 'density'; 2: 'velocity'; 3: 'viscosity'", prompts[0])
+        self.assertIn("'velocity'", prompts[1].splitlines()[-1])
+        self.assertNotIn("'density'", prompts[1].splitlines()[-1])
+        self.assertIn("viscosity", result.feedback)
+
+
+class TestKeystringGate(StubTestCase):
+    """
+        TestCase Class used to test the keystring checks decided from the NLP keystring scores.
+    """
+
+    answer = 'Density, Velocity, Viscosity, Length'
+    params = {'keystrings': [{'string': 'density'}, {'string': 'velocity'}, {'string': 'viscosity'}], 'keystring_gate': True,
+              'keystring_gate_band': [0.4, 0.9]}
+
+    def test_band_edges(self):
+        keystring_scores = [('a', 0.4), ('b', 0.9), ('c', 0.41), ('d', 0.89), ('e', 0.0), ('f', 1.0)]
+
+        self.assertEqual(gate_keystrings(keystring_scores, 0.4, 0.9), [False, True, None, None, False, True])
+
+    def test_only_uncertain_keystrings_reach_the_llm(self):
+        keystring_scores = [('density', 1.0), ('velocity', 0.6), ('viscosity', 0.4)]
+        result, prompts = self.prompts(slm_evaluation.evaluation_function, 'density and speed', self.answer, self.params, None, keystring_scores)
+
+        self.assertEqual(len(prompts), 2)
+        self.assertIn("Keystrings='velocity'", prompts[0].splitlines()[-1])
+        self.assertEqual(result.metadata['gated_keystrings'], 2)
+        self.assertIn("viscosity", result.feedback)
+
+    def test_mismatched_scores_are_not_used(self):
+        keystring_scores = [('density', 1.0), ('velocity', 0.0)]
+        result, prompts = self.prompts(slm_evaluation.evaluation_function, 'density and speed', self.answer, self.params, None, keystring_scores)
+
+        self.assertEqual(len(prompts), 4)
+        self.assertNotIn('gated_keystrings', result.metadata)
+
+
+class TestEvaluationFunction(StubTestCase):
+    """
+        TestCase Class used to test the algorithm.
+        ---
+        Tests are used here to check that the algorithm written 
+        is working as it should. 
         
-#         It's best practise to write these tests first to get a 
-#         kind of 'specification' for how your algorithm should 
-#         work, and you should run these tests before committing 
-#         your code to AWS.
+        It's best practise to write these tests first to get a 
+        kind of 'specification' for how your algorithm should 
+        work, and you should run these tests before committing 
+        your code to AWS.
 
-#         Read the docs on how to use unittest here:
-#         https://docs.python.org/3/library/unittest.html
+        Read the docs on how to use unittest here:
+        https://docs.python.org/3/library/unittest.html
 
-#         Use evaluation_function() to check your algorithm works 
-#         as it should.
+        Use evaluation_function() to check your algorithm works 
+        as it should.
         
-#         NOTE: this testcase uses the EvaluationResponse class from the evaluation_response_utilities.py file
-#     """
+        NOTE: the verdicts come from the stub LLM, with canned outputs (stub_outputs) standing in for the answers of the
+        model where its word overlap heuristic differs from them
+    """
+
+    stub_outputs = canned_verdicts({
+        'not light blue': False,
+        'density,characteristic velocity,shear viscosity,characteristic lengthscale': True,
+        'pressure,characteristic velocity of flow,shear viscosity,characteristic length scale': True,
+    })
 
-#     # -------------------------------------------------------------- CONTEXT CASES
+    # -------------------------------------------------------------- CONTEXT CASES
 
-#     def test_slm_returns_is_correct_true(self):
-#         response, answer, params = "A xor gate takes 2 inputs", "There are 2 inputs in a xor gate", dict()
-#         result = evaluation_function(response, answer, params)
+    def test_slm_returns_is_correct_true(self):
+        response, answer, params = "A xor gate takes 2 inputs", "There are 2 inputs in a xor gate", dict()
+        result = evaluation_function(response, answer, params)
         
-#         self.assertEqual(result.get_is_correct(), True)
+        self.assertEqual(result.get_is_correct(), True)
 
-#     def test_slm_negation(self):
-#         answer, params = 'light blue', dict()
-#         response = 'not light blue'
-#         result = evaluation_function(response, answer, params)
+    def test_slm_negation(self):
+        answer, params = 'light blue', dict()
+        response = 'not light blue'
+        result = evaluation_function(response, answer, params)
         
-#         self.assertEqual(result.get_is_correct(), False)
-
-#     # -------------------------------------------------------------- SPECIAL CASES: include, exclude
-
-#     # def test_slm_reynolds_number_exact_match(self):
-#     #     # NOTE: Model does not consider keystrings (this is done by NLP eval), it does not check for exact matches of words
-#     #     # thus if the response is a subset of the answer, it is considered correct (e.g. speed and velocity sometimes are used interchangeably)
-#     #     # if model does not know the question's context then it cannot check for exact matches
-#     #     answer, params = 'Density, Velocity, Viscosity, Length', {
-#     #         'keystrings': [{'string': 'velocity', 'exact_match': True}]}
-#     #     incorrect_responses = [
-#     #         'density,speed,viscosity, length',
-#     #     ]
-
-#     #     for response in incorrect_responses:
-#     #         result = evaluation_function(response, answer, params)
-
-#     #         self.assertEqual(result.get_is_correct(), False, msg=f'Response: {response}')
-
-#     # def test_slm_reynolds_number_should_not_contain(self):
-#     #     # NOTE: Model does not consider keystrings (this is done by NLP eval)
-#     #     # if should_contain is False, then the response should not contain the keystring
-#     #     answer, params = 'Density, Velocity, Viscosity, Length', {
-#     #         'keystrings': [{'string': 'direction', 'should_contain': False}]}
-#     #     incorrect_responses = [
-#     #         'density,speed,viscosity, length, direction',
-#     #     ]
-
-#     #     for response in incorrect_responses:
-#     #         result = evaluation_function(response, answer, params)
-
-#     #         self.assertEqual(result.get_is_correct(), False, msg=f'Response: {response}')
-
-#     # -------------------------------------------------------------- DEFAULT CASE: similarity
-
-#     def test_slm_reynolds_number_is_correct(self):
-#         answer, params = 'Density, Velocity, Viscosity, Length', dict()
-#         correct_responses = [
-#             'density,velocity,viscosity,length',
-#             'Density,Velocity,Viscosity,Length',
-#             'density,characteristic velocity,viscosity,characteristic length',
-#             'Density,Velocity,Shear viscosity,Length',          
-#             'density,velocity,viscosity,lengthscale',
-#             'density,velocity,shear viscosity,length',
-#             'density,characteristic velocity,shear viscosity,characteristic lengthscale',
-#             'density,velocity,shear viscosity,characteristic lengthscale',
-#             'density,velocity,viscosity,length scale',
-#             'pressure,characteristic velocity of flow,shear viscosity,characteristic length scale',
-#         ]
-
-#         for response in correct_responses:
-#             result = evaluation_function(response, answer, params)
-
-#             self.assertEqual(result.get_is_correct(), True, msg=f'Response: {response}')
-
-#     # def test_slm_reynolds_number_is_incorrect(self):
-#     # # NOTE: Model only checks context similarity and if response is subset of answer
-#     # # thus, subsets and units are considred correct
-#     #     answer, params = 'Density, Velocity, Viscosity, Length', dict()
-#     #     incorrect_responses = [
-#     #         'density,,,',
-#     #         'rho,u,mu,L',                                       
-#     #     ]
-
-#     #     for response in incorrect_responses:
-#     #         result = evaluation_function(response, answer, params)
-
-#     #         self.assertEqual(result.get_is_correct(), False, msg=f'Response: {response}')
-
-#     # def test_slm_reynolds_number_is_incorrect_with_keystring(self):
-#     # NOTE: Model does not consider keystrings (this is done by NLP eval)
-#     #     answer, params = 'Density, Velocity, Viscosity, Length', {'keystrings': [{'string': 'density'}, {'string': 'velocity'}, {'string': 'viscosity'}, {'string': 'length'}]}
-#     #     incorrect_responses = [
-#     #         'density,velocity,visc,',
-#     #     ]
-
-#     #     for response in incorrect_responses:
-#     #         result = evaluation_function(response, answer, params)
-
-#     #         self.assertEqual(result.get_is_correct(), False, msg=f'Response: {response}')
-
-#     navier_stokes_answer = "The density of the film is uniform and constant, therefore the flow is incompressible. " \
-#                            "Since we have incompressible flow, uniform viscosity, Newtonian fluid, " \
-#                            "the most appropriate set of equations for the solution of the problem is the " \
-#                            "Navier-Stokes equations. The Navier-Stokes equations in Cartesian coordinates are used: " \
-#                            "mass conservation and components of the momentum balance"
-
-#     navier_stokes_params = {'keystrings': [{'string': 'Navier-Stokes equations'}, {'string': 'mass conservation'},
-#                                                                     {'string': 'momentum balance'}, {'string': 'incompressible flow'},
-#                                                                     {'string': 'uniform viscosity'}, {'string': 'Newtonian fluid'}]}
-
-#     def test_slm_navier_stokes_equation(self):
-#         answer, params = self.navier_stokes_answer, dict()
-#         correct_responses = [
-#             #'Navier-stokes. Continuum, const and uniform density and viscosity so incompressible, newtonian. Fits all '
-#             #'requirements for navier stokes',
-#             'Navier-Stokes in a Cartesian reference coordinates would be chosen for this particular flow. This is due '
-#             'to the reason that the flow is Newtonian, the viscosity is uniform and constant. Additionally, '
-#             'the density is uniform and constant; implying that it is an incompressible flow. This flow obeys the '
-#             'main assumptions in order to employ the Navier Stokes equations.',
-#         ]
-
-#         for response in correct_responses:
-#             result = evaluation_function(response, answer, params)
-#             self.assertEqual(result.get_is_correct(), True, msg=f'Response: {response}')
-
-# # if __name__ == "__main__":
-# #     unittest.main()
\ No newline at end of file
+        self.assertEqual(result.get_is_correct(), False)
+
+    # -------------------------------------------------------------- SPECIAL CASES: include, exclude
+
+    # def test_slm_reynolds_number_exact_match(self):
+    #     # NOTE: Model does not consider keystrings (this is done by NLP eval), it does not check for exact matches of words
+    #     # thus if the response is a subset of the answer, it is considered correct (e.g. speed and velocity sometimes are used interchangeably)
+    #     # if model does not know the question's context then it cannot check for exact matches
+    #     answer, params = 'Density, Velocity, Viscosity, Length', {
+    #         'keystrings': [{'string': 'velocity', 'exact_match': True}]}
+    #     incorrect_responses = [
+    #         'density,speed,viscosity, length',
+    #     ]
+
+    #     for response in incorrect_responses:
+    #         result = evaluation_function(response, answer, params)
+
+    #         self.assertEqual(result.get_is_correct(), False, msg=f'Response: {response}')
+
+    # def test_slm_reynolds_number_should_not_contain(self):
+    #     # NOTE: Model does not consider keystrings (this is done by NLP eval)
+    #     # if should_contain is False, then the response should not contain the keystring
+    #     answer, params = 'Density, Velocity, Viscosity, Length', {
+    #         'keystrings': [{'string': 'direction', 'should_contain': False}]}
+    #     incorrect_responses = [
+    #         'density,speed,viscosity, length, direction',
+    #     ]
+
+    #     for response in incorrect_responses:
+    #         result = evaluation_function(response, answer, params)
+
+    #         self.assertEqual(result.get_is_correct(), False, msg=f'Response: {response}')
+
+    # -------------------------------------------------------------- DEFAULT CASE: similarity
+
+    def test_slm_reynolds_number_is_correct(self):
+        answer, params = 'Density, Velocity, Viscosity, Length', dict()
+        correct_responses = [
+            'density,velocity,viscosity,length',
+            'Density,Velocity,Viscosity,Length',
+            'density,characteristic velocity,viscosity,characteristic length',
+            'Density,Velocity,Shear viscosity,Length',          
+            'density,velocity,viscosity,lengthscale',
+            'density,velocity,shear viscosity,length',
+            'density,characteristic velocity,shear viscosity,characteristic lengthscale',
+            'density,velocity,shear viscosity,characteristic lengthscale',
+            'density,velocity,viscosity,length scale',
+            'pressure,characteristic velocity of flow,shear viscosity,characteristic length scale',
+        ]
+
+        for response in correct_responses:
+            result = evaluation_function(response, answer, params)
+
+            self.assertEqual(result.get_is_correct(), True, msg=f'Response: {response}')
+
+    # def test_slm_reynolds_number_is_incorrect(self):
+    # # NOTE: Model only checks context similarity and if response is subset of answer
+    # # thus, subsets and units are considred correct
+    #     answer, params = 'Density, Velocity, Viscosity, Length', dict()
+    #     incorrect_responses = [
+    #         'density,,,',
+    #         'rho,u,mu,L',                                       
+    #     ]
+
+    #     for response in incorrect_responses:
+    #         result = evaluation_function(response, answer, params)
+
+    #         self.assertEqual(result.get_is_correct(), False, msg=f'Response: {response}')
+
+    # def test_slm_reynolds_number_is_incorrect_with_keystring(self):
+    # NOTE: Model does not consider keystrings (this is done by NLP eval)
+    #     answer, params = 'Density, Velocity, Viscosity, Length', {'keystrings': [{'string': 'density'}, {'string': 'velocity'}, {'string': 'viscosity'}, {'string': 'length'}]}
+    #     incorrect_responses = [
+    #         'density,velocity,visc,',
+    #     ]
+
+    #     for response in incorrect_responses:
+    #         result = evaluation_function(response, answer, params)
+
+    #         self.assertEqual(result.get_is_correct(), False, msg=f'Response: {response}')
+
+    navier_stokes_answer = "The density of the film is uniform and constant, therefore the flow is incompressible. " \
+                           "Since we have incompressible flow, uniform viscosity, Newtonian fluid, " \
+                           "the most appropriate set of equations for the solution of the problem is the " \
+                           "Navier-Stokes equations. The Navier-Stokes equations in Cartesian coordinates are used: " \
+                           "mass conservation and components of the momentum balance"
+
+    navier_stokes_params = {'keystrings': [{'string': 'Navier-Stokes equations'}, {'string': 'mass conservation'},
+                                                                    {'string': 'momentum balance'}, {'string': 'incompressible flow'},
+                                                                    {'string': 'uniform viscosity'}, {'string': 'Newtonian fluid'}]}
+
+    def test_slm_navier_stokes_equation(self):
+        answer, params = self.navier_stokes_answer, dict()
+        correct_responses = [
+            #'Navier-stokes. Continuum, const and uniform density and viscosity so incompressible, newtonian. Fits all '
+            #'requirements for navier stokes',
+            'Navier-Stokes in a Cartesian reference coordinates would be chosen for this particular flow. This is due '
+            'to the reason that the flow is Newtonian, the viscosity is uniform and constant. Additionally, '
+            'the density is uniform and constant; implying that it is an incompressible flow. This flow obeys the '
+            'main assumptions in order to employ the Navier Stokes equations.',
+        ]
+
+        for response in correct_responses:
+            result = evaluation_function(response, answer, params)
+            self.assertEqual(result.get_is_correct(), True, msg=f'Response: {response}')
+
+if __name__ == "__main__":
+    unittest.main()
\ No newline at end of file
@@ -7,6 +7,10 @@ def build_instruction(response, answer, case, keystring=""):
         # CASE for keystring check
         case = include_word.format(keystring=keystring)
         instruction = example_scenario_keystring + base_instruction_keystring.format(keystring=keystring, answer=answer, case=case)
+    elif case == 'include_words':
+        # CASE for checking all keystrings (a list) in one prompt
+        keystrings = "; ".join(f"{i}: '{k}'" for i, k in enumerate(keystring, start=1))
+        instruction = example_scenario_keystrings + base_instruction_keystrings.format(keystrings=keystrings, answer=answer, case=include_words)
     elif case == 'exclude_word':
         # NOTE: (should_countain == false) this is done by NLP function
         case = exclude_word.format(keystring=keystring)
@@ -24,11 +28,44 @@ def build_instruction(response, answer, case, keystring=""):
         # CASE for rephrasing custom feedback
         instruction = custom_feedback_rephrasing_prompt.format(custom_feedback=keystring)
     else:
-        raise ValueError("Invalid case. Please provide a valid case: 'include', 'exclude_word' or 'similarity'")
+        raise ValueError("Invalid case. Please provide a valid case: 'include_word', 'include_words', 'exclude_word' or 'similarity'")
 
 
     return instruction
 
+class QuestionPrompts:
+    """
+    Prompts of a question pre-rendered with build_instruction from its answer and keystrings,
+    so that only the student response (and the rephrasing information) is filled in per request.
+    """
+    RESPONSE = "\0response\0"
+    INFO = "\0info\0"
+
+    def __init__(self, answer, keystrings):
+        self.keystrings = list(keystrings)
+        # NOTE: the keystring prompts compare the keystrings against the answer only
+        self.include_word = [build_instruction(self.RESPONSE, answer, 'include_word', keystring) for keystring in self.keystrings]
+        self.include_words = build_instruction(self.RESPONSE, answer, 'include_words', self.keystrings)
+        self._similarity = build_instruction(self.RESPONSE, answer, 'similarity').split(self.RESPONSE)
+        rephrase_prefix, rephrase_suffix = build_instruction(self.RESPONSE, answer, 'rephrase', self.INFO).split(self.RESPONSE)
+        self._rephrase = [rephrase_prefix, *rephrase_suffix.split(self.INFO)]
+
+    @property
+    def similarity_prefix(self):
+        # static start of the similarity prompt, which the prefix cache evaluates once
+        return self._similarity[0]
+
+    @property
+    def rephrase_prefix(self):
+        return self._rephrase[0]
+
+    def similarity(self, response):
+        return str(response).join(self._similarity)
+
+    def rephrase(self, response, info):
+        prefix, middle, suffix = self._rephrase
+        return prefix + str(response) + middle + str(info) + suffix
+
 example_scenario = """Example Response='A cat is in the house' & Example Answer='A dog is in the house' -> False; 
 Example Response='John's cat is in the house' & Example Answer='An animal in the building' -> True; \n"""
 base_instruction = "Write 'True' if {case}; 'False' otherwise. Do not provide any explanation. \nResponse='{response}' & Answer='{answer}' ->"
@@ -37,10 +74,15 @@ example_scenario_keystring = """Example Keystrings='generate fake data' & Exampl
 Example Keystrings='generate fake data' & Example Answer='The algorithm receives data of fake people.' -> False; \n"""
 base_instruction_keystring = "Write 'True' if {case}; 'False' otherwise. Do not provide any explanation. \nKeystrings='{keystring}' & Answer='{answer}' ->"
 
+example_scenario_keystrings = """Example Keystrings=1: 'generate fake data'; 2: 'receives real data' & Example Answer='The algorithm generates false data.' -> 1: True; 2: False;
+Example Keystrings=1: 'fake people'; 2: 'algorithm' & Example Answer='The algorithm receives data of fake people.' -> 1: True; 2: True; \n"""
+base_instruction_keystrings = "For each numbered keystring, write 'True' if {case}; 'False' otherwise. Answer with one '<number>: True;' or '<number>: False;' per keystring. Do not provide any explanation. \nKeystrings={keystrings} & Answer='{answer}' ->"
+
 # CASES for evaluation
 # Include, Exclude of words are done by an algorithm and not by the model
 perfect_match = "the Response perfectly matches the Answer"
 include_word = "the Response contains mentions the '{keystring}' or describes something similar"
+include_words = "the Response contains mentions the keystring or describes something similar"
 exclude_word = "the Response does not contain '{keystring}'"
 similarity = "the Response is similar to or describes the Answer"
 include = "the Response is a subset of the Answer"          # descriptive version
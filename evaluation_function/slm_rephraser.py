@@ -1,27 +1,90 @@
+import os
+import re
 from typing import Any
 
 try:
     from .slm_instructions import build_instruction
-    from .slm_evaluation import model
+    from .llm_backend import backend_for
+    from .llm_cache import GenerationCache, StopCondition, generation_key
 except ImportError:
     from slm_instructions import build_instruction
-    from slm_evaluation import model
+    from llm_backend import backend_for
+    from llm_cache import GenerationCache, StopCondition, generation_key
 
-def rephrase_feedback(response: Any, answer: Any, info: Any, custom_feedback=False) -> Any:
+# LLM of the feedback rephrasing, loaded at import (see llm_backend.py)
+rephrase_backend = backend_for("rephrase")
 
-    instruction = ""
-    if custom_feedback:
+# word budget of the rephrased feedback, matching the 'maximally 100 words' of the rephrasing prompt
+REPHRASE_MAX_WORDS = int(os.environ.get("REPHRASE_MAX_WORDS", "100"))
+
+# only the first paragraph is kept (see process_llm_response), so generation stops at the first newline or past the word budget
+REPHRASE_STOP = StopCondition(newline=True, max_words=REPHRASE_MAX_WORDS)
+
+# maximum number of rephrasings of student-independent feedback kept, 0 disables the pool
+REPHRASE_POOL_SIZE = int(os.environ.get("REPHRASE_POOL_SIZE", "256"))
+
+# feedback of the verdict tags that is a fixed sentence, not depending on the student response
+TEMPLATE_FEEDBACK = {
+    "FEEDBACK_SLM_PASS_NLP_PASS": "The response is correct (matched key points and follows the right context).",
+}
+
+# processed rephrasings of the feedback that only depends on the question and tag, keyed by generation_key
+rephrase_pool = GenerationCache(capacity=REPHRASE_POOL_SIZE, max_age=0, path="")
+
+def plan_rephrase(info: Any, tag: Any = None, custom_feedback=False) -> str:
+    """
+    Rephrasing case of the feedback: 'rephrase_custom' when it does not depend on the student response (custom feedback
+    of the teacher, or the fixed feedback of a TEMPLATE_FEEDBACK tag), which is rephrased on its own and served from the
+    rephrase pool; 'rephrase' otherwise, generated live with the student response.
+    """
+    if custom_feedback or (tag in TEMPLATE_FEEDBACK and info == TEMPLATE_FEEDBACK[tag]):
+        return 'rephrase_custom'
+    return 'rephrase'
+
+def rephrase_feedback(response: Any, answer: Any, info: Any, custom_feedback=False, llm_cache_stats=None, prompts=None, generation_stats=None, tag=None, timings=None) -> Any:
+
+    instruction, prefix = "", ""
+    if plan_rephrase(info, tag, custom_feedback) == 'rephrase_custom':
         instruction = build_instruction(response, answer, 'rephrase_custom', info)
+        return pooled_rephrasing(instruction, llm_cache_stats, generation_stats, timings)
+    elif prompts is not None:
+        # pre-rendered QuestionPrompts of a compiled question
+        instruction = prompts.rephrase(response, info)
+        prefix = prompts.rephrase_prefix
     else:
         instruction = build_instruction(response, answer, 'rephrase', info)
     # print(instruction)
 
-    response = model.generate(instruction, max_tokens=150)
+    if generation_stats is not None:
+        generation_stats["plan"] = "live"
+    response = rephrase_backend.generate(instruction, max_tokens=150, cache_stats=llm_cache_stats, stop=REPHRASE_STOP, generation_stats=generation_stats, prefix=prefix,
+                                         timings=timings, stage="rephrase.llm")
 
-    processed_response = process_llm_response(response)
+    processed_response = truncate_words(process_llm_response(response), REPHRASE_MAX_WORDS)
     # print(processed_response)
     return processed_response
 
+def pooled_rephrasing(instruction: str, llm_cache_stats=None, generation_stats=None, timings=None) -> Any:
+    """
+    Processed rephrasing of a student-independent instruction from the rephrase pool, generated (through the generation
+    cache, which holds the pre-generated outputs of a question bank) and added to the pool on a miss.
+    """
+    key = generation_key(rephrase_backend.model, instruction, 150, REPHRASE_STOP) if rephrase_pool.enabled else None
+    pooled = rephrase_pool.get(key) if key is not None else None
+    if generation_stats is not None:
+        generation_stats["plan"] = "pool" if pooled is not None else "question"
+    if pooled is not None:
+        if generation_stats is not None:
+            generation_stats.update(tokens=0, time_to_first_token=None, seconds=0.0)
+        return pooled
+
+    response = rephrase_backend.generate(instruction, max_tokens=150, cache_stats=llm_cache_stats, stop=REPHRASE_STOP, generation_stats=generation_stats,
+                                         timings=timings, stage="rephrase.llm")
+    processed_response = truncate_words(process_llm_response(response), REPHRASE_MAX_WORDS)
+    if key is not None:
+        rephrase_pool.put(key, processed_response)
+    return processed_response
+
 def process_llm_response(response: Any) -> Any:
     """
     Process the LLM response have first paragraph only
@@ -29,3 +92,11 @@ def process_llm_response(response: Any) -> Any:
     if '\n' in response:
         return response.split("\n")[0]
     return response
+
+def truncate_words(response: Any, max_words: int) -> Any:
+    """
+    Cut the response after its first `max_words` words (a generation stopped past the word budget ends with a partial word)
+    """
+    # NOTE: the lookahead keeps each word whole, otherwise a response shorter than the budget backtracks exponentially
+    words = re.match(r"(?:\s*\S+(?!\S)){%d}" % max_words, response) if max_words else None
+    return words.group() if words is not None else response
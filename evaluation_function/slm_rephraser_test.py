@@ -0,0 +1,30 @@
+import unittest
+
+try:
+    from .slm_rephraser import truncate_words
+except ImportError:
+    from slm_rephraser import truncate_words
+
+
+class TestTruncateWords(unittest.TestCase):
+    """
+        TestCase Class used to test the word budget of the rephrased feedback.
+    """
+
+    def test_responses_within_the_budget_are_kept(self):
+        response = ' '.join(['longerword'] * 12)
+
+        self.assertEqual(truncate_words(response, 100), response)
+        self.assertEqual(truncate_words(' The response is missing the velocity.', 100), ' The response is missing the velocity.')
+        self.assertEqual(truncate_words('', 100), '')
+
+    def test_responses_are_cut_after_the_budget(self):
+        self.assertEqual(truncate_words(' The response is missing the velocity and the densi', 6), ' The response is missing the velocity')
+        self.assertEqual(truncate_words('one  two\tthree four', 3), 'one  two\tthree')
+
+    def test_no_budget_keeps_the_response(self):
+        self.assertEqual(truncate_words('one two three', 0), 'one two three')
+
+
+if __name__ == "__main__":
+    unittest.main()
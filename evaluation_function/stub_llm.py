@@ -0,0 +1,100 @@
+import os
+import re
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# seconds every generation of the stub takes before its first token (standing in for the prompt prefill)
+STUB_LATENCY = float(os.environ.get("SLM_STUB_LATENCY", "0"))
+# seconds the stub takes per generated token
+STUB_TOKEN_LATENCY = float(os.environ.get("SLM_STUB_TOKEN_LATENCY", "0"))
+
+
+def word_overlap(text: str, other: str) -> float:
+    """
+    Share of the words of `text` that also appear in `other`, ignoring case.
+    """
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    other_words = set(re.findall(r"[a-z0-9]+", other.lower()))
+    return sum(word in other_words for word in words) / len(words) if words else 0.0
+
+
+class StubModel:
+    """
+    Deterministic in-process stand-in for the GPT4All model used by slm_evaluation and slm_rephraser, e.g. for
+    benchmarks and tests without the model file.
+
+    Outputs are canned from the prompts of slm_instructions:
+    - similarity and keystring checks: ' True' if at least `overlap` of the words of the response (or keystring)
+      are in the answer, ' False' otherwise; one '<number>: True;' entry per keystring for the batched check
+    - rephrasing: the feedback information of the prompt
+    `outputs` maps regular expressions to outputs used instead for the prompts they match (first match wins).
+    Each generation sleeps `latency` seconds, then `token_latency` seconds per token, streamed word by word
+    through the GPT4All response callback (or as a generator with streaming=True). `calls` counts the generations,
+    and `path` stands in for the model file (part of the generation cache keys).
+    """
+
+    def __init__(self, latency: float = STUB_LATENCY, token_latency: float = STUB_TOKEN_LATENCY,
+                 outputs: Optional[Dict[str, str]] = None, overlap: float = 0.5, path: str = "stub"):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.outputs = dict(outputs or {})
+        self.overlap = overlap
+        self.config = {"path": path}
+        self.calls = 0
+        self._history = None
+
+    @property
+    def current_chat_session(self) -> Optional[List[Dict[str, str]]]:
+        return None if self._history is None else list(self._history)
+
+    @contextmanager
+    def chat_session(self, system_prompt: str = "", prompt_template: str = "{0}"):
+        self._history = [{"role": "system", "content": system_prompt}]
+        try:
+            yield self
+        finally:
+            self._history = None
+
+    def output(self, prompt: str) -> str:
+        for pattern, output in self.outputs.items():
+            if re.search(pattern, prompt):
+                return output
+        last_line = prompt.rstrip().splitlines()[-1] if prompt.strip() else ""
+        if last_line.endswith("->"):
+            keystrings = re.match(r"Keystrings=(\d+: '.*') & Answer='(.*)' ->", last_line)
+            if keystrings is not None:
+                numbered = re.findall(r"(\d+): '(.*?)'(?:; |$)", keystrings.group(1))
+                return " " + " ".join(f"{number}: {self.verdict(keystring, keystrings.group(2))};" for number, keystring in numbered)
+            pair = re.match(r"(?:Response|Keystrings)='(.*)' & Answer='(.*)' ->", last_line)
+            return " " + (self.verdict(*pair.groups()) if pair is not None else "False")
+        info = re.search(r"Feedback information: '(.*)'", prompt, re.DOTALL)
+        return " " + (info.group(1) if info is not None else "Good effort.")
+
+    def verdict(self, text: str, answer: str) -> str:
+        return "True" if word_overlap(text, answer) >= self.overlap else "False"
+
+    def generate(self, prompt: str, max_tokens: int = 200, callback=None, streaming: bool = False, **generate_kwargs):
+        """
+        The output for the prompt, or a generator of its tokens when streaming (like GPT4All, without the token at
+        which the callback stopped the generation).
+        """
+        tokens = self._generate(prompt, max_tokens, callback, streaming)
+        return tokens if streaming else "".join(tokens)
+
+    def _generate(self, prompt: str, max_tokens: int, callback, streaming: bool):
+        self.calls += 1
+        if self._history is not None:
+            self._history.append({"role": "user", "content": prompt})
+        time.sleep(self.latency)
+        output = ""
+        for token_id, token in enumerate(re.findall(r"\s*\S+", self.output(prompt))[:max_tokens]):
+            time.sleep(self.token_latency)
+            proceed = callback is None or callback(token_id, token)
+            if proceed or not streaming:
+                output += token
+                yield token
+            if not proceed:
+                break
+        if self._history is not None:
+            self._history.append({"role": "assistant", "content": output})
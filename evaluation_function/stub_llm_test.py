@@ -0,0 +1,50 @@
+import unittest
+
+try:
+    from .llm_cache import StopCondition, cached_generate
+    from .slm_instructions import build_instruction
+    from .stub_llm import StubModel
+except ImportError:
+    from llm_cache import StopCondition, cached_generate
+    from slm_instructions import build_instruction
+    from stub_llm import StubModel
+
+
+class TestStubModel(unittest.TestCase):
+    """
+        TestCase Class used to test the deterministic stand-in for the GPT4All model.
+    """
+
+    answer = 'Density, Velocity, Viscosity, Length'
+
+    def test_verdicts_follow_the_word_overlap(self):
+        model = StubModel()
+
+        self.assertEqual(model.generate(build_instruction('density, velocity, viscosity', self.answer, 'similarity')), ' True')
+        self.assertEqual(model.generate(build_instruction('atoms form molecules', self.answer, 'similarity')), ' False')
+        self.assertEqual(model.generate(build_instruction('', self.answer, 'include_word', 'velocity')), ' True')
+
+    def test_batched_keystrings_are_numbered(self):
+        model = StubModel()
+        prompt = build_instruction('', self.answer, 'include_words', ['density', 'speed'])
+
+        self.assertEqual(model.generate(prompt), ' 1: True; 2: False;')
+
+    def test_rephrasing_streams_the_feedback(self):
+        model, generation_stats = StubModel(), {}
+        prompt = build_instruction('density', self.answer, 'rephrase', 'The response is missing the velocity.')
+        output = cached_generate(model, prompt, max_tokens=150, stop=StopCondition(max_words=3), generation_stats=generation_stats)
+
+        self.assertEqual(output, ' The response is missing')
+        self.assertEqual(generation_stats['tokens'], 4)
+
+    def test_canned_outputs_and_chat_sessions(self):
+        model = StubModel(outputs={'Response=': ' Maybe'})
+        with model.chat_session():
+            self.assertEqual(model.generate(build_instruction('density', self.answer, 'similarity')), ' Maybe')
+            self.assertEqual(len(model.current_chat_session), 3)
+        self.assertIsNone(model.current_chat_session)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import time
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional
+
+
+class Timings:
+    """
+    Spans of the stages of one evaluation: their name, start (seconds since the Timings were created), wall-clock
+    time, CPU time and any attributes added to them (e.g. the tokens of an LLM call), in the order they ended.
+
+    NOTE: the CPU time is the time.process_time() of the whole process, so it includes the threads of the LLM
+    inference, and the time of the other layer while the layers run in parallel (see concurrent_layers).
+    """
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.spans = []
+
+    def span(self, name: str, **attributes) -> "Span":
+        """
+        Context timing its block as the span `name`, yielding its record to add attributes to.
+        """
+        return Span(self, dict(name=name, **attributes))
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        return [dict(record) for record in self.spans]
+
+
+class Span:
+    """
+    Context recording a span of the Timings when it exits (a class rather than a generator, as spans are also
+    recorded for the process metrics of every evaluation).
+    """
+    __slots__ = ("timings", "record", "start_time", "start_cpu_time")
+
+    def __init__(self, timings: Timings, record: Dict[str, Any]):
+        self.timings = timings
+        self.record = record
+
+    def __enter__(self) -> Dict[str, Any]:
+        self.start_time, self.start_cpu_time = time.perf_counter(), time.process_time()
+        return self.record
+
+    def __exit__(self, *exc_info) -> None:
+        record = self.record
+        record["start"] = self.start_time - self.timings.start_time
+        record["wall_time"] = time.perf_counter() - self.start_time
+        record["cpu_time"] = time.process_time() - self.start_cpu_time
+        # NOTE: list.append is atomic, the layers can record spans from different threads
+        self.timings.spans.append(record)
+
+
+def span(timings: Optional[Timings], name: str, **attributes):
+    """
+    timings.span(name, **attributes), or a context doing nothing (yielding a throwaway record) without timings.
+    """
+    return timings.span(name, **attributes) if timings is not None else nullcontext({})
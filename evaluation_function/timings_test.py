@@ -0,0 +1,42 @@
+import unittest
+
+try:
+    from .timings import Timings, span
+except ImportError:
+    from timings import Timings, span
+
+
+class TestTimings(unittest.TestCase):
+    """
+        TestCase Class used to test the recording of the evaluation stages.
+    """
+
+    def test_spans_are_recorded_in_the_order_they_end(self):
+        timings = Timings()
+        with span(timings, "nlp"):
+            with span(timings, "nlp.window_matching", keystring="density") as record:
+                record["windows"] = 3
+            sum(range(10000))
+
+        spans = timings.to_list()
+        self.assertEqual([record["name"] for record in spans], ["nlp.window_matching", "nlp"])
+        self.assertEqual((spans[0]["keystring"], spans[0]["windows"]), ("density", 3))
+        self.assertLessEqual(spans[1]["start"], spans[0]["start"])
+        self.assertGreaterEqual(spans[1]["wall_time"], spans[0]["wall_time"])
+        self.assertTrue(all(record["cpu_time"] >= 0 for record in spans))
+
+    def test_spans_end_on_exceptions(self):
+        timings = Timings()
+        with self.assertRaises(ValueError):
+            with span(timings, "slm"):
+                raise ValueError()
+
+        self.assertEqual([record["name"] for record in timings.spans], ["slm"])
+
+    def test_without_timings_nothing_is_recorded(self):
+        with span(None, "nlp") as record:
+            record["tokens"] = 1
+
+
+if __name__ == "__main__":
+    unittest.main()